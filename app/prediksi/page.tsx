@@ -80,6 +80,15 @@ interface FoodRecommendationResponse {
   error?: string // Added error property
 }
 
+// Combined /assess response: prediction plus recommendations per category
+interface AssessmentResponse {
+  success: boolean
+  prediction?: number
+  prediction_text?: string
+  recommendations?: Record<string, FoodRecommendationResponse>
+  error?: string
+}
+
 export default function PrediksiPageEnhanced() {
   const [formData, setFormData] = useState({
     age: "",
@@ -101,6 +110,7 @@ export default function PrediksiPageEnhanced() {
   const [foodRecommendations, setFoodRecommendations] = useState<FoodRecommendation[]>([])
   const [loadingFood, setLoadingFood] = useState(false)
   const [foodResponseData, setFoodResponseData] = useState<FoodRecommendationResponse | null>(null)
+  const [assessedRecommendations, setAssessedRecommendations] = useState<Record<string, FoodRecommendationResponse>>({})
 
   useEffect(() => {
     setIsVisible(true)
@@ -178,9 +188,18 @@ export default function PrediksiPageEnhanced() {
   // Enhanced category selection with backend integration
   const handleCategorySelect = async (categoryId: string) => {
     setSelectedCategory(categoryId)
-    setLoadingFood(true)
     setError(null)
 
+    // Recommendations for every category already came back with /assess
+    const assessed = assessedRecommendations[categoryId]
+    if (assessed?.success) {
+      setFoodRecommendations(assessed.recommendations || [])
+      setFoodResponseData(assessed)
+      return
+    }
+
+    setLoadingFood(true)
+
     try {
       const numericUserData = {
         age: Number.parseFloat(formData.age),
@@ -240,6 +259,7 @@ export default function PrediksiPageEnhanced() {
     setShowCategorySelection(false)
     setFoodRecommendations([])
     setFoodResponseData(null)
+    setAssessedRecommendations({})
 
     try {
       const processingSteps = [
@@ -262,7 +282,8 @@ export default function PrediksiPageEnhanced() {
 
       console.log("Data yang dikirim ke backend:", numericData)
 
-      const response = await fetch("http://127.0.0.1:5000/predict", {
+      // One request returns the prediction and recommendations for all categories
+      const response = await fetch("http://127.0.0.1:5000/assess", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -270,11 +291,12 @@ export default function PrediksiPageEnhanced() {
         body: JSON.stringify(numericData),
       })
 
-      const data = await response.json()
+      const data: AssessmentResponse = await response.json()
       console.log("Response prediksi dari backend:", data)
 
       if (response.ok && data.success) {
         setPrediction(data.prediction === 1 ? "Risiko Tinggi" : "Risiko Rendah")
+        setAssessedRecommendations(data.recommendations || {})
         setAnimateResult(true)
 
         setTimeout(() => {
@@ -1,18 +1,36 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
-import joblib
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 from contextlib import contextmanager
 import random
 import hashlib
 from datetime import datetime
-import traceback
+import hmac
+import time
+
+from db_pool import get_pool
+from food_index import build_food_index, lookup_category
+from forest_engine import sample_validated_inputs
+from model_artifact import ARTIFACT_PATH
+from model_bundle import ADMIN_TOKEN, BundleReloader, ServingBundle, bundle_checksum, load_models, range_errors
+from write_behind import PREDICTION_WRITE_MODE, WriteBehindQueue, new_prediction_id
+from region_table import REGION_TABLE_PATH, file_checksum
+from recommendation_cache import HourlyLRUCache, hour_bucket, recommendation_key
+from micro_batch import PREDICT_BATCHING, MicroBatcher
+from responses import dumps, json_response, lean_prediction, lean_recommendation, response_profile
+from metrics import instrument, timed
+from log_config import get_logger
+from warmup import WarmUp
+from inference_threads import limit_native_threads, thread_settings
+from stream_scoring import UploadFormatError, iter_chunks, iter_lines, iter_records, upload_format
+
+logger = get_logger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+instrument(app)
 
 # Database configuration
 DB_CONFIG = {
@@ -23,54 +41,115 @@ DB_CONFIG = {
     'port': '5432'
 }
 
+# Connections are borrowed from a shared pool instead of opened per request
+db_pool = get_pool(DB_CONFIG)
+
 # File paths
 FOOD_DATA_URL = "food_data.csv"
 DIABETES_MODEL_PATH = 'model.pkl'
 DIABETES_SCALER_PATH = 'scaler.pkl'
 
-# Global variables
-diabetes_model = None
-diabetes_scaler = None
-feature_order = None
-food_data = None
+# Batch prediction settings
+BATCH_FIELDS = ['age', 'bmi', 'glucose', 'insulin']
+MAX_BATCH_SIZE = 10000
 
-# Load diabetes model and scaler
-def load_models():
-    global diabetes_model, diabetes_scaler, feature_order
-    try:
-        diabetes_model = joblib.load(DIABETES_MODEL_PATH)
-        diabetes_scaler = joblib.load(DIABETES_SCALER_PATH)
-        
-        if hasattr(diabetes_scaler, 'feature_names_in_'):
-            feature_order = diabetes_scaler.feature_names_in_
-            print(f"[INFO] Diabetes model loaded successfully")
-            print(f"[INFO] Feature order: {list(feature_order)}")
-        else:
-            feature_order = ['Glucose', 'Insulin', 'BMI', 'Age']
-            print(f"[INFO] Diabetes model loaded successfully")
-            print(f"[INFO] Using default feature order: {feature_order}")
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to load diabetes model: {e}")
-        diabetes_model = None
-        diabetes_scaler = None
-        feature_order = None
+# Frontend category names mapped to the 'Kategori' values in the food CSV
+CATEGORY_MAPPING = {
+    "Protein Hewani": "Protein hewani",
+    "Protein Nabati": "Protein Nabati", 
+    "Karbohidrat": "Karbohidrat",
+    "Sayur": "Sayur",
+    "Buah": "Buah",
+    "Biji-bijian": "Biji-bijian",
+    "Kacang-kacangan": "Kacang-kacangan"
+}
+
+# /recommend_food responses for the current hour, cleared on every reload
+recommendation_cache = HourlyLRUCache()
 
 # Load food data
 def load_food_data():
-    global food_data
+    """Food catalog and its per-category index, or (None, {}) if it cannot be read"""
     try:
         food_data = pd.read_csv(FOOD_DATA_URL)
         if 'Kategori' in food_data.columns:
             food_data['Kategori'] = food_data['Kategori'].str.strip()
-        print(f"[INFO] Food data loaded: {len(food_data)} items")
+        food_index = build_food_index(food_data)
+        logger.info(f"Food data loaded: {len(food_data)} items, {len(food_index)} categories indexed")
+        return food_data, food_index
     except Exception as e:
-        print(f"[ERROR] Failed to load food data: {e}")
-        food_data = None
+        logger.error(f"Failed to load food data: {e}")
+        return None, {}
 
-# Initialize models and data
-load_models()
-load_food_data()
+def _checksum_or_none(*paths):
+    try:
+        return file_checksum(*paths)
+    except OSError:
+        return None
+
+def build_bundle():
+    """Load the model files and food catalog into a new ServingBundle"""
+    model_checksum = _checksum_or_none(DIABETES_MODEL_PATH, DIABETES_SCALER_PATH)
+    food_checksum = _checksum_or_none(FOOD_DATA_URL)
+    food_data, food_index = load_food_data()
+    return ServingBundle(**load_models(DIABETES_MODEL_PATH, DIABETES_SCALER_PATH, model_checksum),
+                         food_data=food_data, food_index=food_index,
+                         checksum=bundle_checksum(model_checksum, food_checksum))
+
+def validate_bundle(bundle):
+    """Warm a candidate bundle and check it with canary predictions; returns the problems found"""
+    if not bundle.model_ready:
+        return ['Diabetes model or scaler not available']
+    if bundle.food_data is None:
+        return ['Food data not available']
+
+    problems = []
+    # Every serving path must agree with scaler + model on the canary rows
+    canary = sample_validated_inputs(list(bundle.feature_order), n_random=200, grid_points=3)
+    expected = np.asarray(bundle.model.predict(bundle.scale(canary))).astype(int)
+    served = bundle.predict_risk_matrix(canary)
+    single = np.array([bundle.predict_risk(row) for row in canary[:50]])
+    if (served != expected).any() or (single != expected[:50]).any():
+        problems.append(f"Canary predictions differ from the model: "
+                        f"{int((served != expected).sum())} batch, {int((single != expected[:50]).sum())} single-row")
+
+    # Touch every category once so the first real requests do not pay for it
+    profile = {'age': 45, 'bmi': 28.5, 'glucose': 130, 'insulin': 15}
+    served_categories = 0
+    for category in CATEGORY_MAPPING:
+        recommendations, _, _, _ = get_food_recommendations(category, profile, ml_prediction=int(expected[0]),
+                                                            bundle=bundle)
+        served_categories += bool(recommendations)
+    if served_categories == 0:
+        problems.append('No category returned recommendations')
+    return problems
+
+def _on_bundle_swap(bundle):
+    # Entries are keyed by bundle version; drop the old ones right away
+    recommendation_cache.clear()
+
+bundle_reloader = BundleReloader(
+    build_bundle, validate_bundle,
+    watch_paths=(DIABETES_MODEL_PATH, DIABETES_SCALER_PATH, FOOD_DATA_URL,
+                 ARTIFACT_PATH, REGION_TABLE_PATH),
+    on_swap=_on_bundle_swap,
+)
+
+def current_bundle():
+    """Bundle serving the current request, fixed at its first use within the request"""
+    if not has_request_context():
+        return bundle_reloader.active
+    bundle = g.get('bundle')
+    if bundle is None:
+        bundle = g.bundle = bundle_reloader.active
+    return bundle
+
+@app.after_request
+def add_bundle_version(response):
+    bundle = g.get('bundle') or bundle_reloader.active
+    if bundle is not None:
+        response.headers['X-Model-Version'] = bundle.version
+    return response
 
 # Simple HTML Template for testing
 HTML_TEMPLATE = """
@@ -353,19 +432,13 @@ HTML_TEMPLATE = """
 
 @contextmanager
 def get_db_connection():
-    """Database connection context manager"""
-    conn = None
+    """Database connection context manager, borrowing from the shared pool"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        yield conn
+        with db_pool.connection() as conn:
+            yield conn
     except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"[ERROR] Database error: {e}")
+        logger.error(f"Database error: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def init_database():
     """Initialize database and check tables"""
@@ -392,41 +465,33 @@ def init_database():
                         glucose INTEGER NOT NULL,
                         insulin FLOAT NOT NULL,
                         prediction INTEGER NOT NULL,
+                        client_id UUID,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
                 """)
                 conn.commit()
-                print("[INFO] Predictions table created")
+                logger.info("Predictions table created")
             else:
-                print("[INFO] Predictions table exists")
+                logger.info("Predictions table exists")
+
+            # Write-behind rows carry a client-generated id
+            cursor.execute("ALTER TABLE predictions ADD COLUMN IF NOT EXISTS client_id UUID")
+            conn.commit()
                     
             return True
                 
     except Exception as e:
-        print(f"[ERROR] Failed to initialize database: {e}")
+        logger.error(f"Failed to initialize database: {e}")
         return False
 
-def reorder_features_for_model(age, bmi, glucose, insulin):
-    """Reorder features to match model training order"""
-    if feature_order is None:
-        return [glucose, insulin, bmi, age]
-    
-    feature_mapping = {
-        'Age': age,
-        'BMI': bmi, 
-        'Glucose': glucose,
-        'Insulin': insulin
-    }
-    
-    reordered = []
-    for feature_name in feature_order:
-        if feature_name in feature_mapping:
-            reordered.append(feature_mapping[feature_name])
-            
-    return reordered
-
 def save_prediction_to_db(age, bmi, glucose, insulin, prediction):
     """Save prediction to database"""
+    if prediction_writer is not None:
+        prediction_id = new_prediction_id()
+        if prediction_writer.submit((prediction_id, age, bmi, glucose, insulin, prediction)):
+            return prediction_id
+        return None
+
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -443,18 +508,121 @@ def save_prediction_to_db(age, bmi, glucose, insulin, prediction):
             return prediction_id
             
     except Exception as e:
-        print(f"[ERROR] Failed to save prediction: {e}")
+        logger.error(f"Failed to save prediction: {e}")
         return None
 
+def save_predictions_batch_to_db(rows):
+    """Save many predictions with a single multi-row INSERT, returning ids in row order"""
+    if not rows:
+        return []
+
+    if prediction_writer is not None:
+        prediction_ids = []
+        for age, bmi, glucose, insulin, prediction in rows:
+            prediction_id = new_prediction_id()
+            queued = prediction_writer.submit((prediction_id, age, bmi, glucose, insulin, prediction))
+            prediction_ids.append(prediction_id if queued else None)
+        return prediction_ids
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+
+            values = [
+                (int(age), float(bmi), int(glucose), int(insulin), int(prediction))
+                for age, bmi, glucose, insulin, prediction in rows
+            ]
+
+            result = execute_values(cursor, """
+                INSERT INTO predictions (age, bmi, glucose, insulin, prediction)
+                VALUES %s
+                RETURNING id
+            """, values, page_size=len(values), fetch=True)
+
+            conn.commit()
+
+            return [row[0] for row in result]
+
+    except Exception as e:
+        logger.error(f"Failed to save batch predictions: {e}")
+        return [None] * len(rows)
+
+def validate_batch_records(records):
+    """Validate patient records as arrays, returning raw features and per-row errors
+
+    Features are returned as an (n, 4) float array in [age, bmi, glucose, insulin]
+    order. Rows that fail validation have their error message set in `errors`
+    and must not be sent to the model.
+    """
+    n_rows = len(records)
+    features = np.full((n_rows, len(BATCH_FIELDS)), np.nan)
+    errors = [None] * n_rows
+
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[i] = 'Record must be an object'
+            continue
+        missing = [field for field in BATCH_FIELDS if field not in record]
+        if missing:
+            errors[i] = f'Missing required field: {missing[0]}'
+            continue
+        try:
+            features[i] = [float(record[field]) for field in BATCH_FIELDS]
+        except (ValueError, TypeError) as e:
+            errors[i] = f'Invalid input data: {str(e)}'
+
+    range_errors(features, errors)
+    return features, errors
+
+# Optional write-behind mode: predictions are queued and written in batches
+prediction_writer = None
+if PREDICTION_WRITE_MODE == 'write_behind':
+    init_database()
+    prediction_writer = WriteBehindQueue(get_db_connection).start()
+    logger.info("Prediction write-behind queue started")
+
+# Opt-in coalescing of concurrent /predict calls into one model call
+prediction_batcher = None
+if PREDICT_BATCHING == 'on':
+    # Rows are grouped by the bundle that reordered them, so a swap never mixes bundles
+    prediction_batcher = MicroBatcher(lambda rows, bundle: bundle.predict_risk_matrix(rows))
+    logger.info(f"Predict micro-batching enabled: {prediction_batcher.window * 1000:g}ms window, "
+                f"max {prediction_batcher.max_batch} rows")
+
+def prediction_batching_stats():
+    """Batch size and wait time metrics of the /predict scheduler"""
+    if prediction_batcher is None:
+        return {'mode': 'off'}
+    return prediction_batcher.stats()
+
+def prediction_write_stats():
+    """Queue depth and dropped rows of the prediction writer"""
+    if prediction_writer is None:
+        return {'mode': 'sync'}
+    return prediction_writer.stats()
+
 def safe_float(value, default=0.0):
-    """Safely convert value to float"""
+    """Safely convert value to float, treating missing and NaN values as `default`"""
     try:
-        if pd.isna(value) or value == '' or value is None:
+        if value is None or value == '':
             return default
-        return float(value)
+        result = float(value)
+        return default if result != result else result
     except (ValueError, TypeError):
         return default
 
+def gi_summary(category_entry, positions):
+    """Lowest, highest and average GI of the selected foods, ignoring missing values"""
+    gi = category_entry.arrays['Glycemic Index'][positions]
+    gi = gi[~np.isnan(gi)]
+    if len(gi) == 0:
+        return {'lowest': 0, 'highest': 0, 'average': 0}
+    return {
+        'lowest': int(gi.min()),
+        'highest': int(gi.max()),
+        'average': round(float(gi.mean()), 1)
+    }
+
 def generate_user_seed(age, bmi, glucose, insulin, category):
     """Generate unique seed for each user input combination"""
     # Create unique string from user data and category with timestamp component
@@ -467,28 +635,23 @@ def generate_user_seed(age, bmi, glucose, insulin, category):
     
     return seed
 
-def get_food_recommendations(category, user_data, top_n=5):
-    """Get food recommendations using ML model prediction and rule-based selection"""
+def get_food_recommendations(category, user_data, top_n=5, ml_prediction=None, bundle=None):
+    """Get food recommendations using ML model prediction and rule-based selection
+
+    Pass `ml_prediction` (0 or 1) when the risk class is already known to
+    skip running the diabetes model again. `bundle` defaults to the one
+    serving the current request.
+    """
+    bundle = bundle or current_bundle()
     try:
-        if food_data is None:
+        if bundle.food_data is None:
             return [], "Risiko Rendah", "No Data", {"error": "Food data not available"}
-            
-        # Category mapping
-        category_mapping = {
-            "Protein Hewani": "Protein hewani",
-            "Protein Nabati": "Protein Nabati", 
-            "Karbohidrat": "Karbohidrat",
-            "Sayur": "Sayur",
-            "Buah": "Buah",
-            "Biji-bijian": "Biji-bijian",
-            "Kacang-kacangan": "Kacang-kacangan"
-        }
         
-        csv_category = category_mapping.get(category.strip(), category.strip())
-        category_foods = food_data[food_data['Kategori'].str.strip() == csv_category].copy()
-        
-        if len(category_foods) == 0:
-            category_foods = food_data[food_data['Kategori'].str.strip() == category.strip()].copy()
+        csv_category = CATEGORY_MAPPING.get(category.strip(), category.strip())
+
+        # Foods come from the per-category index, already sorted by GI
+        category_entry = lookup_category(bundle.food_index, csv_category, category)
+        available_foods = len(category_entry) if category_entry is not None else 0
             
         # Extract user health profile
         age = user_data.get('age', 30)
@@ -497,29 +660,23 @@ def get_food_recommendations(category, user_data, top_n=5):
         insulin = user_data.get('insulin', 10)
         
         # Use ML model to predict diabetes risk
-        ml_prediction = 0  # Default to low risk
-        ml_prediction_text = "Risiko Rendah"
-        
-        if diabetes_model is not None and diabetes_scaler is not None:
+        if ml_prediction is not None:
+            ml_prediction_text = 'Risiko Tinggi' if ml_prediction == 1 else 'Risiko Rendah'
+        elif bundle.model_ready:
             try:
                 # Reorder features for model
-                reordered_features = reorder_features_for_model(age, bmi, glucose, insulin)
+                reordered_features = bundle.reorder(age, bmi, glucose, insulin)
                 
-                # Use DataFrame with feature names to avoid sklearn warning
-                if feature_order is not None:
-                    features_df = pd.DataFrame([reordered_features], columns=feature_order)
-                    features_scaled = diabetes_scaler.transform(features_df)
-                else:
-                    features = np.array([reordered_features])
-                    features_scaled = diabetes_scaler.transform(features)
-                
-                ml_prediction = int(diabetes_model.predict(features_scaled)[0])
+                ml_prediction = bundle.predict_risk(reordered_features)
                 ml_prediction_text = 'Risiko Tinggi' if ml_prediction == 1 else 'Risiko Rendah'
                 
             except Exception as e:
-                print(f"[ERROR] ML prediction failed: {e}")
+                logger.error(f"ML prediction failed: {e}")
                 ml_prediction = 0
                 ml_prediction_text = "Risiko Rendah"
+        else:
+            ml_prediction = 0  # Default to low risk
+            ml_prediction_text = "Risiko Rendah"
         
         # Generate unique seed for this user and category combination
         user_seed = generate_user_seed(age, bmi, glucose, insulin, category)
@@ -527,59 +684,55 @@ def get_food_recommendations(category, user_data, top_n=5):
         debug_info = {
             'category_requested': category,
             'csv_category_mapped': csv_category,
-            'total_foods_in_category': len(category_foods),
+            'total_foods_in_category': available_foods,
             'user_profile': {'age': age, 'bmi': bmi, 'glucose': glucose, 'insulin': insulin},
             'ml_prediction': ml_prediction,
             'ml_prediction_text': ml_prediction_text,
             'user_seed': user_seed
         }
         
-        if len(category_foods) == 0:
+        if available_foods == 0:
             debug_info['error'] = 'No foods found in category'
             return [], ml_prediction_text, "No Strategy", debug_info
         
         # Rule-based food selection strategy based on ML prediction
         if ml_prediction == 1:  # High Risk - prioritize lowest GI foods
-            category_foods = category_foods.sort_values('Glycemic Index')
             gi_strategy = "Prioritas GI Terendah (Risiko Tinggi)"
         else:  # Low Risk - can include higher GI foods
-            # Sort by GI but allow higher values
-            category_foods = category_foods.sort_values('Glycemic Index')
             gi_strategy = "GI Fleksibel (Risiko Rendah)"
         
         debug_info['gi_strategy'] = gi_strategy
-        debug_info['foods_available'] = len(category_foods)
-        
-        # PERSONALIZATION: Use user seed for consistent but varied selection
-        random.seed(user_seed)
+        debug_info['foods_available'] = available_foods
         
-        # Get more candidates than needed for variety
-        available_foods = len(category_foods)
+        # PERSONALIZATION: Use user seed for consistent but varied selection.
+        # A generator per request keeps concurrent requests from sharing state.
+        rng = random.Random(user_seed)
         
+        # Get more candidates than needed for variety.
+        # Foods are GI-sorted, so candidates are the first n positions.
         if available_foods <= top_n:
             # If we have fewer foods than requested, return all
-            selected_foods = category_foods
+            selected_positions = list(range(available_foods))
         else:
             if ml_prediction == 1:  # High Risk - focus on lowest GI
                 # Take top 50% lowest GI foods and randomize within that
-                low_gi_count = max(top_n, len(category_foods) // 2)
-                candidates = category_foods.head(low_gi_count)
+                candidate_count = min(available_foods, max(top_n, available_foods // 2))
             else:  # Low Risk - more variety allowed
                 # Can select from broader range
-                candidates = category_foods
+                candidate_count = available_foods
             
             # Random selection from candidates
-            if len(candidates) <= top_n:
-                selected_foods = candidates
+            if candidate_count <= top_n:
+                selected_positions = list(range(candidate_count))
             else:
-                selected_indices = random.sample(range(len(candidates)), top_n)
-                selected_foods = candidates.iloc[selected_indices]
-                # Sort selected foods by GI again
-                selected_foods = selected_foods.sort_values('Glycemic Index')
+                selected_indices = rng.sample(range(candidate_count), top_n)
+                # Order the picks by GI again, using the same argsort as sort_values
+                picked_order = category_entry.gi_keys[selected_indices].argsort(kind='quicksort')
+                selected_positions = [selected_indices[i] for i in picked_order]
         
         # Format recommendations
         recommendations = []
-        for _, food_row in selected_foods.iterrows():
+        for food_row in (category_entry.records[position] for position in selected_positions):
             gi = safe_float(food_row.get('Glycemic Index', 0))
             
             food_item = {
@@ -595,7 +748,7 @@ def get_food_recommendations(category, user_data, top_n=5):
                 'sodium_content': round(safe_float(food_row.get('Sodium Content', 0)), 1),
                 'suitable_for_diabetes': int(safe_float(food_row.get('Suitable for Diabetes', 1))),
                 'rating': min(5.0, 5.0 - (gi / 20)),  # Rating based on GI
-                'personalization_score': round(random.uniform(0.7, 0.95), 3),
+                'personalization_score': round(rng.uniform(0.7, 0.95), 3),
                 'model_used': 'rule_based_with_ml_prediction',
                 'gi_category': 'Sangat Rendah' if gi <= 35 else 'Rendah' if gi <= 50 else 'Sedang' if gi <= 70 else 'Tinggi',
                 'diabetes_friendly': gi <= 50,
@@ -604,92 +757,151 @@ def get_food_recommendations(category, user_data, top_n=5):
             recommendations.append(food_item)
             
         debug_info['final_selection'] = len(recommendations)
-        debug_info['gi_range'] = {
-            'lowest': int(safe_float(selected_foods['Glycemic Index'].min(), 0)) if len(selected_foods) > 0 else 0,
-            'highest': int(safe_float(selected_foods['Glycemic Index'].max(), 0)) if len(selected_foods) > 0 else 0,
-            'average': round(safe_float(selected_foods['Glycemic Index'].mean(), 0), 1) if len(selected_foods) > 0 else 0
-        }
+        debug_info['gi_range'] = gi_summary(category_entry, selected_positions)
         
         return recommendations, ml_prediction_text, gi_strategy, debug_info
         
     except Exception as e:
         debug_info = {'error': f'Exception: {str(e)}'}
-        print(f"[ERROR] Error in food recommendation: {e}")
-        traceback.print_exc()
+        logger.exception("Error in food recommendation")
         return [], "Risiko Rendah", "Error", debug_info
 
+def recommend_category(category, user_data, ml_prediction=None, bundle=None):
+    """/recommend_food payload for one category, served from the hourly cache when possible
+
+    Returns (payload, debug_info). The payload is None when the category
+    has no recommendations; it does not include the per-request
+    'user_profile' and 'timestamp' fields.
+    """
+    bundle = bundle or current_bundle()
+
+    # Identical requests within the same hour get the same recommendations
+    # from the same bundle
+    hour, expires_at = hour_bucket()
+    cache_key = (bundle.version,) + recommendation_key(user_data['age'], user_data['bmi'], user_data['glucose'],
+                                                       user_data['insulin'], category, hour)
+    payload = recommendation_cache.get(cache_key)
+    if payload is not None:
+        return payload, payload['debug_info']
+    
+    with timed('recommend'):
+        recommendations, ml_prediction_text, gi_strategy, debug_info = get_food_recommendations(
+            category, user_data, ml_prediction=ml_prediction, bundle=bundle
+        )
+    if not recommendations:
+        return None, debug_info
+    
+    payload = {
+        'success': True,
+        'recommendations': recommendations,
+        'source': 'rule_based_with_ml_prediction',
+        'category_requested': category,
+        'total_recommendations': len(recommendations),
+        'ml_prediction': ml_prediction_text,
+        'gi_strategy': gi_strategy,
+        'model_used': 'rule_based_with_ml_prediction',
+        'debug_info': debug_info,
+        'personalization_info': {
+            'user_seed': debug_info.get('user_seed'),
+            'unique_selection': 'Each user gets different foods based on their input',
+            'strategy': 'ML prediction determines GI prioritization'
+        },
+        'algorithm_info': {
+            'prediction_method': 'ML Model Only',
+            'food_selection': 'Rule-based Algorithm',
+            'categories': ['Risiko Tinggi', 'Risiko Rendah'],
+            'gi_strategy_high_risk': 'Prioritas GI terendah',
+            'gi_strategy_low_risk': 'GI fleksibel'
+        }
+    }
+    
+    # Only cache if the seed was generated within the same hour as the key
+    if hour_bucket()[0] == hour:
+        recommendation_cache.put(cache_key, payload, expires_at)
+    
+    return payload, debug_info
+
+# Initialize models and data
+_load_started = time.perf_counter()
+bundle_reloader.load_initial()
+bundle_load_seconds = time.perf_counter() - _load_started
+bundle_reloader.start_watching()
+# Booting from the pickles imports sklearn and its OpenMP runtime; keep them and BLAS single-threaded
+limit_native_threads()
+
 @app.route('/')
 def home():
     """Main testing interface"""
     try:
         db_status = init_database()
+        bundle = current_bundle()
         
         return render_template_string(HTML_TEMPLATE,
-                                    diabetes_model_status="Ready" if diabetes_model is not None else "Not Found",
-                                    food_data_status=f"Ready ({len(food_data)} items)" if food_data is not None else "Not Found",
+                                    diabetes_model_status="Ready" if bundle.model is not None else "Not Found",
+                                    food_data_status=f"Ready ({len(bundle.food_data)} items)" if bundle.food_data is not None else "Not Found",
                                     db_status="Connected" if db_status else "Error")
     except Exception as e:
-        print(f"[ERROR] Error in home route: {e}")
-        traceback.print_exc()
+        logger.exception("Error in home route")
         return f"Error: {str(e)}", 500
 
 @app.route('/predict', methods=['POST'])
 def predict():
     """Diabetes prediction endpoint using ML model only"""
     try:
-        if diabetes_model is None or diabetes_scaler is None:
+        bundle = current_bundle()
+        if not bundle.model_ready:
             return jsonify({
                 'success': False,
                 'error': 'Diabetes model or scaler not available'
             }), 500
             
-        data = request.json
+        with timed('parse'):
+            data = request.json
         if not data:
             return jsonify({
                 'success': False,
                 'error': 'No data provided'
             }), 400
             
-        # Validate input
-        required_fields = ['age', 'bmi', 'glucose', 'insulin']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
-        
-        age = float(data['age'])
-        bmi = float(data['bmi'])
-        glucose = float(data['glucose'])
-        insulin = float(data['insulin'])
-        
-        # Validate ranges
-        if not (0 < age < 150):
-            return jsonify({'success': False, 'error': 'Age must be between 1-149'}), 400
-        if not (10 < bmi < 60):
-            return jsonify({'success': False, 'error': 'BMI must be between 10-60'}), 400
-        if not (50 < glucose < 500):
-            return jsonify({'success': False, 'error': 'Glucose must be between 50-500'}), 400
-        if not (0 < insulin < 1000):
-            return jsonify({'success': False, 'error': 'Insulin must be between 1-999'}), 400
+        with timed('validate'):
+            # Validate input
+            required_fields = ['age', 'bmi', 'glucose', 'insulin']
+            for field in required_fields:
+                if field not in data:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Missing required field: {field}'
+                    }), 400
         
-        # Reorder features to match model training order
-        reordered_features = reorder_features_for_model(age, bmi, glucose, insulin)
+            age = float(data['age'])
+            bmi = float(data['bmi'])
+            glucose = float(data['glucose'])
+            insulin = float(data['insulin'])
         
-        # Use DataFrame with feature names to avoid sklearn warning
-        if feature_order is not None:
-            features_df = pd.DataFrame([reordered_features], columns=feature_order)
-            features_scaled = diabetes_scaler.transform(features_df)
-        else:
-            features = np.array([reordered_features])
-            features_scaled = diabetes_scaler.transform(features)
+            # Validate ranges
+            if not (0 < age < 150):
+                return jsonify({'success': False, 'error': 'Age must be between 1-149'}), 400
+            if not (10 < bmi < 60):
+                return jsonify({'success': False, 'error': 'BMI must be between 10-60'}), 400
+            if not (50 < glucose < 500):
+                return jsonify({'success': False, 'error': 'Glucose must be between 50-500'}), 400
+            if not (0 < insulin < 1000):
+                return jsonify({'success': False, 'error': 'Insulin must be between 1-999'}), 400
         
-        prediction = int(diabetes_model.predict(features_scaled)[0])
+        # Reorder features to match model training order
+        with timed('reorder'):
+            reordered_features = bundle.reorder(age, bmi, glucose, insulin)
+        
+        with timed('predict'):
+            if prediction_batcher is not None:
+                prediction = int(prediction_batcher.predict(reordered_features, bundle))
+            else:
+                prediction = bundle.predict_risk(reordered_features)
         prediction_text = 'Risiko Tinggi' if prediction == 1 else 'Risiko Rendah'
         
         # Save to database
-        prediction_id = save_prediction_to_db(age, bmi, glucose, insulin, prediction)
+        with timed('db_insert'):
+            prediction_id = save_prediction_to_db(age, bmi, glucose, insulin, prediction)
         
         # Create debug information
         original_order = [age, bmi, glucose, insulin]
@@ -703,11 +915,11 @@ def predict():
         debug_info = {
             'original_order': original_order,
             'reordered_features': reordered_features,
-            'expected_order': list(feature_order) if feature_order is not None else ['Glucose', 'Insulin', 'BMI', 'Age'],
+            'expected_order': list(bundle.feature_order) if bundle.feature_order is not None else ['Glucose', 'Insulin', 'BMI', 'Age'],
             'feature_mapping': feature_mapping
         }
 
-        return jsonify({
+        response = {
             'success': True,
             'prediction': prediction,
             'prediction_text': prediction_text,
@@ -719,7 +931,6 @@ def predict():
                 'insulin': insulin
             },
             'debug_info': debug_info,
-            'scaled_input': features_scaled[0].tolist(),
             'message': f'Prediksi berhasil: {prediction_text}',
             'model_info': {
                 'type': 'ML_Model_Only',
@@ -727,7 +938,16 @@ def predict():
                 'note': 'Menggunakan model ML untuk kategorisasi diabetes'
             },
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        
+        # The model no longer needs scaled inputs; compute them only for debugging
+        profile = response_profile(data)
+        if profile == 'debug':
+            response['scaled_input'] = bundle.scale(reordered_features)[0].tolist()
+        elif profile == 'lean':
+            response = lean_prediction(response)
+        
+        return json_response(response)
         
     except ValueError as e:
         return jsonify({
@@ -735,18 +955,202 @@ def predict():
             'error': f'Invalid input data: {str(e)}'
         }), 400
     except Exception as e:
-        print(f"[ERROR] Error in predict: {e}")
-        traceback.print_exc()
+        logger.exception("Error in predict")
         return jsonify({
             'success': False,
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """Batch diabetes prediction endpoint for cohort scoring"""
+    try:
+        bundle = current_bundle()
+        if not bundle.model_ready:
+            return jsonify({
+                'success': False,
+                'error': 'Diabetes model or scaler not available'
+            }), 500
+
+        with timed('parse'):
+            data = request.json
+        records = data.get('records') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({
+                'success': False,
+                'error': 'Records must be a non-empty array'
+            }), 400
+
+        if len(records) > MAX_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'Batch size exceeds limit of {MAX_BATCH_SIZE} records'
+            }), 400
+
+        with timed('validate'):
+            features, errors = validate_batch_records(records)
+            valid_rows = np.array([error is None for error in errors], dtype=bool)
+
+        predictions = np.zeros(len(records), dtype=int)
+        if valid_rows.any():
+            # Scale and predict the whole cohort in one call each
+            with timed('reorder'):
+                reordered = bundle.reorder_matrix(features[valid_rows])
+            with timed('predict'):
+                predictions[valid_rows] = bundle.predict_risk_matrix(reordered)
+
+        valid_indices = np.flatnonzero(valid_rows)
+        with timed('db_insert'):
+            prediction_ids = save_predictions_batch_to_db([
+                (*features[i], predictions[i]) for i in valid_indices
+            ])
+        id_by_row = dict(zip(valid_indices.tolist(), prediction_ids))
+
+        results = []
+        for i, error in enumerate(errors):
+            if error is not None:
+                results.append({'index': i, 'success': False, 'error': error})
+                continue
+
+            age, bmi, glucose, insulin = features[i].tolist()
+            prediction = int(predictions[i])
+            results.append({
+                'index': i,
+                'success': True,
+                'prediction': prediction,
+                'prediction_text': 'Risiko Tinggi' if prediction == 1 else 'Risiko Rendah',
+                'prediction_id': id_by_row.get(i),
+                'input_data': {
+                    'age': age,
+                    'bmi': bmi,
+                    'glucose': glucose,
+                    'insulin': insulin
+                }
+            })
+
+        return json_response({
+            'success': True,
+            'results': results,
+            'summary': {
+                'total': len(records),
+                'predicted': int(valid_rows.sum()),
+                'failed': int((~valid_rows).sum()),
+                'high_risk': int(predictions[valid_rows].sum())
+            },
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.exception("Error in predict_batch")
+        return jsonify({
+            'success': False,
+            'error': f'Internal server error: {str(e)}'
+        }), 500
+
+def score_stream_chunk(bundle, chunk, first_index, summary):
+    """Validate, predict and store one chunk of an upload, returning its NDJSON result lines"""
+    with timed('validate'):
+        features, errors = validate_batch_records([record if record is not None else {}
+                                                   for _, record, _ in chunk])
+        for i, (_, _, parse_error) in enumerate(chunk):
+            if parse_error is not None:
+                errors[i] = parse_error
+        valid_rows = np.array([error is None for error in errors], dtype=bool)
+
+    predictions = np.zeros(len(chunk), dtype=int)
+    if valid_rows.any():
+        with timed('reorder'):
+            reordered = bundle.reorder_matrix(features[valid_rows])
+        with timed('predict'):
+            predictions[valid_rows] = bundle.predict_risk_matrix(reordered)
+
+    valid_indices = np.flatnonzero(valid_rows)
+    with timed('db_insert'):
+        prediction_ids = save_predictions_batch_to_db([
+            (*features[i], predictions[i]) for i in valid_indices
+        ])
+    id_by_row = dict(zip(valid_indices.tolist(), prediction_ids))
+
+    summary['total'] += len(chunk)
+    summary['predicted'] += int(valid_rows.sum())
+    summary['failed'] += int((~valid_rows).sum())
+    summary['high_risk'] += int(predictions[valid_rows].sum())
+
+    results = []
+    for i, (line_number, _, _) in enumerate(chunk):
+        if errors[i] is not None:
+            result = {'index': first_index + i, 'line': line_number, 'success': False, 'error': errors[i]}
+        else:
+            age, bmi, glucose, insulin = features[i].tolist()
+            prediction = int(predictions[i])
+            result = {
+                'index': first_index + i,
+                'line': line_number,
+                'success': True,
+                'prediction': prediction,
+                'prediction_text': 'Risiko Tinggi' if prediction == 1 else 'Risiko Rendah',
+                'prediction_id': id_by_row.get(i),
+                'input_data': {
+                    'age': age,
+                    'bmi': bmi,
+                    'glucose': glucose,
+                    'insulin': insulin
+                }
+            }
+        results.append(result)
+    with timed('encode'):
+        return b''.join(dumps(result) + b'\n' for result in results)
+
+@app.route('/predict_stream', methods=['POST'])
+def predict_stream():
+    """Bulk scoring of a CSV or NDJSON upload, streamed back as NDJSON while the upload is read
+
+    Each result line carries the row's 0-based `index` and its `line` in the
+    upload. Rows failing validation are reported inline; the last line is
+    the summary.
+    """
+    bundle = current_bundle()
+    if not bundle.model_ready:
+        return json_response({
+            'success': False,
+            'error': 'Diabetes model or scaler not available'
+        }, status=500)
+
+    try:
+        fmt = upload_format(request.args.get('format'), request.mimetype)
+    except UploadFormatError as e:
+        return json_response({'success': False, 'error': str(e)}, status=400)
+
+    def generate():
+        summary = {'total': 0, 'predicted': 0, 'failed': 0, 'high_risk': 0}
+        completed = True
+        try:
+            records = iter_records(iter_lines(request.stream), fmt)
+            for chunk in iter_chunks(records):
+                yield score_stream_chunk(bundle, chunk, summary['total'], summary)
+        except UploadFormatError as e:
+            completed = False
+            yield dumps({'success': False, 'error': str(e)}) + b'\n'
+        except Exception as e:
+            completed = False
+            logger.exception("Error in predict_stream")
+            yield dumps({'success': False, 'error': f'Internal server error: {str(e)}'}) + b'\n'
+        yield dumps({
+            'success': completed,
+            'summary': summary,
+            'format': fmt,
+            'model_version': bundle.version,
+            'timestamp': datetime.now().isoformat()
+        }) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/recommend_food', methods=['POST'])
 def recommend_food():
     """Food recommendation endpoint using ML prediction and rule-based selection"""
     try:
-        data = request.json
+        with timed('parse'):
+            data = request.json
         if not data:
             return jsonify({
                 'success': False, 
@@ -769,18 +1173,19 @@ def recommend_food():
             }), 400
         
         # Validate user_data
-        required_user_fields = ['age', 'bmi', 'glucose', 'insulin']
-        for field in required_user_fields:
-            if field not in user_data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing user data field: {field}'
-                }), 400
+        with timed('validate'):
+            required_user_fields = ['age', 'bmi', 'glucose', 'insulin']
+            for field in required_user_fields:
+                if field not in user_data:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Missing user data field: {field}'
+                    }), 400
         
         # Get recommendations using ML prediction and rule-based selection
-        recommendations, ml_prediction, gi_strategy, debug_info = get_food_recommendations(category, user_data)
+        payload, debug_info = recommend_category(category, user_data)
         
-        if not recommendations:
+        if payload is None:
             return jsonify({
                 'success': False,
                 'error': 'No recommendations found for this category',
@@ -788,51 +1193,129 @@ def recommend_food():
                 'suggestion': 'Try a different category'
             }), 404
         
+        if response_profile(data) == 'lean':
+            return json_response(lean_recommendation(payload))
+        return json_response(dict(payload, user_profile=user_data, timestamp=datetime.now().isoformat()))
+            
+    except Exception as e:
+        logger.exception("Error in recommend_food")
         return jsonify({
+            'success': False, 
+            'error': f'Internal server error: {str(e)}'
+        }), 500
+
+@app.route('/assess', methods=['POST'])
+def assess():
+    """Risk prediction plus recommendations for every food category in one call
+
+    The diabetes model runs once and the prediction is stored once; every
+    category in CATEGORY_MAPPING then reuses that risk class. Each
+    category entry has the same shape as a /recommend_food response.
+    """
+    try:
+        bundle = current_bundle()
+        if not bundle.model_ready:
+            return jsonify({
+                'success': False,
+                'error': 'Diabetes model or scaler not available'
+            }), 500
+            
+        with timed('parse'):
+            data = request.json
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'No data provided'
+            }), 400
+        
+        # Same field and range checks as /predict
+        with timed('validate'):
+            features, errors = validate_batch_records([data])
+        if errors[0] is not None:
+            return jsonify({'success': False, 'error': errors[0]}), 400
+        age, bmi, glucose, insulin = (float(value) for value in features[0])
+        
+        with timed('reorder'):
+            reordered_features = bundle.reorder(age, bmi, glucose, insulin)
+        with timed('predict'):
+            prediction = bundle.predict_risk(reordered_features)
+        prediction_text = 'Risiko Tinggi' if prediction == 1 else 'Risiko Rendah'
+        
+        # Save to database once for the whole assessment
+        with timed('db_insert'):
+            prediction_id = save_prediction_to_db(age, bmi, glucose, insulin, prediction)
+        
+        # Recommendations use the profile exactly as sent, like /recommend_food
+        user_data = {field: data[field] for field in BATCH_FIELDS}
+        profile = response_profile(data)
+        lean = profile == 'lean'
+        recommendations = {}
+        for category in CATEGORY_MAPPING:
+            payload, debug_info = recommend_category(category, user_data, ml_prediction=prediction, bundle=bundle)
+            if payload is None:
+                recommendations[category] = {
+                    'success': False,
+                    'error': 'No recommendations found for this category'
+                }
+                if profile == 'debug':
+                    recommendations[category]['debug_info'] = debug_info
+            else:
+                recommendations[category] = lean_recommendation(payload) if lean else payload
+        
+        if lean:
+            return json_response({
+                'success': True,
+                'prediction': prediction,
+                'prediction_text': prediction_text,
+                'prediction_id': prediction_id,
+                'recommendations': recommendations
+            })
+        
+        return json_response({
             'success': True,
+            'prediction': prediction,
+            'prediction_text': prediction_text,
+            'prediction_id': prediction_id,
+            'input_data': {
+                'age': age,
+                'bmi': bmi,
+                'glucose': glucose,
+                'insulin': insulin
+            },
+            'message': f'Prediksi berhasil: {prediction_text}',
+            'categories': list(CATEGORY_MAPPING),
             'recommendations': recommendations,
-            'source': 'rule_based_with_ml_prediction',
-            'category_requested': category,
-            'total_recommendations': len(recommendations),
             'user_profile': user_data,
-            'ml_prediction': ml_prediction,
-            'gi_strategy': gi_strategy,
-            'model_used': 'rule_based_with_ml_prediction',
-            'debug_info': debug_info,
-            'personalization_info': {
-                'user_seed': debug_info.get('user_seed'),
-                'unique_selection': 'Each user gets different foods based on their input',
-                'strategy': 'ML prediction determines GI prioritization'
-            },
-            'algorithm_info': {
-                'prediction_method': 'ML Model Only',
-                'food_selection': 'Rule-based Algorithm',
-                'categories': ['Risiko Tinggi', 'Risiko Rendah'],
-                'gi_strategy_high_risk': 'Prioritas GI terendah',
-                'gi_strategy_low_risk': 'GI fleksibel'
-            },
             'timestamp': datetime.now().isoformat()
         })
-            
+        
     except Exception as e:
-        print(f"[ERROR] Error in recommend_food: {e}")
-        traceback.print_exc()
+        logger.exception("Error in assess")
         return jsonify({
-            'success': False, 
+            'success': False,
             'error': f'Internal server error: {str(e)}'
         }), 500
 
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
+    bundle = current_bundle()
+    serving = bundle.model_ready and bundle.food_data is not None
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if serving else 'degraded',
+        'ready': serving and warmup.ready,
         'timestamp': datetime.now().isoformat(),
         'models_loaded': {
-            'diabetes_model': diabetes_model is not None,
-            'diabetes_scaler': diabetes_scaler is not None,
-            'food_data': food_data is not None
+            'diabetes_model': bundle.model is not None,
+            'diabetes_scaler': bundle.scaler is not None,
+            'food_data': bundle.food_data is not None
         },
+        'model_bundle': bundle_reloader.stats(),
+        'db_pool': db_pool.stats(),
+        'prediction_writes': prediction_write_stats(),
+        'recommendation_cache': recommendation_cache.stats(),
+        'predict_batching': prediction_batching_stats(),
+        'inference_threads': thread_settings(),
         'system_features': {
             'ml_prediction_only': True,
             'categories': ['Risiko Tinggi', 'Risiko Rendah'],
@@ -845,6 +1328,133 @@ def health_check():
         }
     })
 
+@app.route('/ready')
+def readiness_check():
+    """Readiness probe: 503 until warm-up has finished and the bundle can serve predictions"""
+    bundle = current_bundle()
+    ready = warmup.ready and bundle.model_ready and bundle.food_data is not None
+    return jsonify({
+        'ready': ready,
+        'model_version': bundle.version,
+        'warmup': warmup.stats()
+    }), 200 if ready else 503
+
+@app.route('/db_pool_stats')
+def db_pool_stats():
+    """Connection pool statistics for monitoring"""
+    return jsonify(db_pool.stats())
+
+@app.route('/write_queue_stats')
+def write_queue_stats():
+    """Write-behind queue depth and dropped rows for monitoring"""
+    return jsonify(prediction_write_stats())
+
+@app.route('/predict_batching_stats')
+def predict_batching_stats():
+    """Micro-batching scheduler metrics for monitoring"""
+    return jsonify(prediction_batching_stats())
+
+@app.route('/recommendation_cache_stats')
+def recommendation_cache_stats():
+    """Hit, miss and eviction counters of the recommendation cache"""
+    return jsonify(recommendation_cache.stats())
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload model, scaler and food catalog in the background and swap them in when valid
+
+    Requires the X-Admin-Token header to match ADMIN_TOKEN. With ?wait=1 the
+    request waits for the reload and returns its result.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Reload endpoint disabled, ADMIN_TOKEN is not set'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'success': False, 'error': 'Invalid admin token'}), 401
+
+    if request.args.get('wait', '').lower() in ('1', 'true', 'yes'):
+        result = bundle_reloader.reload('admin')
+        if result['status'] == 'in_progress':
+            return jsonify(result), 409
+        return jsonify(result), 200 if result['success'] else 422
+
+    if not bundle_reloader.reload_in_background('admin'):
+        return jsonify({'success': False, 'status': 'in_progress'}), 409
+    return jsonify({
+        'success': True,
+        'status': 'started',
+        'active_version': bundle_reloader.active.version
+    }), 202
+
+# Synthetic profiles for warm-up; none of their predictions are stored
+WARMUP_PROFILES = [
+    {'age': 45, 'bmi': 28.5, 'glucose': 130, 'insulin': 15},
+    {'age': 25, 'bmi': 21.0, 'glucose': 90, 'insulin': 8},
+    {'age': 67, 'bmi': 34.2, 'glucose': 210, 'insulin': 120},
+]
+
+warmup = WarmUp()
+warmup.record('load_bundle', bundle_load_seconds, ok=bundle_reloader.active.model_ready,
+              detail={'model_version': bundle_reloader.active.version})
+
+@warmup.step('predict')
+def _warm_predict():
+    """Single-row and batch predictions through validation and the bundle's serving paths"""
+    bundle = bundle_reloader.active
+    if not bundle.model_ready:
+        raise RuntimeError('Diabetes model or scaler not available')
+    features, _ = validate_batch_records(WARMUP_PROFILES)
+    reordered = bundle.reorder_matrix(features)
+    for row in reordered.tolist():
+        bundle.predict_risk(row)
+    if prediction_batcher is not None:
+        prediction_batcher.predict(reordered[0].tolist(), bundle)
+    bundle.predict_risk_matrix(reordered)
+    bundle.scale(reordered)
+    return {'rows': len(reordered)}
+
+@warmup.step('recommend')
+def _warm_recommend():
+    """Every category for every synthetic profile, bypassing the recommendation cache"""
+    bundle = bundle_reloader.active
+    if bundle.food_data is None:
+        raise RuntimeError('Food data not available')
+    served = 0
+    for profile in WARMUP_PROFILES:
+        for category in CATEGORY_MAPPING:
+            recommendations, _, _, _ = get_food_recommendations(category, profile, bundle=bundle)
+            served += len(recommendations)
+    return {'recommendations': served}
+
+@warmup.step('encode')
+def _warm_encode():
+    """First use of both JSON encoders on a recommendation-sized payload"""
+    recommendations, ml_prediction_text, gi_strategy, debug_info = get_food_recommendations(
+        'Sayur', WARMUP_PROFILES[0], bundle=bundle_reloader.active
+    )
+    payload = {'success': True, 'recommendations': recommendations, 'ml_prediction': ml_prediction_text,
+               'gi_strategy': gi_strategy, 'debug_info': debug_info}
+    with app.test_request_context():
+        json_response(payload)
+        json_response(lean_recommendation(payload))
+        jsonify(payload)
+
+@warmup.step('http')
+def _warm_http():
+    """One request through Flask routing and the request/response hooks"""
+    return {'status': app.test_client().get('/health').status_code}
+
+@warmup.step('db_connections', required=False)
+def _warm_db_connections():
+    """Open the pool's initial connections and run one query on them"""
+    opened = db_pool.prefill()
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+    return {'opened': opened, 'pool_size': db_pool.stats()['size']}
+
+warmup.start()
+
 if __name__ == '__main__':
     print("DiabCare Backend Server - ML Model Only")
     print("=" * 50)
@@ -853,9 +1463,11 @@ if __name__ == '__main__':
     db_ready = init_database()
     
     # Status check
-    print(f"Diabetes model: {'Ready' if diabetes_model is not None else 'Not Found'}")
-    print(f"Diabetes scaler: {'Ready' if diabetes_scaler is not None else 'Not Found'}")
-    print(f"Food data (CSV): {'Ready' if food_data is not None else 'Not Found'}")
+    bundle = bundle_reloader.active
+    print(f"Diabetes model: {'Ready' if bundle.model is not None else 'Not Found'}")
+    print(f"Diabetes scaler: {'Ready' if bundle.scaler is not None else 'Not Found'}")
+    print(f"Food data (CSV): {'Ready' if bundle.food_data is not None else 'Not Found'}")
+    print(f"Model bundle: {bundle.version}")
     print(f"Database: {'Ready' if db_ready else 'Error'}")
     
     print("=" * 50)
@@ -874,5 +1486,4 @@ if __name__ == '__main__':
     try:
         app.run(debug=True, host='0.0.0.0', port=5000)
     except Exception as e:
-        print(f"[ERROR] Failed to start server: {e}")
-        traceback.print_exc()
+        logger.exception("Failed to start server")
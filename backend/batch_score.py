@@ -0,0 +1,253 @@
+"""Offline batch scorer for CSV archives of screening rows
+
+Scores a CSV file with a header naming age, bmi, glucose and insulin (any
+order or case, other columns ignored) without going through the Flask
+app. The model is loaded with the same load_models() and ServingBundle as
+backend/app.py, so rows are reordered, range-checked and predicted exactly
+like /predict_batch.
+
+The input is split at line boundaries into byte ranges. The model is
+loaded once up front, so a bad model path fails before any work starts.
+A process pool then scores the ranges, and each worker loads the model
+once when it starts. Results come back in range order and are appended
+to the output as they arrive, so the output has one line per input row,
+in input order:
+
+  prediction,probability,error
+
+`probability` (of class 1) is only written with --proba. Rows failing
+validation have an empty prediction and the error message. Quoted fields
+spanning several lines are not supported.
+
+    python batch_score.py archive.csv predictions.csv [--workers N] [--proba]
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from inference_threads import limit_native_threads, set_batch_threads
+from model_bundle import ServingBundle, load_models, range_errors
+from region_table import file_checksum
+from stream_scoring import CSV_FIELDS
+
+DEFAULT_MODEL_PATH = 'model.pkl'
+DEFAULT_SCALER_PATH = 'scaler.pkl'
+
+# Byte ranges per task; small enough that results stream out steadily,
+# large enough that pandas parsing dominates the per-task overhead
+MIN_RANGE_BYTES = 1 << 20
+MAX_RANGE_BYTES = 16 << 20
+# Rows per model call within a range
+BATCH_ROWS = 8192
+
+_worker = None
+
+
+class _RangeScorer:
+    """Per-process state: the bundle and how to read the input file"""
+
+    def __init__(self, model_path, scaler_path, input_path, header, proba, threads):
+        # Classes come from the region table, the fastest way through whole
+        # ranges. Probabilities can't, and the artifact's flat engine is built
+        # for small batches, so --proba loads the pickles for sklearn's
+        # predict_proba, which is several times faster on whole ranges
+        fields = load_models(model_path, scaler_path, file_checksum(model_path, scaler_path), use_artifact=not proba,
+                             use_region_table=True)
+        self.bundle = ServingBundle(**fields)
+        if not self.bundle.model_ready:
+            raise RuntimeError(f"Could not load {model_path} and {scaler_path}")
+        # Processes are the parallelism here; each gets its share of the cores as model threads
+        limit_native_threads()
+        set_batch_threads(threads)
+        self.input_path = input_path
+        self.header = header
+        # Column of each of age, bmi, glucose and insulin in the CSV
+        self.positions = [header.index(field) for field in CSV_FIELDS]
+        self.proba = proba
+
+    def parse(self, data):
+        """(n, 4) [age, bmi, glucose, insulin] features and per-row parse errors"""
+        try:
+            # round_trip parses every number exactly like Python's float()
+            frame = pd.read_csv(io.BytesIO(data), header=None, names=range(len(self.header)),
+                                usecols=self.positions, dtype=np.float64, skip_blank_lines=False,
+                                float_precision='round_trip')
+            features = frame[self.positions].to_numpy(dtype=np.float64)
+            errors = [None] * len(features)
+            for row in np.flatnonzero(np.isnan(features).any(axis=1)):
+                missing = CSV_FIELDS[int(np.flatnonzero(np.isnan(features[row]))[0])]
+                errors[row] = f'Missing required field: {missing}'
+            return features, errors
+        except (ValueError, pd.errors.ParserError):
+            # Non-numeric values or ragged rows somewhere in the range
+            return self.parse_lines(data)
+
+    def parse_lines(self, data):
+        """Line-by-line fallback for ranges pandas cannot parse as numbers"""
+        lines = data.decode('utf-8', errors='replace').split('\n')
+        if lines and lines[-1] == '':
+            lines.pop()
+        features = np.full((len(lines), len(CSV_FIELDS)), np.nan)
+        errors = [None] * len(lines)
+        for i, line in enumerate(lines):
+            values = next(csv.reader([line.rstrip('\r')]), [])
+            for column, (field, position) in enumerate(zip(CSV_FIELDS, self.positions)):
+                value = values[position].strip() if position < len(values) else ''
+                if not value:
+                    errors[i] = f'Missing required field: {field}'
+                    break
+                try:
+                    features[i, column] = float(value)
+                except ValueError as e:
+                    errors[i] = f'Invalid input data: {str(e)}'
+                    break
+        return features, errors
+
+    def score(self, start, end):
+        """Score the rows in bytes [start, end) of the input; returns output text and counts"""
+        with open(self.input_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+
+        features, errors = self.parse(data)
+        range_errors(features, errors)
+        valid_rows = np.array([error is None for error in errors], dtype=bool)
+
+        predictions = np.zeros(len(features), dtype=int)
+        probabilities = np.full(len(features), np.nan)
+        valid_indices = np.flatnonzero(valid_rows)
+        for batch_start in range(0, len(valid_indices), BATCH_ROWS):
+            rows = valid_indices[batch_start:batch_start + BATCH_ROWS]
+            reordered = self.bundle.reorder_matrix(features[rows])
+            predictions[rows] = self.bundle.predict_risk_matrix(reordered)
+            if self.proba:
+                probabilities[rows] = self.bundle.predict_proba_matrix(reordered)[:, 1]
+
+        output = pd.DataFrame({'prediction': pd.array(predictions, dtype='Int64')})
+        output.loc[~valid_rows, 'prediction'] = pd.NA
+        if self.proba:
+            output['probability'] = probabilities
+        output['error'] = errors
+        text = output.to_csv(header=False, index=False, lineterminator='\n')
+        return text.encode('utf-8'), len(features), int(valid_rows.sum()), int(predictions[valid_rows].sum())
+
+
+def _init_worker(*args):
+    global _worker
+    _worker = _RangeScorer(*args)
+
+
+def _score_range(span):
+    return _worker.score(*span)
+
+
+def read_header(input_path):
+    """Lower-cased CSV header and the byte offset of the first data row"""
+    with open(input_path, 'rb') as f:
+        line = f.readline()
+        header = [name.strip().lower() for name in next(csv.reader([line.decode('utf-8-sig').rstrip('\r\n')]))]
+        missing = [field for field in CSV_FIELDS if field not in header]
+        if missing:
+            raise ValueError(f"CSV header is missing required column: {missing[0]}")
+        return header, f.tell()
+
+
+def split_ranges(input_path, data_start, workers):
+    """Byte ranges of whole lines covering the data rows, several per worker"""
+    size = os.path.getsize(input_path)
+    target = min(max((size - data_start) // (workers * 8), MIN_RANGE_BYTES), MAX_RANGE_BYTES)
+    boundaries = [data_start]
+    with open(input_path, 'rb') as f:
+        while boundaries[-1] < size:
+            f.seek(min(boundaries[-1] + target, size))
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def score_file(input_path, output_path, workers=None, proba=False, threads=None,
+               model_path=DEFAULT_MODEL_PATH, scaler_path=DEFAULT_SCALER_PATH):
+    """Score input_path into output_path; returns row counts and timings"""
+    cores = os.cpu_count() or 1
+    workers = workers or cores
+    threads = threads or max(1, cores // workers)
+    header, data_start = read_header(input_path)
+    ranges = split_ranges(input_path, data_start, workers)
+    init_args = (model_path, scaler_path, input_path, header, proba, threads)
+
+    started = time.perf_counter()
+    # Loaded here first so a missing or broken model fails before the pool
+    # starts; a Pool whose initializer raises keeps replacing dead workers
+    scorer = _RangeScorer(*init_args)
+    totals = {'rows': 0, 'predicted': 0, 'high_risk': 0}
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=init_args)
+        results = pool.imap(_score_range, ranges)
+    else:
+        results = (scorer.score(*span) for span in ranges)
+
+    temp_path = output_path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as out:
+            out.write(b'prediction,probability,error\n' if proba else b'prediction,error\n')
+            for text, rows, predicted, high_risk in results:
+                out.write(text)
+                totals['rows'] += rows
+                totals['predicted'] += predicted
+                totals['high_risk'] += high_risk
+        os.replace(temp_path, output_path)
+    except BaseException:
+        # Don't leave a partial output behind when a range fails or the run is interrupted
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **totals,
+        'failed': totals['rows'] - totals['predicted'],
+        'workers': workers,
+        'threads': threads,
+        'ranges': len(ranges),
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(totals['rows'] / elapsed) if elapsed > 0 else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Score a CSV archive with the diabetes model')
+    parser.add_argument('input', help='CSV with age, bmi, glucose and insulin columns')
+    parser.add_argument('output', help='CSV to write, one line per input row')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--proba', action='store_true', help='also write the probability of class 1')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='model threads per worker for large batches (default: cores / workers)')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--scaler', default=DEFAULT_SCALER_PATH)
+    args = parser.parse_args()
+
+    try:
+        report = score_file(args.input, args.output, workers=args.workers, proba=args.proba, threads=args.threads,
+                            model_path=args.model, scaler_path=args.scaler)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"[INFO] Scored {report['rows']} rows ({report['predicted']} predicted, {report['failed']} failed, "
+          f"{report['high_risk']} high risk) with {report['workers']} workers x {report['threads']} threads "
+          f"over {report['ranges']} ranges")
+    print(f"[INFO] {report['seconds']:.1f}s, {report['rows_per_second']} rows/s -> {args.output}")
@@ -0,0 +1,96 @@
+"""Worker cold start from the pickles versus the serving artifact
+
+Starts fresh interpreters, the way gunicorn boots workers, and times
+getting the diabetes model ready in each loading mode:
+
+  pickle    joblib.load('model.pkl') and joblib.load('scaler.pkl'), then
+            load_models(use_artifact=False), which also compiles and
+            verifies the flat engines (what every worker did before)
+  artifact  load_artifact('model.artifact'), then load_models(), which
+            maps the same file
+
+"files" is the time until model, scaler and feature order are usable,
+including the imports they need. "load_models" is the time load_models()
+takes in a new process, which is what app.py spends per worker before
+the food catalog. "process" is the wall time of the whole interpreter as
+seen by the parent. Each figure is the median over the runs. The report
+also shows whether sklearn was imported.
+
+    python cold_start_report.py [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = ('pickle', 'artifact')
+MODEL_PATH = 'model.pkl'
+SCALER_PATH = 'scaler.pkl'
+
+
+def _worker(mode):
+    started = time.perf_counter()
+    if mode == 'pickle':
+        import joblib
+        model = joblib.load(MODEL_PATH)
+        scaler = joblib.load(SCALER_PATH)
+        order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+    else:
+        from model_artifact import load_artifact
+        artifact = load_artifact()
+        model, scaler, order = artifact.engine, artifact.scaler, artifact.feature_order
+    files = time.perf_counter() - started
+
+    from model_bundle import load_models
+    from region_table import file_checksum
+
+    started = time.perf_counter()
+    fields = load_models(MODEL_PATH, SCALER_PATH, file_checksum(MODEL_PATH, SCALER_PATH),
+                         use_artifact=mode == 'artifact')
+    bundle_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        'files': files,
+        'load_models': bundle_seconds,
+        'sklearn': 'sklearn' in sys.modules,
+        'model': type(fields.get('model')).__name__,
+        'features': len(order),
+    }), flush=True)
+    return model, scaler
+
+
+def measure(mode, runs):
+    """Per-run timings of `runs` fresh interpreters loading the model the given way"""
+    rows = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', mode],
+                                capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        process = time.perf_counter() - started
+        rows.append({**json.loads(output.strip().splitlines()[-1]), 'process': process})
+    return rows
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--worker']:
+        _worker(sys.argv[2])
+        sys.exit(0)
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'mode':<9} {'files ms':>9} {'load_models ms':>15} {'process ms':>11} {'sklearn':>8}  model")
+    results = {}
+    for mode in MODES:
+        rows = measure(mode, runs)
+        results[mode] = {key: _median([row[key] for row in rows]) for key in ('files', 'load_models', 'process')}
+        print(f"{mode:<9} {results[mode]['files'] * 1e3:>9.1f} {results[mode]['load_models'] * 1e3:>15.1f} "
+              f"{results[mode]['process'] * 1e3:>11.1f} {str(rows[0]['sklearn']):>8}  {rows[0]['model']}")
+    for key in ('files', 'load_models', 'process'):
+        print(f"[INFO] {key}: {results['pickle'][key] / results['artifact'][key]:.1f}x faster from the artifact")
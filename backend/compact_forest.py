@@ -0,0 +1,298 @@
+"""Compact float32/uint16 representation of the diabetes forest
+
+sklearn keeps every tree node as a 64-byte struct (int64 children,
+feature and sample counts, float64 threshold and impurity) plus float64
+class values. FlatForest drops the unused fields but still spends 48
+bytes per node. A 4-feature binary classifier needs far less:
+
+  feature    uint8    split feature
+  threshold  float32  split threshold in raw input units (scaler folded in)
+  children   uint32   left and right child offsets side by side, (n, 2)
+  value      uint16   leaf class probabilities times LEAF_QUANTIZATION
+
+That is 17 bytes per node, against 80 for the pickled trees, so the
+forest takes a fraction of the cache. A prediction also touches fewer
+cache lines than with either float64 layout.
+
+The compact forest is built from the scaler-folded engine and takes raw
+float64 rows, so /predict does not scale. Each threshold is the largest
+float32 not above the folded float64 threshold. A raw value then splits
+exactly like the folded engine unless it lies strictly inside the float32
+step above a threshold that float32 cannot represent, e.g. a 1-decimal
+BMI at a training-data midpoint. `near_threshold` finds those rows with
+one searchsorted per feature. They are predicted by the folded engine the
+compact forest was built from, so every prediction stays exact.
+
+LEAF_QUANTIZATION is 65520 = 2^4 * 3^2 * 5 * 7 * 13, so leaf fractions
+with small denominators (halves, thirds, fifteenths, ...) are stored
+exactly. Votes are summed as integers. `verify_compact_parity` compares
+predictions with scaler + sklearn on the dense validated-range sample
+plus raw values on both sides of every float32 and float64 threshold. The
+serving artifact only includes the compact forest when that check finds
+no difference. ServingBundle uses it as the /predict engine unless the
+region table is switched on (PREDICT_REGION_TABLE=on). Run this module
+to see the check and the memory and cache footprint next to the pickled
+model:
+
+    python compact_forest.py
+"""
+from bisect import bisect_left
+
+import numpy as np
+
+from forest_engine import FlatForest, sample_validated_inputs, scaler_affine_params
+
+LEAF_QUANTIZATION = 65520
+
+# Bytes per node of sklearn's Tree: the node struct plus class values per output
+SKLEARN_NODE_BYTES = 64
+CACHE_LINE_BYTES = 64
+
+
+class CompactForest(FlatForest):
+    """FlatForest with narrow dtypes and integer leaf votes; takes raw inputs like the folded engine
+
+    `exact` is the scaler-folded FlatForest the thresholds were narrowed
+    from. It predicts the rows that float32 thresholds cannot split exactly.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes, exact,
+                 quantization=LEAF_QUANTIZATION):
+        # Both children of a node share a cache line; left/right are views into it
+        super().__init__(feature, threshold, children[:, 0], children[:, 1], value, roots, max_depth, classes,
+                         input_dtype=np.float64)
+        self.children = children
+        self.quantization = int(quantization)
+        self.exact = exact
+
+        # Per feature, the float32 thresholds below their float64 value and the
+        # next float32 above each; raw values strictly between the two are ambiguous
+        internal = self.left != np.arange(len(self.left), dtype=self.left.dtype)
+        inexact = internal & (threshold.astype(np.float64) != exact.threshold)
+        self.near_bounds = []
+        for f in range(int(feature.max()) + 1 if len(feature) else 0):
+            low = np.unique(threshold[inexact & (feature == f)])
+            self.near_bounds.append((low.astype(np.float64), np.nextafter(low, np.float32(np.inf)).astype(np.float64)))
+        # Python lists for single rows, where bisect beats searchsorted's call overhead
+        self._near_lists = [(low.tolist(), high.tolist()) for low, high in self.near_bounds]
+
+    @classmethod
+    def from_flat(cls, flat, quantization=LEAF_QUANTIZATION):
+        """Narrow a scaler-folded FlatForest; raises ValueError if it does not fit the dtypes"""
+        if flat.input_dtype != np.float64:
+            raise ValueError("Compact forests are built from the scaler-folded engine")
+        if len(flat.feature) > np.iinfo(np.uint32).max or int(flat.feature.max()) > np.iinfo(np.uint8).max:
+            raise ValueError("Forest too large for uint32 child offsets and uint8 feature ids")
+        if quantization > np.iinfo(np.uint16).max:
+            raise ValueError(f"Quantization {quantization} does not fit uint16")
+
+        # Largest float32 not above each threshold, so only values just above it are ambiguous
+        threshold = flat.threshold.astype(np.float32)
+        above = threshold.astype(np.float64) > flat.threshold
+        threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+
+        return cls(
+            feature=flat.feature.astype(np.uint8),
+            threshold=threshold,
+            children=np.ascontiguousarray(np.column_stack([flat.left, flat.right]), dtype=np.uint32),
+            value=np.rint(flat.value * quantization).astype(np.uint16),
+            roots=flat.roots.astype(np.uint32),
+            max_depth=flat.max_depth,
+            classes=flat.classes_,
+            exact=flat,
+            quantization=quantization,
+        )
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_rows)"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+
+        # take() on flat arrays with intp indices avoids the dtype conversions
+        # fancy indexing would do on every step with uint8/uint32 indices.
+        # Lanes are tree-major: lane t * n_rows + r walks tree t for row r.
+        inputs = X.ravel()
+        children = self.children.ravel()
+        feature, threshold = self.feature, self.threshold
+        nodes = np.repeat(self.roots.astype(np.intp), n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.intp) * n_features, self.n_trees) if n_rows > 1 else None
+
+        for _ in range(self.max_depth):
+            columns = feature.take(nodes)
+            if row_offsets is not None:
+                columns = columns + row_offsets
+            # float64 inputs against float32 thresholds compare exactly in float64.
+            # Validated inputs are never NaN, so '>' is the negation of '<='.
+            go_right = inputs.take(columns) > threshold.take(nodes)
+            nodes = children.take(nodes * 2 + go_right).astype(np.intp)
+
+        return nodes.reshape(self.n_trees, n_rows)
+
+    def near_threshold(self, X):
+        """Rows with a value strictly inside the float32 step above an inexact threshold"""
+        if len(X) == 1:
+            row = X[0].tolist()
+            for value, (low, high) in zip(row, self._near_lists):
+                below = bisect_left(low, value) - 1
+                if below >= 0 and value < high[below]:
+                    return np.ones(1, dtype=bool)
+            return np.zeros(1, dtype=bool)
+
+        near = np.zeros(len(X), dtype=bool)
+        for f, (low, high) in enumerate(self.near_bounds):
+            if len(low):
+                values = X[:, f]
+                below = np.searchsorted(low, values) - 1
+                near |= (below >= 0) & (values < high.take(np.maximum(below, 0)))
+        return near
+
+    def votes(self, X):
+        """Quantized class votes summed over all trees, shape (n_rows, n_classes)"""
+        return self.value.take(self.apply(X), axis=0).sum(axis=0, dtype=np.int64)
+
+    def predict_proba(self, X):
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        proba = self.votes(X) / float(self.quantization * self.n_trees)
+        near = self.near_threshold(X)
+        if near.any():
+            proba[near] = self.exact.predict_proba(X[near])
+        return proba
+
+    def predict(self, X):
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        predicted = self.classes_.take(np.argmax(self.votes(X), axis=1), axis=0)
+        near = self.near_threshold(X)
+        if near.any():
+            predicted[near] = self.exact.predict(X[near])
+        return predicted
+
+    @property
+    def nbytes(self):
+        arrays = [self.feature, self.threshold, self.children, self.value, self.roots]
+        arrays += [bound for bounds in self.near_bounds for bound in bounds]
+        return sum(array.nbytes for array in arrays)
+
+
+def quantization_error(flat, compact):
+    """Largest difference between a stored leaf probability and the exact one"""
+    leaves = flat.left == np.arange(len(flat.left))
+    return float(np.abs(compact.value[leaves] / compact.quantization - flat.value[leaves]).max())
+
+
+def verify_compact_parity(model, scaler, feature_order, compact, X_raw=None):
+    """Compare CompactForest on raw inputs with scaler + sklearn model
+
+    Besides the sampled rows, every split is checked on both sides of its
+    float32 and its float64 threshold, where a wrongly rounded threshold or
+    a missed near-threshold row would show up. Predictions must not differ;
+    probabilities are reported as the largest absolute difference.
+    """
+    if X_raw is None:
+        X_raw = sample_validated_inputs(feature_order)
+
+    import pandas as pd
+
+    internal = compact.left != np.arange(len(compact.left), dtype=compact.left.dtype)
+    rng = np.random.default_rng(1)
+    edge_rows = []
+    for f in range(X_raw.shape[1]):
+        nodes = internal & (compact.feature == f)
+        low = np.unique(compact.threshold[nodes])
+        exact = np.unique(compact.exact.threshold[nodes])
+        for values in (low, np.nextafter(low, np.float32(np.inf)), exact, np.nextafter(exact, np.inf)):
+            rows = X_raw[rng.integers(len(X_raw), size=len(values))].copy()
+            rows[:, f] = values
+            edge_rows.append(rows)
+    X_raw = np.vstack([X_raw] + edge_rows)
+
+    X_scaled = scaler.transform(pd.DataFrame(X_raw, columns=feature_order))
+    expected_proba = model.predict_proba(X_scaled)
+    expected = model.predict(X_scaled)
+    proba = compact.predict_proba(X_raw)
+    predicted = compact.predict(X_raw)
+
+    return {
+        'rows_checked': int(len(X_raw)),
+        'rows_near_threshold': int(compact.near_threshold(X_raw).sum()),
+        'prediction_mismatches': int((predicted != expected).sum()),
+        'max_probability_error': float(np.abs(proba - expected_proba).max()),
+    }
+
+
+def _visited_nodes(forest, row):
+    """Nodes read while predicting one row: (all visited nodes, leaves)"""
+    x = np.asarray(row, dtype=forest.input_dtype)
+    nodes = forest.roots.astype(np.intp)
+    visited = [nodes]
+    for _ in range(forest.max_depth):
+        go_left = x[forest.feature[nodes]] <= forest.threshold[nodes]
+        nodes = np.where(go_left, forest.left[nodes], forest.right[nodes]).astype(np.intp)
+        visited.append(nodes)
+    return np.unique(np.concatenate(visited)), nodes
+
+
+def _lines(nodes, itemsize):
+    return len(np.unique(nodes * itemsize // CACHE_LINE_BYTES))
+
+
+def footprint(model, flat, compact, X_scaled):
+    """Memory and per-prediction cache lines of the pickled model, FlatForest and CompactForest"""
+    n_nodes = len(flat.feature)
+    n_classes = flat.n_classes
+    sklearn_bytes = sum(
+        estimator.tree_.node_count * SKLEARN_NODE_BYTES + estimator.tree_.value.nbytes
+        for estimator in model.estimators_
+    )
+    layouts = {
+        # (bytes of the node arrays, [(itemsize, read at every visited node?)])
+        'sklearn pickle': (sklearn_bytes, [(SKLEARN_NODE_BYTES, True), (8 * n_classes, False)]),
+        'flat float64': (n_nodes * (8 * 4 + 8 * n_classes),
+                         [(8, True), (8, True), (8, True), (8, True), (8 * n_classes, False)]),
+        'compact': (compact.nbytes - compact.roots.nbytes,
+                    [(1, True), (4, True), (8, True), (2 * n_classes, False)]),
+    }
+
+    lines = {name: [] for name in layouts}
+    for row in X_scaled:
+        visited, leaves = _visited_nodes(flat, row)
+        for name, (_, arrays) in layouts.items():
+            lines[name].append(sum(_lines(visited if every else leaves, itemsize) for itemsize, every in arrays))
+
+    return {
+        name: {
+            'bytes': int(total),
+            'bytes_per_node': round(total / n_nodes, 1),
+            'cache_lines_per_row': round(float(np.mean(lines[name])), 1),
+            'kb_touched_per_row': round(float(np.mean(lines[name])) * CACHE_LINE_BYTES / 1024, 1),
+        }
+        for name, (total, _) in layouts.items()
+    }
+
+
+if __name__ == '__main__':
+    import joblib
+    import pandas as pd
+
+    model = joblib.load('model.pkl')
+    scaler = joblib.load('scaler.pkl')
+    order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+
+    flat = FlatForest.from_sklearn(model)
+    compact = CompactForest.from_flat(flat.fold_scaler(*scaler_affine_params(scaler)))
+    print(f"[INFO] {compact.n_trees} trees, {len(compact.feature)} nodes, "
+          f"leaf quantization error {quantization_error(flat, compact):.3g}")
+
+    result = verify_compact_parity(model, scaler, order, compact)
+    print(f"[INFO] Compact parity check: {result}")
+    if result['prediction_mismatches']:
+        raise SystemExit("[ERROR] CompactForest predictions differ from scaler + sklearn model")
+
+    sample = sample_validated_inputs(order, n_random=500, grid_points=2)
+    report = footprint(model, flat, compact, scaler.transform(pd.DataFrame(sample, columns=order)))
+    baseline = report['sklearn pickle']
+    print(f"{'representation':<16} {'bytes':>10} {'B/node':>7} {'lines/row':>10} {'KB/row':>7} {'vs pickle':>10}")
+    for name, row in report.items():
+        print(f"{name:<16} {row['bytes']:>10} {row['bytes_per_node']:>7} {row['cache_lines_per_row']:>10} "
+              f"{row['kb_touched_per_row']:>7} {baseline['bytes'] / row['bytes']:>9.1f}x")
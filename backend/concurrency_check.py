@@ -0,0 +1,99 @@
+"""Concurrency stress check for the food recommenders
+
+Both recommenders draw their random picks from a per-request
+random.Random seeded from the user profile, so results must not depend on
+how requests interleave across threads. This script computes every
+(profile, category) result serially, replays the same requests many times
+from a thread pool while other threads keep reseeding the global `random`
+module, and compares the outputs.
+
+    python concurrency_check.py [threads] [rounds]
+"""
+import contextlib
+import io
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+CATEGORIES = ["Protein Hewani", "Protein Nabati", "Karbohidrat", "Sayur", "Buah", "Biji-bijian", "Kacang-kacangan"]
+
+
+def sample_profiles(count=24, seed=0):
+    """User profiles spread over every scoring band"""
+    rng = random.Random(seed)
+    return [
+        {
+            'age': rng.choice([18, 25, 29, 30, 45, 50, 51, 70]),
+            'bmi': rng.choice([17.0, 18.5, 22.3, 25, 25.1, 31.2]),
+            'glucose': rng.choice([70, 100, 101, 126, 127, 180]),
+            'insulin': rng.choice([2, 4.9, 5, 10, 20, 21, 40]),
+        }
+        for _ in range(count)
+    ]
+
+
+def _recommend(module, category, profile):
+    if hasattr(module, 'get_food_recommendations_from_csv'):
+        return module.get_food_recommendations_from_csv(category, profile)
+    recommendations, prediction_text, strategy, _ = module.get_food_recommendations(category, profile)
+    return recommendations, prediction_text, strategy
+
+
+def stress_recommender(module, threads=16, rounds=8, profiles=None):
+    """Replay every request concurrently and count results differing from the serial run"""
+    profiles = profiles or sample_profiles()
+    requests = [(category, profile) for profile in profiles for category in CATEGORIES]
+
+    expected = [_recommend(module, category, profile) for category, profile in requests]
+
+    # Other code touching the global RNG must not leak into the picks
+    stop = threading.Event()
+
+    def reseed_global():
+        while not stop.is_set():
+            random.seed(random.random())
+            random.sample(range(100), 5)
+
+    noise = [threading.Thread(target=reseed_global, daemon=True) for _ in range(2)]
+    for thread in noise:
+        thread.start()
+
+    jobs = [index for _ in range(rounds) for index in range(len(requests))]
+    random.Random(1).shuffle(jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(lambda index: (index, _recommend(module, *requests[index])), jobs))
+    finally:
+        stop.set()
+        for thread in noise:
+            thread.join()
+
+    mismatches = sum(1 for index, result in results if result != expected[index])
+    return {'requests': len(results), 'threads': threads, 'mismatches': mismatches}
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+        import diska
+
+    failed = False
+    for module in (app, diska):
+        started_hour = datetime.now().strftime('%Y%m%d%H')
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = stress_recommender(module, threads=threads, rounds=rounds)
+        if datetime.now().strftime('%Y%m%d%H') != started_hour:
+            print(f"[WARNING] {module.__name__}: the hourly seed changed during the run, rerun the check")
+            failed = True
+            continue
+        print(f"[INFO] {module.__name__}: {result}")
+        failed = failed or result['mismatches'] > 0
+
+    if failed:
+        raise SystemExit("[ERROR] Recommendations depend on thread interleaving")
+    print("[INFO] Recommendations are independent of thread interleaving")
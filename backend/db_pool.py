@@ -0,0 +1,235 @@
+"""Shared PostgreSQL connection pool for the backend apps
+
+Opening a new psycopg2 connection costs a TCP handshake plus a Postgres
+backend fork, so app.py, diska.py and improved_app.py borrow connections
+from one bounded, thread-safe pool instead.
+
+Configuration (environment variables):
+  DB_POOL_MIN          connections opened up front (default 1)
+  DB_POOL_MAX          hard limit on open connections (default 10)
+  DB_POOL_TIMEOUT      seconds to wait for a free connection (default 5)
+  DB_POOL_CHECK_IDLE   ping connections idle longer than this many seconds
+                       before handing them out (default 5, 0 = always)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+from metrics import observe
+
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+DB_POOL_CHECK_IDLE = float(os.environ.get('DB_POOL_CHECK_IDLE', 5))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of psycopg2 connections with borrow-time health checks"""
+
+    def __init__(self, db_config, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, check_idle=DB_POOL_CHECK_IDLE):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: min={minconn}, max={maxconn}")
+
+        self.db_config = dict(db_config)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []          # (connection, returned_at) pairs, most recent last
+        self._size = 0           # open connections, idle + in use + being opened
+        self._waiting = 0
+        self._prefilled = False
+
+        self._borrows = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _connect(self):
+        return psycopg2.connect(**self.db_config)
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if idle_for < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def prefill(self):
+        """Open connections until the pool holds at least minconn"""
+        opened = []
+        with self._lock:
+            missing = max(0, self.minconn - self._size)
+            self._size += missing
+            self._prefilled = True
+        try:
+            for _ in range(missing):
+                opened.append(self._connect())
+        finally:
+            with self._available:
+                self._size -= missing - len(opened)
+                now = time.monotonic()
+                self._idle.extend((conn, now) for conn in opened)
+                self._available.notify(len(opened))
+        return len(opened)
+
+    def getconn(self):
+        """Borrow a healthy connection, waiting up to the pool timeout"""
+        if not self._prefilled:
+            try:
+                self.prefill()
+            except psycopg2.Error:
+                pass
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            conn = None
+            returned_at = None
+            with self._available:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    self._waiting += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._available:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+            elif not self._is_healthy(conn, time.monotonic() - returned_at):
+                self._discard(conn)
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._borrows += 1
+                self._wait_time_total += waited
+                self._wait_time_max = max(self._wait_time_max, waited)
+            observe('db_connect', waited)
+            return conn
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._available:
+            self._size -= 1
+            self._discarded += 1
+            self._available.notify()
+
+    def putconn(self, conn, discard=False):
+        """Return a borrowed connection, rolling back any open transaction"""
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        with self._available:
+            self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def closeall(self):
+        """Close every idle connection; borrowed ones are closed when returned"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._prefilled = False
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Pool gauges and counters for monitoring"""
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'waiting': self._waiting,
+                'borrows': self._borrows,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._borrows, 3) if self._borrows else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config, **kwargs):
+    """Process-wide pool for a database configuration, created on first use"""
+    key = tuple(sorted((k, str(v)) for k, v in db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_config, **kwargs)
+            _pools[key] = pool
+        return pool
@@ -3,16 +3,29 @@ from flask_cors import CORS
 import numpy as np
 import pandas as pd
 import joblib
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 import random
 from datetime import datetime
 import json
+import logging
 import os
 
+from db_pool import get_pool
+from food_index import build_food_index, lookup_category
+from food_scoring import category_nutrients, model_scores, rule_based_scores
+from forest_engine import FlatForest, scaler_affine_params
+from inference_threads import limit_native_threads, serial_model
+from model_artifact import ARTIFACT_PATH, AffineScaler, load_artifact
+from region_table import file_checksum
+from log_config import fields, get_logger
+from metrics import instrument, timed
+from write_behind import PREDICTION_WRITE_MODE, WriteBehindQueue, new_prediction_id
+
+logger = get_logger(__name__)
+
 app = Flask(__name__)
 CORS(app)
+instrument(app)
 
 # Konfigurasi koneksi ke database
 DB_CONFIG = {
@@ -23,6 +36,9 @@ DB_CONFIG = {
     'port': '5432'
 }
 
+# Pool koneksi database bersama, tidak membuka koneksi baru tiap request
+db_pool = get_pool(DB_CONFIG)
+
 # URL CSV data makanan
 FOOD_DATA_URL = "food_data.csv"
 
@@ -31,81 +47,117 @@ DIABETES_MODEL_PATH = 'model.pkl'
 DIABETES_SCALER_PATH = 'scaler.pkl'
 FOOD_MODEL_PATH = 'pred_food.pkl'
 
+def _model_checksum():
+    try:
+        return file_checksum(DIABETES_MODEL_PATH, DIABETES_SCALER_PATH)
+    except OSError:
+        return None
+
+# Serving artifact (dibangun oleh model_artifact.py): model, scaler dan urutan
+# fitur tanpa unpickle dan tanpa sklearn, jika dibangun dari file model yang sama
+try:
+    diabetes_artifact = load_artifact(ARTIFACT_PATH, _model_checksum())
+except Exception as e:
+    logger.warning(f"Serving artifact tidak dapat dipakai, memuat {DIABETES_MODEL_PATH}: {e}")
+    diabetes_artifact = None
+
 # Load model diabetes dan scaler
 try:
-    diabetes_model = joblib.load(DIABETES_MODEL_PATH)
-    print(f"[INFO] Model diabetes berhasil dimuat: {type(diabetes_model)}")
-    
-    # Load scaler untuk preprocessing data
-    diabetes_scaler = joblib.load(DIABETES_SCALER_PATH)
-    print(f"[INFO] Scaler diabetes berhasil dimuat: {type(diabetes_scaler)}")
+    if diabetes_artifact is not None:
+        diabetes_model = diabetes_artifact.engine
+        diabetes_scaler = diabetes_artifact.scaler
+        logger.info(f"Model dan scaler diabetes dimuat dari {ARTIFACT_PATH}: {diabetes_model.n_trees} trees")
+    else:
+        diabetes_model = serial_model(joblib.load(DIABETES_MODEL_PATH))
+        logger.info(f"Model diabetes berhasil dimuat: {type(diabetes_model)}")
+
+        # Load scaler untuk preprocessing data
+        diabetes_scaler = joblib.load(DIABETES_SCALER_PATH)
+        logger.info(f"Scaler diabetes berhasil dimuat: {type(diabetes_scaler)}")
     
     # PENTING: Cek urutan fitur yang benar dari scaler
     if hasattr(diabetes_scaler, 'feature_names_in_'):
         feature_order = diabetes_scaler.feature_names_in_
-        print(f"[INFO] ✅ URUTAN FITUR YANG BENAR: {list(feature_order)}")
+        logger.info(f"URUTAN FITUR YANG BENAR: {list(feature_order)}")
     else:
         # Fallback jika tidak ada feature names
         feature_order = ['Glucose', 'Insulin', 'BMI', 'Age']  # Berdasarkan debug output
-        print(f"[INFO] ⚠️  Menggunakan urutan default: {feature_order}")
+        logger.info(f"Menggunakan urutan default: {feature_order}")
+
+    if diabetes_artifact is None:
+        # Scaling per request tanpa validasi input sklearn; hasilnya identik dengan StandardScaler.transform
+        diabetes_scaler = AffineScaler(*scaler_affine_params(diabetes_scaler), feature_names=feature_order)
         
 except Exception as e:
-    print(f"[ERROR] Gagal memuat model diabetes atau scaler: {e}")
+    logger.error(f"Gagal memuat model diabetes atau scaler: {e}")
     diabetes_model = None
     diabetes_scaler = None
     feature_order = None
 
+# Compile model diabetes ke flat forest engine untuk prediksi satu baris
+try:
+    if diabetes_artifact is not None:
+        diabetes_engine = diabetes_artifact.engine
+    else:
+        diabetes_engine = FlatForest.from_sklearn(diabetes_model) if diabetes_model is not None else None
+    if diabetes_engine is not None:
+        logger.info(f"Flat forest engine siap: {diabetes_engine.n_trees} trees")
+except Exception as e:
+    logger.warning(f"Flat forest engine tidak tersedia, memakai sklearn predict: {e}")
+    diabetes_engine = None
+
 # Load model rekomendasi makanan
 try:
     food_model = joblib.load(FOOD_MODEL_PATH)
-    print(f"[INFO] Model rekomendasi makanan berhasil dimuat: {type(food_model)}")
+    logger.info(f"Model rekomendasi makanan berhasil dimuat: {type(food_model)}")
     
     if isinstance(food_model, pd.DataFrame):
-        print("[INFO] pred_food.pkl adalah DataFrame - akan digunakan sebagai lookup table")
+        logger.info("pred_food.pkl adalah DataFrame - akan digunakan sebagai lookup table")
         food_lookup_data = food_model
         food_ml_model = None
     else:
-        print("[INFO] pred_food.pkl adalah ML model - akan digunakan untuk prediksi")
-        food_ml_model = food_model
+        logger.info("pred_food.pkl adalah ML model - akan digunakan untuk prediksi")
+        food_ml_model = serial_model(food_model)
         food_lookup_data = None
         
 except Exception as e:
-    print(f"[WARNING] Model rekomendasi makanan tidak ditemukan: {e}")
+    logger.warning(f"Model rekomendasi makanan tidak ditemukan: {e}")
     food_model = None
     food_ml_model = None
     food_lookup_data = None
 
+# BLAS dan OpenMP satu thread per proses; batch besar memilih thread per panggilan
+limit_native_threads()
+
 # Load data makanan dari CSV
 try:
     food_data = pd.read_csv(FOOD_DATA_URL)
-    print(f"[INFO] Data makanan berhasil dimuat: {len(food_data)} items")
+    logger.info(f"Data makanan berhasil dimuat: {len(food_data)} items")
     
     if 'Kategori' in food_data.columns:
         food_data['Kategori'] = food_data['Kategori'].str.strip()
         categories = food_data['Kategori'].unique()
-        print(f"[INFO] Kategori tersedia: {list(categories)}")
+        logger.info(f"Kategori tersedia: {list(categories)}")
     else:
-        print("[WARNING] Kolom 'Kategori' tidak ditemukan")
+        logger.warning("Kolom 'Kategori' tidak ditemukan")
+
+    # Index per kategori, dibangun ulang setiap kali katalog dimuat
+    food_index = build_food_index(food_data)
         
 except Exception as e:
-    print(f"[ERROR] Gagal memuat data makanan: {e}")
+    logger.error(f"Gagal memuat data makanan: {e}")
     food_data = None
+    food_index = {}
 
 @contextmanager
 def get_db_connection():
-    """Context manager untuk koneksi database PostgreSQL"""
-    conn = None
+    """Context manager untuk koneksi database PostgreSQL dari pool"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        yield conn
+        with db_pool.connection() as conn:
+            yield conn
     except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"[ERROR] Database error: {e}")
+        logger.error(f"Database error: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def init_database():
     """Cek koneksi database dan tabel predictions"""
@@ -124,7 +176,7 @@ def init_database():
             table_exists = cursor.fetchone()[0]
             
             if not table_exists:
-                print("[INFO] Tabel predictions tidak ditemukan, membuat tabel baru...")
+                logger.info("Tabel predictions tidak ditemukan, membuat tabel baru...")
                 cursor.execute("""
                     CREATE TABLE predictions (
                         id SERIAL PRIMARY KEY,
@@ -133,18 +185,23 @@ def init_database():
                         glucose INTEGER NOT NULL,
                         insulin FLOAT NOT NULL,
                         prediction INTEGER NOT NULL,
+                        client_id UUID,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
                 """)
                 conn.commit()
-                print("[INFO] Tabel predictions berhasil dibuat")
+                logger.info("Tabel predictions berhasil dibuat")
                 return True
             else:
-                print("[INFO] Tabel predictions sudah ada")
+                logger.info("Tabel predictions sudah ada")
+
+                # Baris write-behind memakai id yang dibuat di sisi aplikasi
+                cursor.execute("ALTER TABLE predictions ADD COLUMN IF NOT EXISTS client_id UUID")
+                conn.commit()
                 return True
                 
     except Exception as e:
-        print(f"[ERROR] Failed to check/create database: {e}")
+        logger.error(f"Failed to check/create database: {e}")
         return False
 
 def reorder_features_for_model(age, bmi, glucose, insulin):
@@ -171,12 +228,19 @@ def reorder_features_for_model(age, bmi, glucose, insulin):
         if feature_name in feature_mapping:
             reordered.append(feature_mapping[feature_name])
         else:
-            print(f"[WARNING] Feature {feature_name} tidak ditemukan dalam mapping")
+            logger.warning("Feature tidak ditemukan dalam mapping", extra=fields(feature=feature_name))
             
     return reordered
 
 def save_prediction_to_db(age, bmi, glucose, insulin, prediction):
     """Simpan prediksi user ke database PostgreSQL"""
+    if prediction_writer is not None:
+        prediction_id = new_prediction_id()
+        if prediction_writer.submit((prediction_id, age, bmi, glucose, insulin, prediction)):
+            return prediction_id
+        logger.warning("Antrian write-behind penuh, prediksi tidak disimpan", extra=fields(sample=0.01))
+        return None
+
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -190,13 +254,26 @@ def save_prediction_to_db(age, bmi, glucose, insulin, prediction):
             prediction_id = cursor.fetchone()[0]
             conn.commit()
             
-            print(f"[INFO] Saved prediction with ID: {prediction_id}")
+            logger.debug("Saved prediction", extra=fields(prediction_id=prediction_id))
             return prediction_id
             
     except Exception as e:
-        print(f"[ERROR] Failed to save prediction: {e}")
+        logger.error(f"Failed to save prediction: {e}")
         return None
 
+# Mode write-behind opsional: prediksi diantrikan dan ditulis per batch
+prediction_writer = None
+if PREDICTION_WRITE_MODE == 'write_behind':
+    init_database()
+    prediction_writer = WriteBehindQueue(get_db_connection).start()
+    logger.info("Antrian write-behind prediksi aktif")
+
+def prediction_write_stats():
+    """Kedalaman antrian dan jumlah baris yang dibuang"""
+    if prediction_writer is None:
+        return {'mode': 'sync'}
+    return prediction_writer.stats()
+
 # HTML Template untuk testing
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -480,77 +557,87 @@ def predict():
                 'error': 'Diabetes scaler not available'
             }), 500
             
-        data = request.json
+        with timed('parse'):
+            data = request.json
         if not data:
             return jsonify({
                 'success': False,
                 'error': 'No data provided'
             }), 400
             
-        # Validasi input
-        required_fields = ['age', 'bmi', 'glucose', 'insulin']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
-        
-        age = float(data['age'])
-        bmi = float(data['bmi'])
-        glucose = float(data['glucose'])
-        insulin = float(data['insulin'])
-        
-        # Validasi range nilai
-        if not (0 < age < 150):
-            return jsonify({'success': False, 'error': 'Age must be between 1-149'}), 400
-        if not (10 < bmi < 60):
-            return jsonify({'success': False, 'error': 'BMI must be between 10-60'}), 400
-        if not (50 < glucose < 500):
-            return jsonify({'success': False, 'error': 'Glucose must be between 50-500'}), 400
-        if not (0 < insulin < 1000):
-            return jsonify({'success': False, 'error': 'Insulin must be between 1-999'}), 400
+        with timed('validate'):
+            # Validasi input
+            required_fields = ['age', 'bmi', 'glucose', 'insulin']
+            for field in required_fields:
+                if field not in data:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Missing required field: {field}'
+                    }), 400
+        
+            age = float(data['age'])
+            bmi = float(data['bmi'])
+            glucose = float(data['glucose'])
+            insulin = float(data['insulin'])
+        
+            # Validasi range nilai
+            if not (0 < age < 150):
+                return jsonify({'success': False, 'error': 'Age must be between 1-149'}), 400
+            if not (10 < bmi < 60):
+                return jsonify({'success': False, 'error': 'BMI must be between 10-60'}), 400
+            if not (50 < glucose < 500):
+                return jsonify({'success': False, 'error': 'Glucose must be between 50-500'}), 400
+            if not (0 < insulin < 1000):
+                return jsonify({'success': False, 'error': 'Insulin must be between 1-999'}), 400
         
         # 🔧 PERBAIKAN UTAMA: Susun ulang fitur sesuai urutan model
-        reordered_features = reorder_features_for_model(age, bmi, glucose, insulin)
+        with timed('reorder'):
+            reordered_features = reorder_features_for_model(age, bmi, glucose, insulin)
         
-        print(f"[INFO] 📥 Input dari frontend: Age={age}, BMI={bmi}, Glucose={glucose}, Insulin={insulin}")
-        print(f"[INFO] 🔄 Fitur setelah disusun ulang: {reordered_features}")
-        print(f"[INFO] 📋 Urutan yang diharapkan model: {list(feature_order) if feature_order is not None else 'Default'}")
+        logger.debug("Input dari frontend", extra=fields(
+            age=age, bmi=bmi, glucose=glucose, insulin=insulin, reordered_features=reordered_features))
         
         # Prediksi menggunakan fitur yang sudah disusun ulang
-        features = np.array([reordered_features])
-        features_scaled = diabetes_scaler.transform(features)
-        prediction = int(diabetes_model.predict(features_scaled)[0])
+        with timed('scale'):
+            features = np.array([reordered_features])
+            features_scaled = diabetes_scaler.transform(features)
+        with timed('predict'):
+            if diabetes_engine is not None:
+                prediction = int(diabetes_engine.predict(features_scaled)[0])
+            else:
+                prediction = int(diabetes_model.predict(features_scaled)[0])
         prediction_text = 'Risiko Tinggi' if prediction == 1 else 'Risiko Rendah'
         
         # Simpan ke database
-        prediction_id = save_prediction_to_db(age, bmi, glucose, insulin, prediction)
+        with timed('db_insert'):
+            prediction_id = save_prediction_to_db(age, bmi, glucose, insulin, prediction)
         
-        print(f"[INFO] ✅ Prediction: {prediction_text} for user (Age: {age}, BMI: {bmi}, Glucose: {glucose}, Insulin: {insulin})")
-        print(f"[INFO] 📊 Scaled features: {features_scaled.tolist()[0]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Prediksi selesai", extra=fields(
+                prediction=prediction_text, prediction_id=prediction_id, scaled_features=features_scaled.tolist()[0]))
         
-        return jsonify({
-            'success': True,
-            'prediction': prediction,
-            'prediction_text': prediction_text,
-            'prediction_id': prediction_id,
-            'input_data': {
-                'age': age,
-                'bmi': bmi,
-                'glucose': glucose,
-                'insulin': insulin
-            },
-            'scaled_input': features_scaled.tolist()[0],
-            'debug_info': {
-                'original_order': [age, bmi, glucose, insulin],
-                'reordered_features': reordered_features,
-                'expected_order': list(feature_order) if feature_order is not None else 'Default',
-                'feature_mapping': dict(zip(feature_order if feature_order is not None else ['Glucose', 'Insulin', 'BMI', 'Age'], reordered_features))
-            },
-            'message': f'Prediksi berhasil: {prediction_text}',
-            'timestamp': datetime.now().isoformat()
-        })
+        with timed('encode'):
+            return jsonify({
+                'success': True,
+                'prediction': prediction,
+                'prediction_text': prediction_text,
+                'prediction_id': prediction_id,
+                'input_data': {
+                    'age': age,
+                    'bmi': bmi,
+                    'glucose': glucose,
+                    'insulin': insulin
+                },
+                'scaled_input': features_scaled.tolist()[0],
+                'debug_info': {
+                    'original_order': [age, bmi, glucose, insulin],
+                    'reordered_features': reordered_features,
+                    'expected_order': list(feature_order) if feature_order is not None else 'Default',
+                    'feature_mapping': dict(zip(feature_order if feature_order is not None else ['Glucose', 'Insulin', 'BMI', 'Age'], reordered_features))
+                },
+                'message': f'Prediksi berhasil: {prediction_text}',
+                'timestamp': datetime.now().isoformat()
+            })
         
     except ValueError as e:
         return jsonify({
@@ -558,7 +645,7 @@ def predict():
             'error': f'Invalid input data: {str(e)}'
         }), 400
     except Exception as e:
-        print(f"[ERROR] Prediction error: {e}")
+        logger.exception("Prediction error")
         return jsonify({
             'success': False,
             'error': f'Internal server error: {str(e)}'
@@ -566,139 +653,24 @@ def predict():
 
 # Tambahkan endpoint food recommendation yang sama seperti sebelumnya
 def safe_float(value, default=0.0):
-    """Safely convert value to float"""
+    """Safely convert value to float, NaN dianggap kosong"""
     try:
-        if pd.isna(value) or value == '' or value is None:
+        if value is None or value == '':
             return default
-        return float(value)
+        result = float(value)
+        return default if result != result else result
     except (ValueError, TypeError):
         return default
 
 def safe_int(value, default=0):
-    """Safely convert value to int"""
+    """Safely convert value to int, NaN dianggap kosong"""
     try:
-        if pd.isna(value) or value == '' or value is None:
+        if value is None or value == '':
             return default
         return int(float(value))
     except (ValueError, TypeError):
         return default
 
-def calculate_personalized_score_with_model(age, bmi, glucose, insulin, gi, calories, carbs, protein, fat, fiber, sodium):
-    """Hitung skor menggunakan model pred_food.pkl jika tersedia, atau fallback ke rule-based"""
-    
-    # Coba gunakan model ML dulu
-    if food_ml_model is not None:
-        try:
-            user_features = np.array([age, bmi, glucose, insulin])
-            food_features = np.array([gi, calories, carbs, protein, fat, fiber, sodium])
-            combined_features = np.concatenate([user_features, food_features]).reshape(1, -1)
-            
-            if hasattr(food_ml_model, 'predict_proba'):
-                score = food_ml_model.predict_proba(combined_features)[0][1]
-            else:
-                score = float(food_ml_model.predict(combined_features)[0])
-                
-            # Normalisasi score ke 0-1 jika perlu
-            if score > 1:
-                score = score / 100.0
-            elif score < 0:
-                score = 0.0
-                
-            # Tambahkan variasi berdasarkan user profile untuk konsistensi
-            user_hash = (age * 0.01 + bmi * 0.02 + glucose * 0.001 + insulin * 0.005) % 1
-            score = score * 0.8 + user_hash * 0.2  # 80% model, 20% user variation
-            
-            return max(0, min(1, score))
-            
-        except Exception as e:
-            print(f"[WARNING] Error using ML model, fallback to rule-based: {e}")
-    
-    # Fallback ke rule-based scoring
-    score = 0.5  # Base score
-    
-    # Faktor usia
-    if age > 50:
-        if gi <= 35:
-            score += 0.25
-        if fiber >= 3:
-            score += 0.15
-        if sodium <= 100:
-            score += 0.1
-    elif age < 30:
-        if protein >= 8:
-            score += 0.2
-        if calories >= 100:
-            score += 0.1
-    else:
-        if gi <= 50:
-            score += 0.15
-        if protein >= 5:
-            score += 0.1
-    
-    # Faktor BMI
-    if bmi > 25:
-        if calories <= 80:
-            score += 0.3
-        if fiber >= 4:
-            score += 0.2
-        if fat <= 3:
-            score += 0.15
-    elif bmi < 18.5:
-        if calories >= 150:
-            score += 0.25
-        if protein >= 10:
-            score += 0.2
-        if fat >= 5:
-            score += 0.1
-    else:
-        if gi <= 55:
-            score += 0.15
-        if protein >= 6:
-            score += 0.1
-    
-    # Faktor glukosa
-    if glucose > 126:
-        if gi <= 35:
-            score += 0.4
-        elif gi <= 50:
-            score += 0.2
-        else:
-            score -= 0.3
-        if fiber >= 5:
-            score += 0.25
-        if carbs <= 10:
-            score += 0.2
-    elif glucose > 100:
-        if gi <= 50:
-            score += 0.25
-        elif gi > 70:
-            score -= 0.15
-        if fiber >= 3:
-            score += 0.15
-    else:
-        if gi <= 60:
-            score += 0.1
-    
-    # Faktor insulin
-    if insulin > 20:
-        if gi <= 35:
-            score += 0.3
-        if fiber >= 4:
-            score += 0.2
-        if carbs <= 15:
-            score += 0.15
-    elif insulin < 5:
-        if carbs >= 20:
-            score += 0.1
-        if protein >= 8:
-            score += 0.15
-    
-    # Tambahkan variasi berdasarkan user profile
-    user_variation = ((age * 0.01 + bmi * 0.02 + glucose * 0.001 + insulin * 0.005) % 1) * 0.1
-    score += user_variation - 0.05
-    
-    return max(0, min(1, score))
-
 def create_nutritional_benefits(food_row):
     """Buat benefits berdasarkan data nutrisi dari CSV"""
     benefits = []
@@ -727,7 +699,7 @@ def create_nutritional_benefits(food_row):
             benefits.append(f"Sodium: {int(sodium)}mg")
             
     except Exception as e:
-        print(f"[WARNING] Error creating benefits: {e}")
+        logger.warning("Error creating benefits", extra=fields(sample=0.01, error=str(e)))
         benefits = ["Data nutrisi tersedia"]
     
     return " | ".join(benefits)
@@ -736,10 +708,10 @@ def get_food_recommendations_from_csv(category, user_data, top_n=5):
     """Ambil rekomendasi makanan dari CSV dengan model pred_food.pkl"""
     try:
         if food_data is None:
-            print("[WARNING] Data makanan tidak tersedia")
+            logger.warning("Data makanan tidak tersedia", extra=fields(sample=0.01))
             return get_fallback_recommendations(category)
             
-        print(f"[INFO] Mencari rekomendasi untuk kategori: {category}")
+        logger.debug("Mencari rekomendasi", extra=fields(category=category))
         
         # Mapping kategori yang diperbaiki
         category_mapping = {
@@ -754,19 +726,14 @@ def get_food_recommendations_from_csv(category, user_data, top_n=5):
         
         csv_category = category_mapping.get(category.strip(), category.strip())
         
-        # Filter makanan berdasarkan kategori
-        category_foods = food_data[food_data['Kategori'].str.strip() == csv_category].copy()
-        
-        if len(category_foods) == 0:
-            print(f"[WARNING] Tidak ada makanan dalam kategori '{csv_category}', mencoba kategori asli '{category}'")
-            # Coba dengan kategori asli
-            category_foods = food_data[food_data['Kategori'].str.strip() == category.strip()].copy()
+        # Ambil makanan dari index kategori (fallback ke nama kategori asli)
+        category_entry = lookup_category(food_index, csv_category, category)
             
-        if len(category_foods) == 0:
-            print(f"[WARNING] Tidak ada makanan dalam kategori '{category}'")
+        if category_entry is None:
+            logger.warning("Tidak ada makanan dalam kategori", extra=fields(sample=0.01, category=category))
             return get_fallback_recommendations(category)
             
-        print(f"[INFO] Ditemukan {len(category_foods)} makanan dalam kategori")
+        logger.debug("Makanan ditemukan", extra=fields(category=csv_category, items=len(category_entry)))
         
         # Ekstrak profil user
         age = user_data.get('age', 30)
@@ -774,43 +741,32 @@ def get_food_recommendations_from_csv(category, user_data, top_n=5):
         glucose = user_data.get('glucose', 100)
         insulin = user_data.get('insulin', 10)
         
-        print(f"[INFO] Profil user: Age={age}, BMI={bmi}, Glucose={glucose}, Insulin={insulin}")
-        
-        # Hitung skor untuk setiap makanan menggunakan model
-        food_scores = []
-        
-        for idx, (_, food_row) in enumerate(category_foods.iterrows()):
+        # Skor seluruh kategori sekaligus: satu panggilan model atau satu pass NumPy
+        nutrients = category_nutrients(category_entry, category_entry.catalog_order)
+        scores = None
+
+        if food_ml_model is not None:
             try:
-                # Ekstrak data nutrisi
-                gi = safe_float(food_row.get('Glycemic Index', 55))
-                calories = safe_float(food_row.get('Calories', 100))
-                carbs = safe_float(food_row.get('Carbohydrates', 10))
-                protein = safe_float(food_row.get('Protein', 5))
-                fat = safe_float(food_row.get('Fat', 2))
-                fiber = safe_float(food_row.get('Fiber Content', 2))
-                sodium = safe_float(food_row.get('Sodium Content', 0))
-                
-                # Hitung skor menggunakan model atau rule-based
-                score = calculate_personalized_score_with_model(
-                    age, bmi, glucose, insulin,
-                    gi, calories, carbs, protein, fat, fiber, sodium
-                )
-                
-                food_scores.append((score, food_row))
-                
+                scores = model_scores(food_ml_model, age, bmi, glucose, insulin, *nutrients)
             except Exception as e:
-                print(f"[WARNING] Error scoring makanan {idx}: {e}")
-                food_scores.append((0.5, food_row))
+                logger.warning("Error using ML model, fallback to rule-based", extra=fields(sample=0.01, error=str(e)))
+
+        if scores is None:
+            scores = rule_based_scores(age, bmi, glucose, insulin, *nutrients)
         
-        # Urutkan berdasarkan skor (tertinggi dulu)
-        food_scores.sort(key=lambda x: x[0], reverse=True)
+        # Urutkan berdasarkan skor (tertinggi dulu, urutan katalog untuk skor sama)
+        ranked = np.argsort(-scores, kind='stable')
         
         # Tambahkan variasi berdasarkan user profile untuk konsistensi
         seed_value = int((age * 7 + bmi * 13 + glucose * 3 + insulin * 11) % 1000)
-        random.seed(seed_value)
+        rng = random.Random(seed_value)  # per-request, aman untuk worker multi-thread
         
         # Pilih top candidates dengan weighted randomization
-        top_candidates = food_scores[:min(10, len(food_scores))]
+        # (skor dalam urutan katalog asli, baris makanan sebagai dict biasa)
+        catalog_records = category_entry.records
+        top_candidates = [
+            (float(scores[i]), catalog_records[category_entry.catalog_order[i]]) for i in ranked[:10]
+        ]
         
         if len(top_candidates) > top_n:
             # Weighted selection (skor tinggi lebih mungkin dipilih)
@@ -827,7 +783,7 @@ def get_food_recommendations_from_csv(category, user_data, top_n=5):
                     selected_foods.append(top_candidates.pop(0))
                     weights.pop(0)
                 else:
-                    rand_val = random.uniform(0, total_weight)
+                    rand_val = rng.uniform(0, total_weight)
                     cumulative = 0
                     for i, weight in enumerate(weights):
                         cumulative += weight
@@ -859,11 +815,11 @@ def get_food_recommendations_from_csv(category, user_data, top_n=5):
             }
             recommendations.append(food_item)
             
-        print(f"[INFO] Berhasil membuat {len(recommendations)} rekomendasi")
+        logger.debug("Rekomendasi dibuat", extra=fields(category=category, count=len(recommendations)))
         return recommendations
         
     except Exception as e:
-        print(f"[ERROR] Error dalam rekomendasi: {e}")
+        logger.exception("Error dalam rekomendasi")
         return get_fallback_recommendations(category)
 
 def get_fallback_recommendations(category):
@@ -894,7 +850,8 @@ def get_fallback_recommendations(category):
 def recommend_food():
     """Endpoint rekomendasi makanan dengan model pred_food.pkl"""
     try:
-        data = request.json
+        with timed('parse'):
+            data = request.json
         if not data:
             return jsonify({
                 'success': False, 
@@ -917,21 +874,23 @@ def recommend_food():
                 'error': 'User data is required'
             }), 400
         
-        # Validasi user_data
-        required_user_fields = ['age', 'bmi', 'glucose', 'insulin']
-        for field in required_user_fields:
-            if field not in user_data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing user data field: {field}'
-                }), 400
+        with timed('validate'):
+            # Validasi user_data
+            required_user_fields = ['age', 'bmi', 'glucose', 'insulin']
+            for field in required_user_fields:
+                if field not in user_data:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Missing user data field: {field}'
+                    }), 400
         
-        print(f"[INFO] Food recommendation request:")
-        print(f"[INFO] Category: {category}")
-        print(f"[INFO] User: Age={user_data.get('age')}, BMI={user_data.get('bmi')}, Glucose={user_data.get('glucose')}, Insulin={user_data.get('insulin')}")
+        logger.debug("Food recommendation request", extra=fields(
+            category=category, age=user_data.get('age'), bmi=user_data.get('bmi'),
+            glucose=user_data.get('glucose'), insulin=user_data.get('insulin')))
         
         # Ambil rekomendasi dari CSV dengan model
-        recommendations = get_food_recommendations_from_csv(category, user_data)
+        with timed('recommend'):
+            recommendations = get_food_recommendations_from_csv(category, user_data)
         
         if not recommendations:
             return jsonify({
@@ -939,24 +898,35 @@ def recommend_food():
                 'error': 'No recommendations found for this category'
             }), 404
         
-        return jsonify({
-            'success': True,
-            'recommendations': recommendations,
-            'source': 'csv_with_pred_food_model' if food_ml_model is not None else 'csv_with_rule_based',
-            'category_requested': category,
-            'total_recommendations': len(recommendations),
-            'user_profile': user_data,
-            'model_used': 'pred_food.pkl' if food_ml_model is not None else 'rule_based_algorithm',
-            'timestamp': datetime.now().isoformat()
-        })
+        with timed('encode'):
+            return jsonify({
+                'success': True,
+                'recommendations': recommendations,
+                'source': 'csv_with_pred_food_model' if food_ml_model is not None else 'csv_with_rule_based',
+                'category_requested': category,
+                'total_recommendations': len(recommendations),
+                'user_profile': user_data,
+                'model_used': 'pred_food.pkl' if food_ml_model is not None else 'rule_based_algorithm',
+                'timestamp': datetime.now().isoformat()
+            })
             
     except Exception as e:
-        print(f"[ERROR] Food recommendation error: {e}")
+        logger.exception("Food recommendation error")
         return jsonify({
             'success': False, 
             'error': f'Internal server error: {str(e)}'
         }), 500
 
+@app.route('/db_pool_stats')
+def db_pool_stats():
+    """Statistik pool koneksi database untuk monitoring"""
+    return jsonify(db_pool.stats())
+
+@app.route('/write_queue_stats')
+def write_queue_stats():
+    """Statistik antrian write-behind untuk monitoring"""
+    return jsonify(prediction_write_stats())
+
 if __name__ == '__main__':
     print("=" * 70)
     print("🎉 DIABCARE API SERVER - MASALAH SUDAH DIPERBAIKI!")
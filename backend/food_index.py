@@ -0,0 +1,103 @@
+"""Per-category food index built once when the catalog is loaded
+
+/recommend_food used to filter the whole catalog with a string comparison,
+copy the slice and sort it by glycemic index on every request. The index
+below does that work once per category at load time; requests only do a
+dictionary lookup and read plain arrays, lists and dicts, never pandas
+objects.
+"""
+import numpy as np
+import pandas as pd
+
+# Nutrient columns exposed as contiguous float arrays
+NUTRIENT_COLUMNS = [
+    'Glycemic Index',
+    'Calories',
+    'Carbohydrates',
+    'Protein',
+    'Fat',
+    'Fiber Content',
+    'Sugar Content',
+    'Sodium Content',
+    'Suitable for Diabetes',
+]
+
+
+class CategoryFoods:
+    """Foods of one category, sorted by glycemic index
+
+    `frame` holds the rows in GI order with a fresh 0..n-1 index and
+    `records` the same rows as plain dicts. Nutrient columns are float64
+    arrays in the same order, with NaN wherever the CSV value is missing or
+    not numeric; `has_column` tells whether the column exists in the
+    catalog at all. `catalog_order` lists the positions in `frame` in
+    original CSV order. `gi_keys` keeps the GI column in its CSV dtype so a
+    handful of picks can be ordered exactly like sort_values.
+    """
+
+    def __init__(self, category, frame, catalog_order):
+        self.category = category
+        self.frame = frame
+        self.catalog_order = catalog_order
+        self.names = [str(name) for name in frame['Food Name']] if 'Food Name' in frame.columns else ['Unknown'] * len(frame)
+        self.records = frame.to_dict('records')
+        self.gi_keys = frame['Glycemic Index'].to_numpy()
+        self.arrays = {
+            column: np.ascontiguousarray(pd.to_numeric(frame[column], errors='coerce'), dtype=np.float64)
+            for column in NUTRIENT_COLUMNS
+            if column in frame.columns
+        }
+        self._values = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def has_column(self, column):
+        return column in self.arrays
+
+    def values(self, column, missing=0.0, default=0.0):
+        """Column as floats, like safe_float(row.get(column, missing), default)
+
+        `missing` is used when the catalog has no such column and `default`
+        replaces NaN cells. Results are computed once and shared, so callers
+        must not modify them.
+        """
+        key = (column, missing, default)
+        values = self._values.get(key)
+        if values is None:
+            if column not in self.arrays:
+                values = np.full(len(self.frame), float(missing))
+            else:
+                array = self.arrays[column]
+                values = np.where(np.isnan(array), default, array)
+            values.setflags(write=False)
+            self._values[key] = values
+        return values
+
+
+def build_food_index(food_data):
+    """Map each stripped 'Kategori' value to its CategoryFoods entry"""
+    index = {}
+    if food_data is None or 'Kategori' not in food_data.columns:
+        return index
+
+    categories = food_data['Kategori'].astype(str).str.strip()
+    for category in categories.unique():
+        category_foods = food_data[categories == category]
+        sorted_foods = category_foods.sort_values('Glycemic Index')
+
+        # Position of each sorted row, listed in catalog order
+        positions = pd.Series(np.arange(len(sorted_foods)), index=sorted_foods.index)
+        catalog_order = positions.loc[category_foods.index].to_numpy()
+
+        index[category] = CategoryFoods(category, sorted_foods.reset_index(drop=True), catalog_order)
+
+    return index
+
+
+def lookup_category(index, csv_category, category):
+    """Entry for the mapped CSV category, falling back to the requested name"""
+    entry = index.get(csv_category)
+    if entry is None:
+        entry = index.get(category.strip())
+    return entry
@@ -0,0 +1,295 @@
+"""Flat array evaluator for the diabetes RandomForest
+
+sklearn's RandomForestClassifier.predict pays input validation, joblib
+dispatch and a Python-level loop over the trees on every call. For the
+single 4-feature rows served by /predict that overhead dominates, so the
+forest is compiled once into contiguous NumPy arrays and evaluated for all
+trees at the same time.
+
+Predictions are bit-for-bit identical to the sklearn model:
+  - inputs are compared as float32, like sklearn's tree predict
+  - leaf values are normalised per tree, like DecisionTreeClassifier.predict_proba
+  - tree probabilities are accumulated in estimator order and averaged
+
+`FlatForest.fold_scaler` moves the StandardScaler into the split
+thresholds, so the folded forest takes raw inputs and the per-request
+transform disappears. Raw float64 inputs are compared against thresholds
+in raw units, which reproduces the scale-then-float32 comparison exactly.
+"""
+import numpy as np
+
+# Validated input range of the /predict endpoint (exclusive bounds)
+VALIDATED_RANGES = {
+    'Age': (0, 150),
+    'BMI': (10, 60),
+    'Glucose': (50, 500),
+    'Insulin': (0, 1000),
+}
+
+
+class FlatForest:
+    """RandomForest flattened into feature/threshold/left/right/value arrays"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes,
+                 input_dtype=np.float32):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_trees = len(roots)
+        self.n_classes = value.shape[1]
+        self.input_dtype = input_dtype
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a fitted sklearn forest classifier into flat arrays"""
+        if not hasattr(model, 'estimators_') or not hasattr(model, 'classes_'):
+            raise TypeError(f"Unsupported model type: {type(model)}")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # Leaves point to themselves so every row can walk max_depth steps
+            feature = np.where(is_leaf, 0, tree.feature)
+            threshold = np.where(is_leaf, 0.0, tree.threshold)
+            left = np.where(is_leaf, node_ids, tree.children_left) + offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + offset
+
+            # Same normalisation as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :model.n_classes_].copy()
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value /= normalizer
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            roots.append(offset)
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+        )
+
+    def fold_scaler(self, mean, scale):
+        """Forest taking raw inputs, with the affine scaler folded into its thresholds
+
+        Every split threshold becomes the largest raw float64 value that
+        still goes left after scaling and the float32 cast, so the folded
+        forest compares raw inputs as float64.
+        """
+        internal = self.left != np.arange(len(self.left))
+        threshold = self.threshold.copy()
+        for f in range(len(mean)):
+            nodes = internal & (self.feature == f)
+            threshold[nodes] = fold_scaler_threshold(self.threshold[nodes], mean[f], scale[f])
+
+        return FlatForest(self.feature, threshold, self.left, self.right, self.value, self.roots,
+                          self.max_depth, self.classes_, input_dtype=np.float64)
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_rows)"""
+        X = np.asarray(X, dtype=self.input_dtype)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        rows = np.arange(X.shape[0])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return nodes
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over all trees, shape (n_rows, n_classes)"""
+        leaves = self.apply(X)
+        # Reducing over the leading axis adds the trees one after another,
+        # matching the accumulation order of sklearn's forest
+        proba = self.value[leaves].sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        """Predicted class labels, shape (n_rows,)"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def scaler_affine_params(scaler):
+    """Per-feature (mean, scale) actually applied by a fitted StandardScaler"""
+    n_features = len(scaler.scale_) if scaler.scale_ is not None else len(scaler.mean_)
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+
+def fold_scaler_threshold(threshold, mean, scale):
+    """Largest raw value x such that float32((x - mean) / scale) <= threshold
+
+    This is the split threshold expressed in raw input units: for every
+    float64 x, `x <= folded` goes left exactly when the scaled-then-float32
+    value goes left in the sklearn tree. The scaled value is monotonic in x,
+    so the boundary is found by bisection between two bracketing values.
+    Works elementwise on arrays of thresholds sharing one (mean, scale).
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+
+    def goes_left(x):
+        scaled = ((x - mean) / scale).astype(np.float32).astype(np.float64)
+        return scaled <= threshold
+
+    guess = threshold * scale + mean
+    step = (np.abs(threshold) + 1.0) * scale * 1e-6 + np.abs(mean) * 1e-12
+    lo = guess - step
+    hi = guess + step
+
+    # Widen the bracket until lo goes left and hi goes right
+    for _ in range(64):
+        bad_lo = ~goes_left(lo)
+        bad_hi = goes_left(hi)
+        if not bad_lo.any() and not bad_hi.any():
+            break
+        step = step * 2
+        lo = np.where(bad_lo, guess - step, lo)
+        hi = np.where(bad_hi, guess + step, hi)
+
+    # Bisect until lo and hi are adjacent float64 values
+    for _ in range(2100):
+        mid = lo + (hi - lo) / 2
+        open_interval = (mid > lo) & (mid < hi)
+        if not open_interval.any():
+            break
+        left = goes_left(mid)
+        lo = np.where(open_interval & left, mid, lo)
+        hi = np.where(open_interval & ~left, mid, hi)
+
+    return lo
+
+
+def sample_validated_inputs(feature_order, n_random=20000, grid_points=12, seed=0):
+    """Raw input rows covering the validated /predict range in model feature order"""
+    rng = np.random.default_rng(seed)
+    bounds = np.array([VALIDATED_RANGES[name] for name in feature_order], dtype=float)
+    low = np.nextafter(bounds[:, 0], np.inf)
+    high = np.nextafter(bounds[:, 1], -np.inf)
+
+    # Dense grid over the whole range, including both edges
+    axes = [np.linspace(lo, hi, grid_points) for lo, hi in zip(low, high)]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(feature_order))
+
+    # Uniform random rows plus rows rounded the way users type them
+    uniform = rng.uniform(low, high, size=(n_random, len(feature_order)))
+    rounded = np.clip(np.round(uniform, 1), low, high)
+
+    return np.vstack([grid, uniform, rounded])
+
+
+def verify_parity(model, scaler, feature_order, engine=None, X_raw=None):
+    """Compare FlatForest against sklearn on the validated input range
+
+    Returns a dict with the number of rows checked and the number of
+    predictions and probabilities that differ (both should be 0).
+    """
+    if engine is None:
+        engine = FlatForest.from_sklearn(model)
+    if X_raw is None:
+        X_raw = sample_validated_inputs(feature_order)
+
+    import pandas as pd
+
+    X_scaled = scaler.transform(pd.DataFrame(X_raw, columns=feature_order))
+    expected_proba = model.predict_proba(X_scaled)
+    expected = model.predict(X_scaled)
+
+    proba = engine.predict_proba(X_scaled)
+    predicted = engine.predict(X_scaled)
+
+    return {
+        'rows_checked': int(len(X_raw)),
+        'prediction_mismatches': int((predicted != expected).sum()),
+        'probability_mismatches': int((proba != expected_proba).any(axis=1).sum()),
+    }
+
+
+def verify_folded_parity(model, scaler, feature_order, folded=None, X_raw=None):
+    """Compare a scaler-folded FlatForest on raw inputs with scaler + sklearn model
+
+    Besides the sampled rows, every folded threshold is checked on the
+    threshold itself and on the next float64 above it, where an off-by-one
+    fold would show up.
+    """
+    if folded is None:
+        folded = FlatForest.from_sklearn(model).fold_scaler(*scaler_affine_params(scaler))
+    if X_raw is None:
+        X_raw = sample_validated_inputs(feature_order)
+
+    import pandas as pd
+
+    internal = folded.left != np.arange(len(folded.left))
+    rng = np.random.default_rng(1)
+    edge_rows = []
+    for f in range(X_raw.shape[1]):
+        boundaries = np.unique(folded.threshold[internal & (folded.feature == f)])
+        for values in (boundaries, np.nextafter(boundaries, np.inf)):
+            rows = X_raw[rng.integers(len(X_raw), size=len(values))].copy()
+            rows[:, f] = values
+            edge_rows.append(rows)
+    X_raw = np.vstack([X_raw] + edge_rows)
+
+    X_scaled = scaler.transform(pd.DataFrame(X_raw, columns=feature_order))
+    expected_proba = model.predict_proba(X_scaled)
+    expected = model.predict(X_scaled)
+
+    proba = folded.predict_proba(X_raw)
+    predicted = folded.predict(X_raw)
+
+    return {
+        'rows_checked': int(len(X_raw)),
+        'prediction_mismatches': int((predicted != expected).sum()),
+        'probability_mismatches': int((proba != expected_proba).any(axis=1).sum()),
+    }
+
+
+if __name__ == '__main__':
+    import joblib
+
+    model = joblib.load('model.pkl')
+    scaler = joblib.load('scaler.pkl')
+    order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+
+    engine = FlatForest.from_sklearn(model)
+    print(f"[INFO] Compiled {engine.n_trees} trees, {len(engine.feature)} nodes, max depth {engine.max_depth}")
+
+    result = verify_parity(model, scaler, order, engine=engine)
+    print(f"[INFO] Parity check: {result}")
+    if result['prediction_mismatches'] or result['probability_mismatches']:
+        raise SystemExit("[ERROR] FlatForest does not match the sklearn model")
+    print("[INFO] FlatForest matches sklearn on the validated input range")
+
+    result = verify_folded_parity(model, scaler, order, folded=engine.fold_scaler(*scaler_affine_params(scaler)))
+    print(f"[INFO] Folded scaler parity check: {result}")
+    if result['prediction_mismatches'] or result['probability_mismatches']:
+        raise SystemExit("[ERROR] Scaler-folded FlatForest does not match scaler + sklearn model")
+    print("[INFO] Scaler-folded FlatForest matches scaler + sklearn on raw inputs")
@@ -2,46 +2,84 @@ from flask import Flask, request, jsonify, render_template
 import pickle
 import pandas as pd
 import numpy as np
-import psycopg2
 import os
 import sys
 from flask_cors import CORS
 
+from db_pool import get_pool
+from inference_threads import limit_native_threads, serial_model
+from log_config import get_logger
+from metrics import instrument, timed
+from model_artifact import load_artifact
+from region_table import file_checksum
+
+logger = get_logger(__name__)
+
 # Inisialisasi Flask
 app = Flask(__name__)
 CORS(app, origins="http://localhost:3000")
+instrument(app)
+
+IMPROVED_MODEL_FILES = ('diabetes_improved_model.pkl', 'diabetes_scaler.pkl', 'diabetes_features.pkl')
+# Dibangun dengan: python model_artifact.py --model diabetes_improved_model.pkl
+#   --scaler diabetes_scaler.pkl --features diabetes_features.pkl --output improved_model.artifact
+IMPROVED_ARTIFACT_PATH = 'improved_model.artifact'
+
+def load_improved_artifact():
+    """Serving artifact untuk improved model, atau None jika tidak ada / tidak cocok dengan file .pkl"""
+    try:
+        source_checksum = file_checksum(*IMPROVED_MODEL_FILES)
+    except OSError:
+        # Hanya artifact yang dikirim ke host ini; tidak ada sumber untuk dicocokkan
+        source_checksum = None
+    try:
+        return load_artifact(IMPROVED_ARTIFACT_PATH, source_checksum)
+    except Exception as e:
+        logger.warning(f"Serving artifact tidak dapat dipakai, memuat file .pkl: {e}")
+        return None
 
 # Load improved model dan preprocessing objects
 try:
-    with open('diabetes_improved_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    
-    with open('diabetes_scaler.pkl', 'rb') as f:
-        scaler = pickle.load(f)
-    
-    with open('diabetes_features.pkl', 'rb') as f:
-        feature_columns = pickle.load(f)
+    artifact = load_improved_artifact()
+    if artifact is not None:
+        # Tanpa unpickle dan tanpa sklearn: engine dan scaler identik dengan pipeline sklearn
+        model = artifact.engine
+        scaler = artifact.scaler
+        feature_columns = artifact.feature_order
+    else:
+        with open('diabetes_improved_model.pkl', 'rb') as f:
+            model = serial_model(pickle.load(f))
+        
+        with open('diabetes_scaler.pkl', 'rb') as f:
+            scaler = pickle.load(f)
+        
+        with open('diabetes_features.pkl', 'rb') as f:
+            feature_columns = pickle.load(f)
     
-    print("[INFO] Improved model berhasil dimuat.")
-    print(f"[INFO] Feature columns: {feature_columns}")
+    limit_native_threads()
+    logger.info("Improved model berhasil dimuat.")
+    logger.info(f"Feature columns: {feature_columns}")
     
 except Exception as e:
-    print(f"[ERROR] Gagal memuat improved model: {e}")
+    logger.error(f"Gagal memuat improved model: {e}")
     exit(1)
 
-# Koneksi database
+# Koneksi database lewat pool bersama (satu koneksi per request, bukan satu untuk semua thread)
+DB_CONFIG = {
+    'dbname': 'diabetesdb',
+    'user': 'postgres',
+    'password': 'Rizkydiska26',
+    'host': 'localhost',
+    'port': '5432'
+}
+db_pool = get_pool(DB_CONFIG)
+
 try:
-    conn = psycopg2.connect(
-        dbname="diabetesdb",
-        user="postgres", 
-        password="Rizkydiska26",
-        host="localhost",
-        port="5432"
-    )
-    cursor = conn.cursor()
-    print("[INFO] Koneksi database berhasil.")
+    with db_pool.connection():
+        pass
+    logger.info("Koneksi database berhasil.")
 except Exception as e:
-    print(f"[ERROR] Gagal konek ke database: {e}")
+    logger.error(f"Gagal konek ke database: {e}")
     exit(1)
 
 def create_features(age, glucose, insulin, bmi):
@@ -87,36 +125,41 @@ def show_form():
 # Endpoint untuk prediksi (POST)
 @app.route('/predict', methods=['POST'])
 def predict():
-    data = request.get_json()  # Menerima data JSON yang dikirim dari frontend
+    with timed('parse'):
+        data = request.get_json()  # Menerima data JSON yang dikirim dari frontend
     
     # Validasi dan konversi
     try:
-        age = float(data['age'])
-        glucose = float(data['glucose']) 
-        insulin = float(data['insulin'])
-        bmi = float(data['bmi'])
-        
-        if age < 1 or age > 120:
-            return jsonify({'error': 'Age must be between 1 and 120'}), 400
-        if glucose < 50 or glucose > 300:
-            return jsonify({'error': 'Glucose must be between 50 and 300 mg/dL'}), 400
-        if bmi < 10 or bmi > 60:
-            return jsonify({'error': 'BMI must be between 10 and 60'}), 400
-        if insulin < 0 or insulin > 500:
-            return jsonify({'error': 'Insulin must be between 0 and 500 μU/mL'}), 400
+        with timed('validate'):
+            age = float(data['age'])
+            glucose = float(data['glucose']) 
+            insulin = float(data['insulin'])
+            bmi = float(data['bmi'])
+            
+            if age < 1 or age > 120:
+                return jsonify({'error': 'Age must be between 1 and 120'}), 400
+            if glucose < 50 or glucose > 300:
+                return jsonify({'error': 'Glucose must be between 50 and 300 mg/dL'}), 400
+            if bmi < 10 or bmi > 60:
+                return jsonify({'error': 'BMI must be between 10 and 60'}), 400
+            if insulin < 0 or insulin > 500:
+                return jsonify({'error': 'Insulin must be between 0 and 500 μU/mL'}), 400
             
     except (ValueError, KeyError) as e:
         return jsonify({'error': f'Invalid input data: {str(e)}'}), 400
     
     try:
         if scaler is not None:
-            features_dict = create_features(age, glucose, insulin, bmi)
-            input_array = np.array([[features_dict[col] for col in feature_columns]])
-            input_scaled = scaler.transform(input_array)
+            with timed('reorder'):
+                features_dict = create_features(age, glucose, insulin, bmi)
+                input_array = np.array([[features_dict[col] for col in feature_columns]])
+            with timed('scale'):
+                input_scaled = scaler.transform(input_array)
             
             # Prediksi
-            probabilities = model.predict_proba(input_scaled)
-            prediction_int = model.predict(input_scaled)[0]
+            with timed('predict'):
+                probabilities = model.predict_proba(input_scaled)
+                prediction_int = model.predict(input_scaled)[0]
             
             prob_diabetes = probabilities[0][1]
             
@@ -128,27 +171,30 @@ def predict():
                 'insulin': insulin
             }])
             
-            probabilities = model.predict_proba(input_data)
+            with timed('predict'):
+                probabilities = model.predict_proba(input_data)
             prob_diabetes = probabilities[0][1]
             prediction_int = 1 if prob_diabetes > 0.6 else 0
         
         # Menyimpan hasil ke database
         try:
-            cursor.execute(
-                "INSERT INTO predictions (age, bmi, glucose, insulin, prediction) VALUES (%s, %s, %s, %s, %s)",
-                (age, bmi, glucose, insulin, prediction_int)
-            )
-            conn.commit()
+            with timed('db_insert'), db_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO predictions (age, bmi, glucose, insulin, prediction) VALUES (%s, %s, %s, %s, %s)",
+                    (age, bmi, glucose, insulin, int(prediction_int))
+                )
+                conn.commit()
         except Exception as e:
-            conn.rollback()
             return jsonify({'error': f'Database error: {str(e)}'}), 500
         
-        return jsonify({
-            'prediction': int(prediction_int),
-            'probability': float(prob_diabetes),
-            'confidence': 'High' if abs(prob_diabetes - 0.5) > 0.3 else 'Medium',
-            'model_type': 'improved' if scaler is not None else 'basic'
-        })
+        with timed('encode'):
+            return jsonify({
+                'prediction': int(prediction_int),
+                'probability': float(prob_diabetes),
+                'confidence': 'High' if abs(prob_diabetes - 0.5) > 0.3 else 'Medium',
+                'model_type': 'improved' if scaler is not None else 'basic'
+            })
         
     except Exception as e:
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
@@ -163,5 +209,10 @@ def model_info():
         'has_scaler': scaler is not None
     })
 
+@app.route('/db_pool_stats', methods=['GET'])
+def db_pool_stats():
+    """Statistik pool koneksi database untuk monitoring"""
+    return jsonify(db_pool.stats())
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)  # Jalankan Flask di IP lokal agar dapat diakses dari jaringan
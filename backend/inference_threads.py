@@ -0,0 +1,97 @@
+"""Per-call thread budget for model inference
+
+A pickled RandomForest carries its own n_jobs, and NumPy's BLAS and
+sklearn's OpenMP pools start one thread per core. With several gunicorn
+workers on one host, every worker then fans out across all cores. The
+calls that gain from threads are large batches. For a single row, joblib
+dispatch costs far more than predicting one row.
+
+The inference layer therefore picks the parallelism per call:
+
+  - Pickled models lose their own n_jobs when loaded (`serial_model`), so
+    a model call is single-threaded unless the call opts in.
+  - `inference_threads(n_rows)` lets calls of at least
+    INFERENCE_PARALLEL_MIN_ROWS rows predict with INFERENCE_BATCH_THREADS
+    joblib threads, one per group of trees. Smaller calls get a no-op
+    context, so the single-row path pays nothing for the check.
+  - `limit_native_threads()` pins BLAS and OpenMP to one thread per
+    process. Those limits are process-wide, not per thread. Raising them
+    for one batch would also affect single-row requests served at the
+    same time, and the forest does not use them anyway.
+
+parallelism_benchmark.py measures where batch threads start to pay off
+on the current hardware.
+
+Configuration (environment variables):
+  INFERENCE_BATCH_THREADS      threads for large calls (default: cores / WEB_CONCURRENCY, at least 1)
+  INFERENCE_PARALLEL_MIN_ROWS  smallest call that gets the batch threads (default 4096)
+"""
+import os
+from contextlib import nullcontext
+
+from threadpoolctl import threadpool_info, threadpool_limits
+
+from log_config import fields, get_logger
+
+try:
+    from joblib import parallel_config
+except ImportError:  # joblib < 1.3
+    from joblib import parallel_backend as parallel_config
+
+
+def _default_batch_threads():
+    # gunicorn reads its worker count from WEB_CONCURRENCY too
+    workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+INFERENCE_BATCH_THREADS = int(os.environ.get('INFERENCE_BATCH_THREADS', 0)) or _default_batch_threads()
+INFERENCE_PARALLEL_MIN_ROWS = int(os.environ.get('INFERENCE_PARALLEL_MIN_ROWS', 4096))
+
+logger = get_logger(__name__)
+
+_SERIAL = nullcontext()
+_batch_threads = INFERENCE_BATCH_THREADS
+
+
+def set_batch_threads(threads):
+    """Override INFERENCE_BATCH_THREADS for this process, e.g. in a pool worker"""
+    global _batch_threads
+    _batch_threads = max(1, int(threads))
+
+
+def batch_threads():
+    return _batch_threads
+
+
+def inference_threads(n_rows, min_rows=None):
+    """Context giving a model call on `n_rows` rows its thread budget"""
+    min_rows = INFERENCE_PARALLEL_MIN_ROWS if min_rows is None else min_rows
+    if _batch_threads <= 1 or n_rows < min_rows:
+        return _SERIAL
+    return parallel_config(backend='threading', n_jobs=_batch_threads)
+
+
+def serial_model(model):
+    """Clear a loaded estimator's own n_jobs so each call's context decides"""
+    if getattr(model, 'n_jobs', None) is not None:
+        model.n_jobs = None
+    return model
+
+
+def limit_native_threads():
+    """Pin the BLAS and OpenMP pools loaded so far to one thread for the whole process"""
+    limits = threadpool_limits(limits=1)
+    # threadpool_info() scans the loaded libraries, so it is only logged here, not served per request
+    logger.info("Native thread pools limited to one thread", extra=fields(
+        pools=[f"{pool['internal_api']}:{pool['num_threads']}" for pool in threadpool_info()],
+        batch_threads=_batch_threads, parallel_min_rows=INFERENCE_PARALLEL_MIN_ROWS))
+    return limits
+
+
+def thread_settings():
+    """Thread budget of the inference calls, as reported on /health"""
+    return {
+        'batch_threads': _batch_threads,
+        'parallel_min_rows': INFERENCE_PARALLEL_MIN_ROWS,
+    }
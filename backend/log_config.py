@@ -0,0 +1,180 @@
+"""Structured, queue-backed logging for the backend services
+
+Records are written as one JSON object per line by a background thread.
+The request thread only renders the message and hands the record to a
+bounded queue; when the queue is full the record is dropped and counted
+instead of blocking the request.
+
+    logger = get_logger(__name__)
+    logger.info("Food data loaded", extra=fields(items=len(food_data)))
+    logger.warning("ML model failed, using rules", extra=fields(sample=0.01, error=str(e)))
+
+`fields()` attaches structured values to a record. Its `sample` argument
+keeps only that fraction of the message's records; the rate is written
+with each kept record so log consumers can re-weight counts. Per-request
+debug lines are logged at DEBUG, which is off unless LOG_LEVEL=DEBUG.
+
+Configuration (environment variables):
+  LOG_LEVEL               DEBUG, INFO (default), WARNING or ERROR
+  LOG_FORMAT              'json' (default) or 'text'
+  LOG_DEBUG_SAMPLE_RATE   fraction of DEBUG records kept (default 1.0)
+  LOG_QUEUE_SIZE          queued records before new ones are dropped (default 10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+ROOT_LOGGER = 'diabcare'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message'}
+
+
+def fields(sample=None, **values):
+    """`extra=` argument carrying structured fields and an optional sample rate"""
+    extra = {'fields': values}
+    if sample is not None:
+        extra['sample_rate'] = sample
+    return extra
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a record with probability `sample_rate` (per record or per level)"""
+
+    def __init__(self, debug_rate=LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.debug_rate = debug_rate
+        # Private generator so sampling neither uses nor disturbs the global RNG
+        self._random = random.Random()
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None and record.levelno == logging.DEBUG and self.debug_rate < 1.0:
+            rate = record.sample_rate = self.debug_rate
+        return rate is None or rate >= 1.0 or self._random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the message, fields and exception"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        sample_rate = getattr(record, 'sample_rate', None)
+        if sample_rate is not None:
+            entry['sample_rate'] = sample_rate
+        entry.update(getattr(record, 'fields', None) or {})
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in ('fields', 'sample_rate') and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        values = getattr(record, 'fields', None)
+        if values:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in values.items())
+        return line
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of waiting for queue space"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Render in the calling thread so the record no longer references
+        # request-scoped objects, but leave the JSON layout to the listener
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+
+_listener = None
+_handler = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, stream=None):
+    """Route the 'diabcare' loggers through the queue; later calls are no-ops"""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return logging.getLogger(ROOT_LOGGER)
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+        _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _handler.addFilter(SamplingFilter())
+        _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, level, logging.INFO))
+        root.addHandler(_handler)
+        root.propagate = False
+        return root
+
+
+def _stop_listener():
+    try:
+        _listener.stop()
+    except queue.Full:
+        pass  # the daemon listener thread exits with the process
+
+
+def get_logger(name):
+    """Logger under the 'diabcare' namespace, configuring logging on first use"""
+    setup_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def logging_stats():
+    """Queue depth and records dropped because the queue was full"""
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0}
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped}
@@ -0,0 +1,167 @@
+"""Per-worker memory of the pickled model versus the memory-mapped artifact
+
+Starts N worker processes per loading mode and keeps them all alive while
+reading their memory from /proc, the way N gunicorn workers sit side by
+side:
+
+  pickle    joblib.load('model.pkl') plus the flat engines compiled from it
+            (what every worker did before the serving artifact)
+  artifact  load_artifact('model.artifact') with every array page touched
+  compact   load_artifact('model.artifact') with only the compact forest
+            touched, as when every prediction goes through CompactForest
+
+For each worker it reports the growth in RSS caused by loading the model,
+and the worker's PSS and private memory at that point. PSS divides shared
+pages between the processes that map them, so it shows what the worker
+really costs. Pass --synthetic-trees to train a larger random forest in a
+temporary directory, sized like the retrained production models.
+
+    python memory_report.py [workers] [--synthetic-trees N]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ('pickle', 'artifact', 'compact')
+
+
+def process_memory(pid='self'):
+    """RSS, PSS and private memory in bytes from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def _worker(mode, directory):
+    import joblib
+    import numpy as np
+    from forest_engine import FlatForest, scaler_affine_params
+    from model_artifact import load_artifact
+    # Imported up front in every mode, so the growth is the model alone; the
+    # artifact modes do not need sklearn at all (see cold_start_report.py)
+    import sklearn.ensemble  # noqa: F401
+
+    before = process_memory()
+    if mode == 'pickle':
+        model = joblib.load(os.path.join(directory, 'model.pkl'))
+        scaler = joblib.load(os.path.join(directory, 'scaler.pkl'))
+        engine = FlatForest.from_sklearn(model)
+        raw_engine = engine.fold_scaler(*scaler_affine_params(scaler))
+        keep = (model, engine, raw_engine)
+    elif mode == 'compact':
+        artifact = load_artifact(os.path.join(directory, 'model.artifact'))
+        engine = artifact.compact
+        if engine is None:
+            raise SystemExit("Artifact has no compact forest")
+        touched = sum(float(np.sum(array)) for array in (
+            engine.feature, engine.threshold, engine.children, engine.value))
+        keep = (artifact, touched)
+    else:
+        artifact = load_artifact(os.path.join(directory, 'model.artifact'))
+        engine = artifact.engine
+        # Fault in every page, the worst case for a long-running worker
+        touched = sum(float(np.sum(array)) for array in (
+            engine.feature, engine.threshold, artifact.raw_engine.threshold,
+            engine.left, engine.right, engine.value))
+        keep = (artifact, touched)
+
+    print(json.dumps({'pid': os.getpid(), 'rss_before': before['rss'], 'trees': engine.n_trees,
+                      'nodes': len(engine.feature)}), flush=True)
+    sys.stdin.read()
+    return keep
+
+
+def measure(mode, directory, workers):
+    """Memory of `workers` processes loading the model the given way, all alive at once"""
+    procs = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', mode, directory],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        for _ in range(workers)
+    ]
+    try:
+        ready = [json.loads(proc.stdout.readline()) for proc in procs]
+        rows = []
+        for info in ready:
+            memory = process_memory(info['pid'])
+            rows.append({**info, **memory, 'rss_growth': memory['rss'] - info['rss_before']})
+        return rows
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+
+
+def build_synthetic(directory, n_trees):
+    """Train a large forest on the validated input range and export its artifact"""
+    import joblib
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    from model_artifact import export_artifact
+
+    # Inputs rounded the way users type them, which bounds the number of
+    # distinct split thresholds the exporter's parity check has to cover
+    order = ['Glucose', 'Insulin', 'BMI', 'Age']
+    rng = np.random.default_rng(0)
+    n_rows = 50000
+    X = np.column_stack([
+        rng.integers(51, 500, n_rows), rng.integers(1, 1000, n_rows),
+        np.round(rng.uniform(10.1, 59.9, n_rows), 1), rng.integers(1, 150, n_rows),
+    ]).astype(np.float64)
+    y = ((X[:, 0] > 140) ^ (rng.random(n_rows) < 0.2)).astype(int)
+
+    scaler = StandardScaler().fit(pd.DataFrame(X, columns=order))
+    model = RandomForestClassifier(n_estimators=n_trees, random_state=0, n_jobs=-1)
+    model.fit(scaler.transform(pd.DataFrame(X, columns=order)), y)
+
+    joblib.dump(model, os.path.join(directory, 'model.pkl'))
+    joblib.dump(scaler, os.path.join(directory, 'scaler.pkl'))
+    export_artifact(model, scaler, order, path=os.path.join(directory, 'model.artifact'))
+
+
+def _mb(value):
+    return f"{value / 1e6:8.1f}"
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--worker']:
+        _worker(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    args = sys.argv[1:]
+    synthetic_trees = None
+    if '--synthetic-trees' in args:
+        at = args.index('--synthetic-trees')
+        synthetic_trees = int(args[at + 1])
+        del args[at:at + 2]
+    workers = int(args[0]) if args else 4
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if synthetic_trees:
+            directory = scratch
+            build_synthetic(directory, synthetic_trees)
+        else:
+            directory = os.path.dirname(os.path.abspath(__file__))
+
+        print(f"{'mode':<9} {'worker':>6} {'RSS growth MB':>14} {'RSS MB':>8} {'PSS MB':>8} {'private MB':>11}")
+        for mode in MODES:
+            rows = measure(mode, directory, workers)
+            for i, row in enumerate(rows):
+                print(f"{mode:<9} {i:>6} {_mb(row['rss_growth']):>14} {_mb(row['rss'])} {_mb(row['pss'])} "
+                      f"{_mb(row['private']):>11}")
+            total_pss = sum(row['pss'] for row in rows)
+            print(f"{mode:<9} {'total':>6} {'':>14} {'':>8} {_mb(total_pss)}  "
+                  f"({rows[0]['trees']} trees, {rows[0]['nodes']} nodes)")
@@ -0,0 +1,123 @@
+"""Per-stage latency histograms exposed in the Prometheus text format
+
+Hot paths wrap each stage in `timed(stage)`:
+
+    with timed('predict'):
+        prediction = predict_risk(features)
+
+Observations are labelled with the Flask app and endpoint of the current
+request ('background' outside a request) and go into fixed-bucket
+histograms. Recording one takes a perf_counter pair, a bisect and a short
+critical section, so the timers can stay on in production. Stages may
+nest: 'db_insert' includes the 'db_connect' borrow, and 'predict' includes
+'scale' when the model needs scaled inputs.
+
+`instrument(app)` adds the whole-request 'total' stage and a GET /metrics
+route to a Flask app.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_request_context, request
+
+# Bucket upper bounds in seconds, 10us to 5s
+STAGE_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+METRIC_NAME = 'diabcare_stage_duration_seconds'
+
+
+class StageHistograms:
+    """Thread-safe histograms keyed by (app, endpoint, stage)"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # key -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, key, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each request stage",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        for (app_name, endpoint, stage), (counts, total, count) in sorted(self.snapshot().items()):
+            labels = f'app="{app_name}",endpoint="{endpoint}",stage="{stage}"'
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{{labels}}} {total!r}')
+            lines.append(f'{METRIC_NAME}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+stage_histograms = StageHistograms()
+
+
+def observe(stage, seconds):
+    """Record a stage duration for the current request"""
+    if has_request_context():
+        key = (current_app.name, request.endpoint or 'unknown', stage)
+    else:
+        key = ('', 'background', stage)
+    stage_histograms.observe(key, seconds)
+
+
+class timed:
+    """Context manager timing one stage with perf_counter"""
+
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def instrument(app):
+    """Time every request as the 'total' stage and serve GET /metrics"""
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            observe('total', time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Stage latency histograms for Prometheus"""
+        return Response(stage_histograms.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    return app
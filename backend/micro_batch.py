@@ -0,0 +1,152 @@
+"""Micro-batching scheduler for single-row /predict calls
+
+With many simultaneous users every /predict pays the scaler and model
+call overhead for one row. When enabled, concurrent requests are coalesced:
+the first request to arrive opens a batch and becomes its leader, requests
+arriving within the window join it, and the leader runs one vectorised
+prediction for the stacked rows and hands every caller its own result.
+
+The batch closes when the window since the leader arrived has elapsed or
+when it reaches the maximum size, whichever comes first. A request joins
+a batch that is still open, so apart from thread scheduling delays it
+never waits longer than the window before inference starts. Batches that
+have closed run independently, so a new batch never queues behind one
+that is still computing.
+
+Every row is submitted with the group it must be predicted by (the app
+passes the ServingBundle it reordered the row with). The leader splits
+its batch by group and makes one call per group, so a request caught
+during a bundle swap is never predicted by a bundle it did not use.
+
+Configuration (environment variables):
+  PREDICT_BATCHING          'off' (default) or 'on'
+  PREDICT_BATCH_WINDOW_MS   max added wait per request in ms (default 2)
+  PREDICT_BATCH_MAX_SIZE    rows per batch (default 64)
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+PREDICT_BATCHING = os.environ.get('PREDICT_BATCHING', 'off')
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get('PREDICT_BATCH_WINDOW_MS', 2))
+PREDICT_BATCH_MAX_SIZE = int(os.environ.get('PREDICT_BATCH_MAX_SIZE', 64))
+
+
+class _Batch:
+    def __init__(self):
+        self.rows = []
+        self.groups = []
+        self.joined_at = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into one call of `predict_rows` per group
+
+    `predict_rows(rows, group)` takes an (n_rows, n_features) array and the
+    group the rows were submitted with, and returns n_rows predictions.
+    """
+
+    def __init__(self, predict_rows, window_ms=PREDICT_BATCH_WINDOW_MS, max_batch=PREDICT_BATCH_MAX_SIZE):
+        if window_ms < 0 or max_batch < 1:
+            raise ValueError(f"Invalid batching settings: window={window_ms}ms, max_batch={max_batch}")
+        self.predict_rows = predict_rows
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._open = None
+
+        self._batches = 0
+        self._requests = 0
+        self._max_size = 0
+        self._size_counts = {}
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._inference_time_total = 0.0
+        self._failed_batches = 0
+
+    def predict(self, row, group=None):
+        """Prediction for one row, computed together with concurrent callers of the same group"""
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open = batch
+            index = len(batch.rows)
+            batch.rows.append(row)
+            batch.groups.append(group)
+            batch.joined_at.append(time.monotonic())
+            if len(batch.rows) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _run(self, batch):
+        # Rows cannot be added once the batch is detached from self._open
+        closed_at = time.monotonic()
+        try:
+            rows = np.array(batch.rows, dtype=np.float64)
+            results = [None] * len(batch.rows)
+            # Groups compared by identity; almost always one group per batch
+            by_group = {}
+            for index, group in enumerate(batch.groups):
+                by_group.setdefault(id(group), (group, []))[1].append(index)
+            for group, indices in by_group.values():
+                for index, result in zip(indices, self.predict_rows(rows[indices], group)):
+                    results[index] = result
+            batch.results = results
+        except Exception as e:
+            batch.error = e
+        finally:
+            finished_at = time.monotonic()
+            batch.done.set()
+
+        waits = [closed_at - joined for joined in batch.joined_at]
+        size = len(batch.rows)
+        with self._lock:
+            self._batches += 1
+            self._requests += size
+            self._max_size = max(self._max_size, size)
+            self._size_counts[size] = self._size_counts.get(size, 0) + 1
+            self._wait_time_total += sum(waits)
+            self._wait_time_max = max(self._wait_time_max, max(waits))
+            self._inference_time_total += finished_at - closed_at
+            if batch.error is not None:
+                self._failed_batches += 1
+
+    def stats(self):
+        """Batch size and added wait time metrics"""
+        with self._lock:
+            return {
+                'mode': 'micro_batch',
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'batches': self._batches,
+                'requests': self._requests,
+                'failed_batches': self._failed_batches,
+                'batch_size_avg': round(self._requests / self._batches, 3) if self._batches else 0.0,
+                'batch_size_max': self._max_size,
+                'batch_size_counts': {str(size): count for size, count in sorted(self._size_counts.items())},
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._requests, 3) if self._requests else 0.0,
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'inference_time_avg_ms': round(self._inference_time_total * 1000 / self._batches, 3) if self._batches else 0.0,
+            }
@@ -0,0 +1,339 @@
+"""Single-file serving artifact for the diabetes forest
+
+Unpickling model.pkl and scaler.pkl on every worker boot is slow, imports
+sklearn, and breaks when the sklearn version changes. The serving
+artifact is one file holding what serving needs from those pickles: the
+compiled FlatForest arrays, the scaler's mean and scale, the feature
+order and the classes. Loading it reads a small JSON header and
+memory-maps the arrays, without unpickling and without sklearn. Every
+gunicorn worker maps the same page-cache pages, so the tree arrays are
+shared and only the pages a prediction touches are read.
+
+Layout of model.artifact:
+  magic              8 bytes, ARTIFACT_MAGIC
+  header length      uint32, little endian
+  header             UTF-8 JSON: format, source checksum, payload SHA-256,
+                     feature order, classes, max depth, scaler mean/scale,
+                     parity checks, and dtype/shape/offset of every array
+  payload            raw arrays, each aligned to 64 bytes:
+                       feature, threshold (scaled units, float32 inputs),
+                       raw_threshold (scaler folded in, raw float64
+                       inputs), left, right, value, roots, and
+                       compact_* (CompactForest arrays with raw-unit
+                       thresholds, when "compact" is set in the header)
+
+Build it next to the model files with:
+
+    python model_artifact.py
+    python model_artifact.py --model diabetes_improved_model.pkl --scaler diabetes_scaler.pkl \\
+        --features diabetes_features.pkl --output improved_model.artifact
+
+The exporter checks both engines against the sklearn pipeline and refuses
+to write an artifact that differs. The compact forest is optional: it is
+only written when verify_compact_parity finds no prediction difference,
+and the header's "compact" entry is null otherwise. Loading checks the
+payload checksum, and the source checksum when the model files are
+present, so a damaged artifact or one built from other model files is
+never served.
+"""
+import hashlib
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from compact_forest import CompactForest, verify_compact_parity
+from forest_engine import (VALIDATED_RANGES, FlatForest, sample_validated_inputs, scaler_affine_params,
+                           verify_folded_parity, verify_parity)
+
+ARTIFACT_PATH = 'model.artifact'
+ARTIFACT_MAGIC = b'DIABART\x00'
+ARTIFACT_FORMAT = 3
+ARTIFACT_ARRAYS = ('feature', 'threshold', 'raw_threshold', 'left', 'right', 'value', 'roots')
+COMPACT_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Every array starts on a cache line
+ARRAY_ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sI')
+
+
+class AffineScaler:
+    """StandardScaler.transform from the resolved mean and scale, without sklearn
+
+    Same float64 subtract-then-divide as the fitted StandardScaler, so the
+    scaled values are bit-for-bit identical.
+    """
+
+    def __init__(self, mean, scale, feature_names=None):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.with_mean = True
+        self.with_std = True
+        self.n_features_in_ = len(self.mean_)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    def transform(self, X):
+        columns = getattr(X, 'columns', None)
+        names = getattr(self, 'feature_names_in_', None)
+        if columns is not None and names is not None and list(columns) != list(names):
+            raise ValueError(f"Feature names {list(columns)} do not match the fitted order {list(names)}")
+        features = np.array(X, dtype=np.float64, ndmin=2)
+        features -= self.mean_
+        features /= self.scale_
+        return features
+
+
+class ServingArtifact:
+    """Flat engines and scaler parameters backed by memory-mapped arrays"""
+
+    def __init__(self, engine, raw_engine, feature_order, scaler_mean, scaler_scale, source_checksum=None,
+                 compact=None, payload_checksum=None):
+        self.engine = engine
+        self.raw_engine = raw_engine
+        self.compact = compact
+        self.feature_order = list(feature_order)
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.source_checksum = source_checksum
+        self.payload_checksum = payload_checksum
+        self.scaler = AffineScaler(scaler_mean, scaler_scale, feature_names=self.feature_order)
+
+    @property
+    def nbytes(self):
+        engine = self.engine
+        arrays = (engine.feature, engine.threshold, self.raw_engine.threshold, engine.left, engine.right,
+                  engine.value, engine.roots)
+        return sum(array.nbytes for array in arrays) + (self.compact.nbytes if self.compact is not None else 0)
+
+
+def parity_sample(feature_order, mean, scale, n_random=20000, seed=0):
+    """Raw rows for the export parity checks
+
+    The validated /predict range when every feature has one, otherwise
+    draws spread around the scaler's mean. The checks add rows on both
+    sides of every threshold either way.
+    """
+    if all(name in VALIDATED_RANGES for name in feature_order):
+        return sample_validated_inputs(feature_order)
+    rng = np.random.default_rng(seed)
+    return mean + scale * rng.normal(0.0, 2.0, size=(n_random, len(mean)))
+
+
+def _aligned(offset):
+    return -(-offset // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def _payload_digest(f, offset, length):
+    # Plain reads rather than the mapping, so checking does not fault every page into the worker
+    digest = hashlib.sha256()
+    f.seek(offset)
+    remaining = length
+    while remaining > 0:
+        block = f.read(min(remaining, 1 << 20))
+        if not block:
+            raise ValueError("Serving artifact is truncated")
+        digest.update(block)
+        remaining -= len(block)
+    return digest.hexdigest()
+
+
+def export_artifact(model, scaler, feature_order, path=ARTIFACT_PATH, source_checksum=None):
+    """Compile, verify and write the serving artifact; returns the parity results"""
+    engine = FlatForest.from_sklearn(model)
+    mean, scale = scaler_affine_params(scaler)
+    raw_engine = engine.fold_scaler(mean, scale)
+    X_raw = parity_sample(list(feature_order), mean, scale)
+
+    checks = {
+        'engine': verify_parity(model, scaler, feature_order, engine=engine, X_raw=X_raw),
+        'raw_engine': verify_folded_parity(model, scaler, feature_order, folded=raw_engine, X_raw=X_raw),
+    }
+    for name, check in checks.items():
+        if check['prediction_mismatches'] or check['probability_mismatches']:
+            raise ValueError(f"{name} differs from the sklearn pipeline, not exporting: {check}")
+
+    # Predictions only; probabilities keep coming from the exact engines
+    compact = CompactForest.from_flat(raw_engine)
+    checks['compact'] = verify_compact_parity(model, scaler, feature_order, compact, X_raw=X_raw)
+    if checks['compact']['prediction_mismatches']:
+        compact = None
+
+    arrays = {
+        'feature': engine.feature,
+        'threshold': engine.threshold,
+        'raw_threshold': raw_engine.threshold,
+        'left': engine.left,
+        'right': engine.right,
+        'value': engine.value,
+        'roots': engine.roots,
+    }
+    if compact is not None:
+        for name in COMPACT_ARRAYS:
+            arrays[f'compact_{name}'] = getattr(compact, name)
+
+    layout = {}
+    digest = hashlib.sha256()
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        start = _aligned(offset)
+        digest.update(bytes(start - offset))
+        digest.update(array.tobytes())
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': start}
+        offset = start + array.nbytes
+
+    header = json.dumps({
+        'format': ARTIFACT_FORMAT,
+        'created_at': datetime.now().isoformat(),
+        'source_checksum': source_checksum,
+        'payload_sha256': digest.hexdigest(),
+        'payload_bytes': offset,
+        'feature_order': [str(name) for name in feature_order],
+        'classes': engine.classes_.tolist(),
+        'max_depth': engine.max_depth,
+        'scaler_mean': mean.tolist(),
+        'scaler_scale': scale.tolist(),
+        'compact': {'quantization': compact.quantization} if compact is not None else None,
+        'checks': checks,
+        'arrays': layout,
+    }, indent=1).encode('utf-8')
+    payload_start = _aligned(_PREFIX.size + len(header))
+
+    # Written next to the target and renamed, so readers never see a partial file
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(_PREFIX.pack(ARTIFACT_MAGIC, len(header)))
+            f.write(header)
+            f.write(bytes(payload_start - _PREFIX.size - len(header)))
+            written = 0
+            for name, array in arrays.items():
+                f.write(bytes(layout[name]['offset'] - written))
+                f.write(array.tobytes())
+                written = layout[name]['offset'] + array.nbytes
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return checks
+
+
+def read_header(path):
+    """(header, payload offset) of an artifact file"""
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) != _PREFIX.size:
+            raise ValueError("Serving artifact is truncated")
+        magic, header_length = _PREFIX.unpack(prefix)
+        if magic != ARTIFACT_MAGIC:
+            raise ValueError(f"{path} is not a serving artifact")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    return header, _aligned(_PREFIX.size + header_length)
+
+
+def load_artifact(path=ARTIFACT_PATH, source_checksum=None, mmap_mode='r', verify=True):
+    """Open an artifact if it exists and was built from the given model files
+
+    `source_checksum` None skips the source check, for hosts that ship the
+    artifact without the pickles. With mmap_mode='r' the arrays are
+    read-only views of the file and are shared between processes;
+    mmap_mode=None reads private copies. verify=False skips the payload
+    checksum.
+    """
+    if not os.path.exists(path):
+        return None
+    header, payload_start = read_header(path)
+
+    if header.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format: {header.get('format')}")
+    if source_checksum is not None and header['source_checksum'] != source_checksum:
+        raise ValueError("Serving artifact was built from different model files")
+
+    with open(path, 'rb') as f:
+        if verify and _payload_digest(f, payload_start, header['payload_bytes']) != header['payload_sha256']:
+            raise ValueError("Serving artifact payload does not match its checksum")
+        if mmap_mode is None:
+            f.seek(payload_start)
+            payload = bytearray(f.read(header['payload_bytes']))
+    if mmap_mode is not None:
+        payload = np.memmap(path, dtype=np.uint8, mode=mmap_mode, offset=payload_start,
+                            shape=(header['payload_bytes'],))
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        if spec['offset'] + dtype.itemsize * int(np.prod(spec['shape'])) > header['payload_bytes']:
+            raise ValueError(f"Artifact array {name} extends past the payload")
+        # A plain ndarray over the mapped buffer, not an np.memmap subclass
+        arrays[name] = np.ndarray(tuple(spec['shape']), dtype=dtype, buffer=payload, offset=spec['offset'])
+    missing = [name for name in ARTIFACT_ARRAYS if name not in arrays]
+    if missing:
+        raise ValueError(f"Artifact is missing arrays: {missing}")
+
+    # The loader indexes with intp; files written on another platform are converted once
+    for name in ('feature', 'left', 'right', 'roots'):
+        if arrays[name].dtype != np.intp:
+            arrays[name] = arrays[name].astype(np.intp)
+
+    classes = np.asarray(header['classes'])
+    common = (arrays['left'], arrays['right'], arrays['value'], arrays['roots'], header['max_depth'], classes)
+    engine = FlatForest(arrays['feature'], arrays['threshold'], *common)
+    raw_engine = FlatForest(arrays['feature'], arrays['raw_threshold'], *common, input_dtype=np.float64)
+
+    compact = None
+    if header.get('compact'):
+        # Narrow dtypes as written; apply() converts node indices to intp itself
+        compact = CompactForest(*(arrays[f'compact_{name}'] for name in COMPACT_ARRAYS),
+                                header['max_depth'], classes, exact=raw_engine,
+                                quantization=header['compact']['quantization'])
+
+    return ServingArtifact(
+        engine, raw_engine, header['feature_order'],
+        np.asarray(header['scaler_mean'], dtype=np.float64),
+        np.asarray(header['scaler_scale'], dtype=np.float64),
+        source_checksum=header['source_checksum'],
+        compact=compact,
+        payload_checksum=header['payload_sha256'],
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import joblib
+
+    from region_table import file_checksum
+
+    parser = argparse.ArgumentParser(description='Build the single-file serving artifact')
+    parser.add_argument('--model', default='model.pkl')
+    parser.add_argument('--scaler', default='scaler.pkl')
+    parser.add_argument('--features', default=None,
+                        help='pickled feature column list (default: the scaler\'s feature names)')
+    parser.add_argument('--output', default=ARTIFACT_PATH)
+    args = parser.parse_args()
+
+    sources = [args.model, args.scaler] + ([args.features] if args.features else [])
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+    if args.features:
+        order = list(joblib.load(args.features))
+    else:
+        order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+
+    started = time.perf_counter()
+    try:
+        checks = export_artifact(model, scaler, order, path=args.output, source_checksum=file_checksum(*sources))
+    except (TypeError, ValueError) as e:
+        raise SystemExit(f"[ERROR] Not exporting {args.model}: {e}")
+    print(f"[INFO] Parity checks: {checks}")
+
+    artifact = load_artifact(args.output)
+    print(f"[INFO] Serving artifact written to {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB, "
+          f"{artifact.engine.n_trees} trees, compact forest {'included' if artifact.compact is not None else 'omitted'}) "
+          f"in {time.perf_counter() - started:.1f}s")
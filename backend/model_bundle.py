@@ -0,0 +1,451 @@
+"""Immutable serving bundle and hot reload for the diabetes API
+
+Everything a request needs from the model files goes into one
+ServingBundle. That is the diabetes model (or the artifact engine
+standing in for it), the scaler, the compiled engines, the compact forest, the
+region table, the food catalog and its index. A bundle is fully built before it is
+published and never changes afterwards. Requests read the active bundle
+once and use it throughout, so a reload can never pair a new scaler with
+an old model.
+
+BundleReloader builds a candidate bundle off the request path, warms it
+and checks it with canary predictions. Only a candidate that passes
+replaces the active bundle, with a single reference assignment. A failed
+candidate is discarded and the previous bundle keeps serving.
+
+Reloads are triggered by POST /admin/reload or by the file watcher. The
+endpoint reaches only the gunicorn worker that receives the request; the
+watcher runs in every worker. Replace model files with an atomic rename
+so the watcher never sees a half-written file. A half-written file is
+only a failed reload anyway: the candidate is rejected, and the next
+change to the file triggers another attempt.
+
+Configuration (environment variables):
+  MODEL_RELOAD_WATCH_INTERVAL  seconds between file checks (default 0, watcher off)
+  ADMIN_TOKEN                  X-Admin-Token for POST /admin/reload (endpoint disabled when unset)
+  PREDICT_REGION_TABLE         'on' to serve class predictions from region_table.npz (default 'off')
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from compact_forest import CompactForest, verify_compact_parity
+from forest_engine import (VALIDATED_RANGES, FlatForest, sample_validated_inputs, scaler_affine_params,
+                           verify_folded_parity)
+from inference_threads import inference_threads, serial_model
+from log_config import fields, get_logger
+from metrics import timed
+from model_artifact import ARTIFACT_PATH, load_artifact
+from region_table import REGION_TABLE_PATH, load_region_table
+
+MODEL_RELOAD_WATCH_INTERVAL = float(os.environ.get('MODEL_RELOAD_WATCH_INTERVAL', 0))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PREDICT_REGION_TABLE = os.environ.get('PREDICT_REGION_TABLE', 'off')
+
+# Default model feature order, and each model feature's column in [age, bmi, glucose, insulin]
+DEFAULT_FEATURE_ORDER = ['Glucose', 'Insulin', 'BMI', 'Age']
+INPUT_COLUMNS = {'Age': 0, 'BMI': 1, 'Glucose': 2, 'Insulin': 3}
+
+# /predict range checks in the order they are reported, with their error messages
+INPUT_RANGE_CHECKS = (
+    ('Age', 'Age must be between 1-149'),
+    ('BMI', 'BMI must be between 10-60'),
+    ('Glucose', 'Glucose must be between 50-500'),
+    ('Insulin', 'Insulin must be between 1-999'),
+)
+
+# Inputs up to this many rows use the flat forest engine; larger batches
+# amortise sklearn's per-call overhead and use the sklearn model directly
+ENGINE_MAX_ROWS = 256
+
+# Class predictions up to ENGINE_MAX_ROWS rows go, in order, to the compact
+# forest, the scaler-folded engine and the scaled-input engine, so the
+# compact forest is the /predict engine. It is the scaler-folded engine with
+# narrow dtypes: it takes raw rows, reads 17 bytes per node instead of 48,
+# and hands the rare rows next to a float32 threshold to the folded engine.
+# It is about as fast as the folded engine for one row and faster for
+# small batches. The region table answers a row
+# several times faster but costs every worker megabytes of private memory,
+# and cannot be built for large retrained forests; it is only loaded with
+# PREDICT_REGION_TABLE=on, and then serves ahead of the compact forest.
+# Probabilities stay on the exact float64 engines, because the compact
+# leaves are quantized.
+
+logger = get_logger(__name__)
+
+
+def range_errors(features, errors):
+    """Record the first failed /predict range check of each row in `errors`
+
+    `features` is an (n, 4) [age, bmi, glucose, insulin] array. Rows that
+    already have an error keep it; NaN rows fail every comparison.
+    """
+    for name, message in INPUT_RANGE_CHECKS:
+        low, high = VALIDATED_RANGES[name]
+        values = features[:, INPUT_COLUMNS[name]]
+        for i in np.flatnonzero(~((low < values) & (values < high))):
+            if errors[i] is None:
+                errors[i] = message
+    return errors
+
+
+def bundle_checksum(*checksums):
+    """One checksum over the per-file checksums of a bundle's sources"""
+    return hashlib.sha256(':'.join(checksum or '' for checksum in checksums).encode()).hexdigest()
+
+
+def load_models(model_path, scaler_path, source_checksum, artifact_path=ARTIFACT_PATH,
+                region_table_path=REGION_TABLE_PATH, use_artifact=True, use_region_table=None):
+    """Model, scaler and compiled engines as ServingBundle fields
+
+    `source_checksum` is the checksum of the model and scaler files, or
+    None if they could not be read; the artifact then serves on its own.
+    Anything that fails to load is None.
+    With use_artifact=False the sklearn model is unpickled even when a
+    serving artifact exists, for callers that need its large-batch speed.
+    `use_region_table` defaults to PREDICT_REGION_TABLE == 'on'.
+    """
+    # Single-file serving artifact (built offline by model_artifact.py). Its
+    # tree arrays are shared by every worker, and nothing is unpickled.
+    artifact = None
+    try:
+        artifact = load_artifact(artifact_path, source_checksum) if use_artifact else None
+    except Exception as e:
+        logger.warning(f"Serving artifact unavailable, loading {model_path}: {e}")
+    if artifact is not None and source_checksum is None:
+        logger.warning(f"Model files unreadable, serving the artifact built from "
+                       f"{(artifact.source_checksum or 'unknown')[:12]}")
+
+    try:
+        if artifact is not None:
+            # The artifact's scaled-input engine has the sklearn model's predict/predict_proba,
+            # and its scaler the StandardScaler's transform
+            diabetes_model = artifact.engine
+            diabetes_scaler = artifact.scaler
+        else:
+            diabetes_model = serial_model(joblib.load(model_path))
+            diabetes_scaler = joblib.load(scaler_path)
+        
+        if hasattr(diabetes_scaler, 'feature_names_in_'):
+            feature_order = diabetes_scaler.feature_names_in_
+            logger.info(f"Diabetes model loaded successfully")
+            logger.info(f"Feature order: {list(feature_order)}")
+        else:
+            feature_order = DEFAULT_FEATURE_ORDER
+            logger.info(f"Diabetes model loaded successfully")
+            logger.info(f"Using default feature order: {feature_order}")
+
+        # Resolved once so requests scale and reorder with plain NumPy
+        scaler_mean, scaler_scale = scaler_affine_params(diabetes_scaler)
+            
+    except Exception as e:
+        logger.error(f"Failed to load diabetes model: {e}")
+        return {}
+
+    if artifact is not None:
+        # Both engines were checked against the sklearn pipeline when exported
+        diabetes_engine = artifact.engine
+        diabetes_raw_engine = artifact.raw_engine
+        diabetes_compact = artifact.compact
+        logger.info(f"Serving artifact mapped: {diabetes_engine.n_trees} trees, {len(diabetes_engine.feature)} nodes, "
+                    f"{artifact.nbytes / 1e6:.2f} MB shared, payload {artifact.payload_checksum[:12]}")
+    else:
+        try:
+            diabetes_engine = FlatForest.from_sklearn(diabetes_model)
+            logger.info(f"Flat forest engine compiled: {diabetes_engine.n_trees} trees, {len(diabetes_engine.feature)} nodes")
+        except Exception as e:
+            logger.warning(f"Flat forest engine unavailable, using sklearn predict: {e}")
+            diabetes_engine = None
+        diabetes_raw_engine = None
+        diabetes_compact = None
+
+    # Scaler folded into the split thresholds so raw inputs skip the transform.
+    # Only used if it matches the scaler + model pipeline on a dense sample.
+    if diabetes_engine is not None and diabetes_raw_engine is None:
+        try:
+            folded = diabetes_engine.fold_scaler(scaler_mean, scaler_scale)
+            order = list(feature_order)
+            check = verify_folded_parity(diabetes_model, diabetes_scaler, order, folded=folded,
+                                         X_raw=sample_validated_inputs(order, n_random=2000, grid_points=6))
+            if check['prediction_mismatches'] or check['probability_mismatches']:
+                logger.warning(f"Scaler-folded engine differs from the model, not using it: {check}")
+            else:
+                diabetes_raw_engine = folded
+                logger.info(f"Scaler folded into engine thresholds ({check['rows_checked']} rows verified)")
+        except Exception as e:
+            logger.warning(f"Scaler-folded engine unavailable, scaling per request: {e}")
+
+    # Narrow-dtype copy of the scaler-folded engine, used for predictions only
+    # if it agrees with the model everywhere on the dense sample
+    if diabetes_raw_engine is not None and diabetes_compact is None and artifact is None:
+        try:
+            compact = CompactForest.from_flat(diabetes_raw_engine)
+            order = list(feature_order)
+            check = verify_compact_parity(diabetes_model, diabetes_scaler, order, compact,
+                                          X_raw=sample_validated_inputs(order, n_random=2000, grid_points=6))
+            if check['prediction_mismatches']:
+                logger.warning(f"Compact forest differs from the model, not using it: {check}")
+            else:
+                diabetes_compact = compact
+                logger.info(f"Compact forest built: {compact.nbytes / 1e3:.1f} KB ({check['rows_checked']} rows verified)")
+        except Exception as e:
+            logger.warning(f"Compact forest unavailable: {e}")
+
+    # Precompiled decision-region table (built offline by region_table.py), opt-in
+    if use_region_table is None:
+        use_region_table = PREDICT_REGION_TABLE == 'on'
+    try:
+        # Without the model files, the table must come from the same sources as the artifact
+        table_checksum = source_checksum or (artifact.source_checksum if artifact is not None else None)
+        region_table = load_region_table(region_table_path, table_checksum) if use_region_table else None
+        if region_table is not None:
+            logger.info(f"Region table loaded: {region_table.n_cells} cells")
+    except Exception as e:
+        logger.warning(f"Region table unavailable, using model: {e}")
+        region_table = None
+
+    return {
+        'model': diabetes_model,
+        'scaler': diabetes_scaler,
+        'engine': diabetes_engine,
+        'raw_engine': diabetes_raw_engine,
+        'compact': diabetes_compact,
+        'region_table': region_table,
+        'feature_order': feature_order,
+        'scaler_mean': scaler_mean,
+        'scaler_scale': scaler_scale,
+    }
+
+
+class ServingBundle:
+    """Model, scaler, engines and food catalog that are always used together"""
+
+    def __init__(self, model=None, scaler=None, engine=None, raw_engine=None, compact=None, region_table=None,
+                 feature_order=None, scaler_mean=None, scaler_scale=None, food_data=None, food_index=None,
+                 checksum=None):
+        values = {
+            'model': model,
+            'scaler': scaler,
+            'engine': engine,
+            'raw_engine': raw_engine,
+            'compact': compact,
+            'region_table': region_table,
+            'feature_order': feature_order,
+            'feature_positions': [INPUT_COLUMNS[name] for name in (feature_order if feature_order is not None
+                                                                   else DEFAULT_FEATURE_ORDER)
+                                  if name in INPUT_COLUMNS],
+            'scaler_mean': scaler_mean,
+            'scaler_scale': scaler_scale,
+            'food_data': food_data,
+            'food_index': food_index if food_index is not None else {},
+            'checksum': checksum,
+            'version': checksum[:12] if checksum else 'unversioned',
+            'loaded_at': datetime.now().isoformat(),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ServingBundle is immutable; build a new bundle instead")
+
+    @property
+    def model_ready(self):
+        return self.model is not None and self.scaler is not None
+
+    def reorder(self, age, bmi, glucose, insulin):
+        """Reorder one row of features to match model training order"""
+        values = (age, bmi, glucose, insulin)
+        return [values[position] for position in self.feature_positions]
+
+    def reorder_matrix(self, features):
+        """Reorder an (n, 4) [age, bmi, glucose, insulin] matrix to model training order"""
+        return features[:, self.feature_positions]
+
+    def scale(self, reordered):
+        """StandardScaler transform of raw rows in model feature order, without sklearn validation
+
+        Same float64 subtract-then-divide as scaler.transform.
+        """
+        with timed('scale'):
+            features = np.array(reordered, dtype=np.float64, ndmin=2)
+            features -= self.scaler_mean
+            features /= self.scaler_scale
+            return features
+
+    def predict_risk(self, reordered_features):
+        """Predict the diabetes class for one raw row in model feature order"""
+        if self.region_table is not None:
+            return int(self.region_table.predict_one([float(value) for value in reordered_features]))
+        if self.compact is not None:
+            return int(self.compact.predict([[float(value) for value in reordered_features]])[0])
+        if self.raw_engine is not None:
+            return int(self.raw_engine.predict([float(value) for value in reordered_features])[0])
+        return int(self.predict_scaled(self.scale(reordered_features))[0])
+
+    def predict_risk_matrix(self, reordered):
+        """Predict diabetes classes for raw rows already in model feature order"""
+        if self.region_table is not None:
+            return self.region_table.predict(reordered).astype(int)
+        if self.compact is not None and len(reordered) <= ENGINE_MAX_ROWS:
+            return self.compact.predict(reordered).astype(int)
+        if self.raw_engine is not None and len(reordered) <= ENGINE_MAX_ROWS:
+            return self.raw_engine.predict(reordered).astype(int)
+        return self.predict_scaled(self.scale(reordered)).astype(int)
+
+    def predict_proba_matrix(self, reordered):
+        """Class probabilities for raw rows in model feature order, like model.predict_proba"""
+        if self.raw_engine is not None and len(reordered) <= ENGINE_MAX_ROWS:
+            return self.raw_engine.predict_proba(reordered)
+        features_scaled = self.scale(reordered)
+        with inference_threads(len(features_scaled)):
+            return self.model.predict_proba(features_scaled)
+
+    def predict_scaled(self, features_scaled):
+        """Predict diabetes classes for scaled features, preferring the flat forest engine"""
+        if self.engine is not None and len(features_scaled) <= ENGINE_MAX_ROWS:
+            return self.engine.predict(features_scaled)
+        with inference_threads(len(features_scaled)):
+            return self.model.predict(features_scaled)
+
+    def info(self):
+        """Version and components, as reported on /health"""
+        return {
+            'version': self.version,
+            'checksum': self.checksum,
+            'loaded_at': self.loaded_at,
+            'model': type(self.model).__name__ if self.model is not None else None,
+            'engine': self.engine is not None,
+            'raw_engine': self.raw_engine is not None,
+            'compact_forest': self.compact is not None,
+            'region_table': self.region_table is not None,
+            'food_items': len(self.food_data) if self.food_data is not None else 0,
+        }
+
+
+class BundleReloader:
+    """Owner of the active bundle, swapping in validated replacements
+
+    `build()` returns a new ServingBundle. `validate(bundle)` warms it and
+    returns a list of problems, empty when the bundle may serve traffic.
+    `on_swap(bundle)` runs after a new bundle became active.
+    """
+
+    def __init__(self, build, validate, watch_paths=(), on_swap=None, interval=MODEL_RELOAD_WATCH_INTERVAL):
+        self.build = build
+        self.validate = validate
+        self.on_swap = on_swap
+        self.watch_paths = tuple(watch_paths)
+        self.interval = interval
+        self.active = None
+
+        self._reload_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._seen_mtimes = None
+        self._watcher = None
+
+        self._reloads = 0
+        self._failures = 0
+        self._last_result = None
+
+    def _mtimes(self):
+        mtimes = []
+        for path in self.watch_paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def load_initial(self):
+        """Build and publish the first bundle, serving it even if validation finds problems"""
+        self._seen_mtimes = self._mtimes()
+        bundle = self.build()
+        problems = self.validate(bundle)
+        if problems:
+            logger.warning("Initial model bundle has problems", extra=fields(version=bundle.version, problems=problems))
+        self.active = bundle
+        return bundle
+
+    def reload(self, reason='manual'):
+        """Build, warm and validate a new bundle, then swap it in; returns the result"""
+        if not self._reload_lock.acquire(blocking=False):
+            return {'success': False, 'status': 'in_progress'}
+        try:
+            started = time.perf_counter()
+            previous = self.active
+            # Taken before building, so a change made during the build triggers another reload
+            self._seen_mtimes = self._mtimes()
+            try:
+                candidate = self.build()
+                problems = self.validate(candidate)
+            except Exception as e:
+                logger.exception("Model bundle reload failed")
+                candidate, problems = None, [f'Exception: {e}']
+
+            result = {
+                'success': not problems,
+                'status': 'swapped' if not problems else 'rejected',
+                'reason': reason,
+                'previous_version': previous.version if previous is not None else None,
+                'version': previous.version if problems or candidate is None else candidate.version,
+                'candidate_version': candidate.version if candidate is not None else None,
+                'problems': problems,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                'finished_at': datetime.now().isoformat(),
+            }
+            if not problems:
+                self.active = candidate
+                if self.on_swap is not None:
+                    self.on_swap(candidate)
+                logger.info("Model bundle swapped", extra=fields(**result))
+            else:
+                logger.error("Model bundle rejected, keeping the active bundle", extra=fields(**result))
+
+            with self._stats_lock:
+                self._reloads += 1
+                self._failures += bool(problems)
+                self._last_result = result
+            return result
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self, reason='manual'):
+        """Start a reload thread; False if a reload is already running"""
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, args=(reason,), name='bundle-reload', daemon=True).start()
+        return True
+
+    def start_watching(self):
+        """Reload whenever a watched file changes, checking every `interval` seconds"""
+        if self.interval <= 0 or self._watcher is not None:
+            return self
+        self._watcher = threading.Thread(target=self._watch, name='bundle-watcher', daemon=True)
+        self._watcher.start()
+        return self
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if self._mtimes() != self._seen_mtimes:
+                    self.reload('file_change')
+            except Exception:
+                logger.exception("Model file watcher failed")
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'active': self.active.info() if self.active is not None else None,
+                'reloads': self._reloads,
+                'failed_reloads': self._failures,
+                'reload_in_progress': self._reload_lock.locked(),
+                'last_reload': self._last_result,
+                'watch_interval': self.interval,
+                'watched_files': list(self.watch_paths),
+            }
@@ -0,0 +1,94 @@
+"""Crossover between single-threaded and threaded forest inference
+
+Times the sklearn model's predict_proba on batches of increasing size,
+once single-threaded and once per thread budget. It also times the
+unmanaged setting a pickled model may carry (n_jobs=-1). For each budget
+it reports the smallest batch where threads are at least 10% faster than
+one thread. That is the value to use for INFERENCE_PARALLEL_MIN_ROWS on
+this hardware.
+
+    python parallelism_benchmark.py [max_threads]
+"""
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forest_engine import sample_validated_inputs
+from inference_threads import inference_threads, limit_native_threads, serial_model, set_batch_threads
+
+BATCH_SIZES = (1, 16, 128, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+# Threads must beat one thread by this factor to count as the crossover
+SPEEDUP_REQUIRED = 1.1
+
+
+def _median_seconds(function):
+    # Enough repetitions for ~0.2s per measurement, at least 3
+    function()
+    started = time.perf_counter()
+    function()
+    once = max(time.perf_counter() - started, 1e-6)
+    repeats = max(3, min(1000, int(0.2 / once)))
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings))
+
+
+def benchmark(model, X, thread_counts):
+    """{(threads, batch_size): seconds}; threads 'unmanaged' is the model with n_jobs=-1"""
+    results = {}
+    for rows in BATCH_SIZES:
+        batch = X[:rows]
+        for threads in thread_counts:
+            set_batch_threads(threads)
+
+            def managed():
+                with inference_threads(rows, min_rows=0):
+                    model.predict_proba(batch)
+
+            results[threads, rows] = _median_seconds(managed)
+
+        model.n_jobs = -1
+        results['unmanaged', rows] = _median_seconds(lambda: model.predict_proba(batch))
+        serial_model(model)
+    return results
+
+
+def crossover(results, threads):
+    """Smallest batch size where `threads` beats one thread, or None"""
+    for rows in BATCH_SIZES:
+        if results[1, rows] >= results[threads, rows] * SPEEDUP_REQUIRED:
+            return rows
+    return None
+
+
+if __name__ == '__main__':
+    cores = os.cpu_count() or 1
+    max_threads = int(sys.argv[1]) if len(sys.argv) > 1 else cores
+    thread_counts = sorted({1, *[t for t in (2, 4, 8, 16) if t <= max_threads], max_threads})
+
+    model = serial_model(joblib.load('model.pkl'))
+    scaler = joblib.load('scaler.pkl')
+    limit_native_threads()
+    order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+    raw = sample_validated_inputs(order, n_random=max(BATCH_SIZES), grid_points=2)
+    X = scaler.transform(pd.DataFrame(raw[:max(BATCH_SIZES)], columns=order))
+
+    print(f"{len(model.estimators_)} trees, {cores} cores")
+    results = benchmark(model, X, thread_counts)
+    columns = [*thread_counts, 'unmanaged']
+    print(f"{'rows':>7} " + ' '.join(f"{str(t) + ' thr us':>13}" if t != 'unmanaged' else f"{'n_jobs=-1 us':>13}"
+                                     for t in columns))
+    for rows in BATCH_SIZES:
+        print(f"{rows:>7} " + ' '.join(f"{results[t, rows] * 1e6:>13.0f}" for t in columns))
+
+    for threads in thread_counts[1:]:
+        rows = crossover(results, threads)
+        verdict = f"from {rows} rows" if rows is not None else "never (use 1 thread)"
+        print(f"[INFO] {threads} threads beat 1 thread by {SPEEDUP_REQUIRED:g}x {verdict}")
@@ -0,0 +1,103 @@
+"""In-process cache of /recommend_food responses
+
+generate_user_seed makes recommendations deterministic for a given
+(age, bmi, glucose, insulin, category) within one clock hour, so identical
+requests in the same hour can reuse the first response. Entries are keyed
+on those inputs plus the hour and expire exactly when the hour ends; the
+least recently used entry is evicted once the cache is full.
+
+Configuration (environment variables):
+  RECOMMENDATION_CACHE_SIZE   max cached responses (default 2048, 0 disables)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 2048))
+
+
+def hour_bucket(now=None):
+    """Current hour as used by generate_user_seed, and the epoch time it ends"""
+    now = now or datetime.now()
+    start = now.replace(minute=0, second=0, microsecond=0)
+    return start.strftime('%Y%m%d%H'), (start + timedelta(hours=1)).timestamp()
+
+
+def recommendation_key(age, bmi, glucose, insulin, category, hour):
+    """Cache key matching the generate_user_seed input string
+
+    Values are kept in their formatted form because the seed is built from
+    f-strings: 30 and 30.0 give different seeds and must not share an entry.
+    """
+    return (f"{age}", f"{bmi}", f"{glucose}", f"{insulin}", f"{category}", hour)
+
+
+class HourlyLRUCache:
+    """Thread-safe LRU cache whose entries expire at a given epoch time"""
+
+    def __init__(self, maxsize=RECOMMENDATION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (value, expires_at), most recent last
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key):
+        """Cached value, or None if absent or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key, value, expires_at):
+        if self.maxsize <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._purge_expired()
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        self._expirations += len(expired)
+
+    def clear(self):
+        """Drop every entry, e.g. after the model or food catalog is reloaded"""
+        with self._lock:
+            self._entries.clear()
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.maxsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
@@ -0,0 +1,244 @@
+"""Exact decision-region lookup table for the diabetes RandomForest
+
+The model only sees Glucose, Insulin, BMI and Age, and every tree split is
+a comparison of one feature against a threshold. The unique thresholds per
+feature therefore cut the input space into a finite grid of cells, and the
+forest gives the same answer everywhere inside a cell.
+
+The offline compiler below folds scaler.pkl into those thresholds, so the
+cell boundaries are in raw input units, evaluates the forest once per cell
+and stores the winning class as one bit per cell. Serving a prediction is
+then four `searchsorted` calls and one array lookup.
+
+Build the table with:
+
+    python region_table.py
+
+If the grid would exceed the configured cell limit the compiler refuses to
+build it and the app keeps using the model. The app only serves from the
+table with PREDICT_REGION_TABLE=on; by default /predict uses the compact
+forest (compact_forest.py), which costs each worker far less memory.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from forest_engine import FlatForest, fold_scaler_threshold, sample_validated_inputs, scaler_affine_params
+
+REGION_TABLE_PATH = 'region_table.npz'
+
+# 2**26 cells packs into 8 MB of votes
+DEFAULT_MAX_CELLS = 2 ** 26
+
+# Rows of the first feature evaluated together while compiling
+COMPILE_CHUNK_ROWS = 8
+
+
+class RegionTableTooLarge(ValueError):
+    """Raised when the decision grid exceeds the configured cell limit"""
+
+
+def file_checksum(*paths):
+    """SHA-256 over the contents of the given files"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class RegionTable:
+    """Forest votes for every cell of the raw-unit decision grid"""
+
+    def __init__(self, boundaries, votes, classes, source_checksum=None):
+        self.boundaries = [np.ascontiguousarray(b, dtype=np.float64) for b in boundaries]
+        self.votes = np.ascontiguousarray(votes, dtype=np.uint8)
+        self.classes_ = np.asarray(classes)
+        self.source_checksum = source_checksum
+        self.shape = tuple(len(b) + 1 for b in self.boundaries)
+        self.strides = np.array(
+            [int(np.prod(self.shape[i + 1:], dtype=np.int64)) for i in range(len(self.shape))],
+            dtype=np.int64
+        )
+
+    @property
+    def n_cells(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    def predict_one(self, row):
+        """Predict one raw row given in model feature order"""
+        cell = 0
+        for boundaries, stride, value in zip(self.boundaries, self.strides, row):
+            cell += int(np.searchsorted(boundaries, value, side='left')) * int(stride)
+        bit = (self.votes[cell >> 3] >> (7 - (cell & 7))) & 1
+        return self.classes_[bit]
+
+    def predict(self, X):
+        """Predict raw rows of shape (n_rows, n_features) in model feature order"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        cells = np.zeros(X.shape[0], dtype=np.int64)
+        for f, (boundaries, stride) in enumerate(zip(self.boundaries, self.strides)):
+            cells += np.searchsorted(boundaries, X[:, f], side='left') * stride
+        bits = (self.votes[cells >> 3] >> (7 - (cells & 7))) & 1
+        return self.classes_.take(bits)
+
+    def save(self, path=REGION_TABLE_PATH):
+        arrays = {f'boundaries_{i}': b for i, b in enumerate(self.boundaries)}
+        np.savez_compressed(
+            path,
+            votes=self.votes,
+            classes=self.classes_,
+            source_checksum=np.array(self.source_checksum or ''),
+            **arrays
+        )
+
+    @classmethod
+    def load(cls, path=REGION_TABLE_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            n_features = sum(1 for key in data.files if key.startswith('boundaries_'))
+            boundaries = [data[f'boundaries_{i}'] for i in range(n_features)]
+            checksum = str(data['source_checksum']) or None
+            return cls(boundaries, data['votes'], data['classes'], source_checksum=checksum)
+
+
+def compile_region_table(model, scaler, max_cells=DEFAULT_MAX_CELLS, source_checksum=None):
+    """Build the exact decision-region table for a binary forest and its scaler"""
+    if len(model.classes_) != 2:
+        raise ValueError("Region table only supports binary classifiers")
+
+    engine = FlatForest.from_sklearn(model)
+    n_features = model.n_features_in_
+    mean, scale = scaler_affine_params(scaler)
+
+    # Unique split thresholds per feature, in scaled units
+    internal = engine.left != np.arange(len(engine.left))
+    thresholds = [np.unique(engine.threshold[internal & (engine.feature == f)]) for f in range(n_features)]
+
+    shape = tuple(len(t) + 1 for t in thresholds)
+    n_cells = int(np.prod(shape, dtype=np.int64))
+    if n_cells > max_cells:
+        raise RegionTableTooLarge(f"Decision grid has {n_cells} cells, limit is {max_cells}")
+
+    # Replace float thresholds by their index in the per-feature threshold list.
+    # A row in cell c of feature f goes left at threshold index j iff c <= j.
+    threshold_index = np.zeros(len(engine.threshold), dtype=np.int64)
+    for f in range(n_features):
+        nodes = internal & (engine.feature == f)
+        threshold_index[nodes] = np.searchsorted(thresholds[f], engine.threshold[nodes])
+
+    ends = np.append(engine.roots[1:], len(engine.feature))
+    trees = []
+
+    for root, end in zip(engine.roots, ends):
+        tree_nodes = np.arange(root, end)
+        tree_internal = tree_nodes[internal[root:end]]
+
+        # Cells of this tree's own (coarser) grid, as global cell indices
+        local_cells = []
+        global_to_local = []
+        for f in range(n_features):
+            used = np.unique(threshold_index[tree_internal[engine.feature[tree_internal] == f]])
+            local_cells.append(np.append(used, len(thresholds[f])))
+            global_to_local.append(np.searchsorted(used, np.arange(shape[f]), side='left'))
+
+        # Evaluate the tree once per local cell
+        grid = np.stack(np.meshgrid(*local_cells, indexing='ij'), axis=-1).reshape(-1, n_features)
+        rows = np.arange(len(grid))
+        nodes = np.full(len(grid), root, dtype=np.intp)
+        for _ in range(engine.max_depth):
+            go_left = grid[rows, engine.feature[nodes]] <= threshold_index[nodes]
+            nodes = np.where(go_left, engine.left[nodes], engine.right[nodes])
+        tree_votes = engine.value[nodes].reshape(tuple(len(c) for c in local_cells) + (engine.n_classes,))
+
+        trees.append((tree_votes, global_to_local))
+
+    winners = np.empty(shape, dtype=np.uint8)
+    for start in range(0, shape[0], COMPILE_CHUNK_ROWS):
+        stop = min(start + COMPILE_CHUNK_ROWS, shape[0])
+        votes = np.zeros((stop - start,) + shape[1:] + (engine.n_classes,), dtype=np.float64)
+
+        # Accumulate trees in estimator order, like sklearn's forest
+        for tree_votes, global_to_local in trees:
+            votes += tree_votes[np.ix_(global_to_local[0][start:stop], *global_to_local[1:])]
+
+        votes /= engine.n_trees
+        winners[start:stop] = np.argmax(votes, axis=-1)
+
+    boundaries = [fold_scaler_threshold(t, mean[f], scale[f]) for f, t in enumerate(thresholds)]
+
+    return RegionTable(boundaries, np.packbits(winners.ravel()), model.classes_, source_checksum=source_checksum)
+
+
+def load_region_table(path, source_checksum):
+    """Load a table if it exists and was compiled from the given model files"""
+    if not os.path.exists(path):
+        return None
+    table = RegionTable.load(path)
+    if table.source_checksum != source_checksum:
+        raise ValueError("Region table was compiled from different model files")
+    return table
+
+
+def verify_region_table(table, model, scaler, feature_order):
+    """Compare table lookups with the sklearn pipeline, including every cell boundary"""
+    import pandas as pd
+
+    X_raw = sample_validated_inputs(feature_order)
+
+    # Rows sitting exactly on, and just past, each folded boundary
+    rng = np.random.default_rng(1)
+    edge_rows = []
+    for f, boundaries in enumerate(table.boundaries):
+        for values in (boundaries, np.nextafter(boundaries, np.inf)):
+            rows = X_raw[rng.integers(len(X_raw), size=len(values))].copy()
+            rows[:, f] = values
+            edge_rows.append(rows)
+    X_raw = np.vstack([X_raw] + edge_rows)
+
+    expected = model.predict(scaler.transform(pd.DataFrame(X_raw, columns=feature_order)))
+    predicted = table.predict(X_raw)
+    single = np.array([table.predict_one(row) for row in X_raw[:2000]])
+
+    return {
+        'rows_checked': int(len(X_raw)),
+        'prediction_mismatches': int((predicted != expected).sum()),
+        'single_row_mismatches': int((single != expected[:2000]).sum()),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import joblib
+
+    model_path, scaler_path = 'model.pkl', 'scaler.pkl'
+    max_cells = int(os.environ.get('REGION_TABLE_MAX_CELLS', DEFAULT_MAX_CELLS))
+
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    order = list(getattr(scaler, 'feature_names_in_', ['Glucose', 'Insulin', 'BMI', 'Age']))
+
+    started = time.perf_counter()
+    try:
+        table = compile_region_table(model, scaler, max_cells=max_cells,
+                                     source_checksum=file_checksum(model_path, scaler_path))
+    except RegionTableTooLarge as e:
+        print(f"[WARNING] {e}; the app will keep using the model")
+        if os.path.exists(REGION_TABLE_PATH):
+            os.remove(REGION_TABLE_PATH)
+        sys.exit(0)
+
+    print(f"[INFO] Compiled {table.n_cells} cells {table.shape} in {time.perf_counter() - started:.1f}s "
+          f"({table.votes.nbytes / 1e6:.1f} MB of votes)")
+
+    result = verify_region_table(table, model, scaler, order)
+    print(f"[INFO] Parity check: {result}")
+    if result['prediction_mismatches'] or result['single_row_mismatches']:
+        raise SystemExit("[ERROR] Region table does not match the model, not saving")
+
+    table.save(REGION_TABLE_PATH)
+    print(f"[INFO] Region table saved to {REGION_TABLE_PATH}")
@@ -0,0 +1,59 @@
+"""Payload size and serialization time of each response profile
+
+For /predict, /recommend_food and /assess this requests every profile
+through the Flask test client. It then times Flask's default jsonify
+encoder against responses.dumps (orjson when installed) on the same
+payload.
+
+    python response_benchmark.py [iterations]
+"""
+import contextlib
+import io
+import json
+import sys
+import time
+
+ENDPOINTS = [
+    ('/predict', {'age': 45, 'bmi': 28.5, 'glucose': 130, 'insulin': 15}),
+    ('/recommend_food', {'category': 'Sayur', 'user_data': {'age': 45, 'bmi': 28.5, 'glucose': 130, 'insulin': 15}}),
+    ('/assess', {'age': 45, 'bmi': 28.5, 'glucose': 130, 'insulin': 15}),
+]
+
+
+def _time_per_call(function, iterations):
+    function()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def benchmark(app_module, iterations=2000):
+    """Rows of (endpoint, profile, bytes, flask_jsonify_us, fast_dumps_us)"""
+    import responses
+
+    client = app_module.app.test_client()
+    rows = []
+    for path, body in ENDPOINTS:
+        for profile in responses.PROFILES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = client.post(f'{path}?profile={profile}', json=body)
+            payload = json.loads(result.get_data())
+            with app_module.app.app_context():
+                flask_us = _time_per_call(lambda: app_module.app.json.dumps(payload), iterations)
+            fast_us = _time_per_call(lambda: responses.dumps(payload), iterations)
+            rows.append((path, profile, len(result.get_data()), flask_us, fast_us))
+    return rows
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+    import responses
+
+    encoder = 'orjson' if responses.orjson is not None else 'json'
+    print(f"{'endpoint':<16} {'profile':<9} {'bytes':>7} {'jsonify us':>11} {encoder + ' us':>10}")
+    for path, profile, size, flask_us, fast_us in benchmark(app, iterations):
+        print(f"{path:<16} {profile:<9} {size:>7} {flask_us:>11.1f} {fast_us:>10.1f}")
@@ -0,0 +1,100 @@
+"""Response profiles and JSON serialization for the prediction endpoints
+
+Profiles:
+  lean      only the fields the Next.js pages render
+  standard  the full payload (default)
+  debug     the full payload plus debug-only fields such as scaled_input
+
+A request picks its profile with ?profile=lean|standard|debug or a
+"profile" field in the JSON body (?debug=1 and "debug": true select debug);
+otherwise RESPONSE_PROFILE applies to the whole deployment.
+
+Responses are serialized with orjson when it is installed, which handles
+NumPy scalars and arrays natively, and with the standard json module plus a
+NumPy-aware default otherwise.
+"""
+import json
+import os
+
+import numpy as np
+from flask import Response, request
+
+from log_config import get_logger
+from metrics import timed
+
+logger = get_logger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+PROFILES = ('lean', 'standard', 'debug')
+
+RESPONSE_PROFILE = os.environ.get('RESPONSE_PROFILE', 'standard')
+if RESPONSE_PROFILE not in PROFILES:
+    logger.warning(f"Unknown RESPONSE_PROFILE '{RESPONSE_PROFILE}', using 'standard'")
+    RESPONSE_PROFILE = 'standard'
+
+# Fields rendered by app/prediksi/page.tsx
+LEAN_PREDICTION_FIELDS = ('success', 'prediction', 'prediction_text', 'prediction_id')
+LEAN_RECOMMENDATION_FIELDS = ('success', 'recommendations', 'ml_prediction', 'gi_strategy')
+LEAN_FOOD_FIELDS = (
+    'name', 'category', 'calories', 'glycemic_index', 'carbohydrates', 'protein', 'fat', 'fiber',
+    'sugar_content', 'rating', 'personalization_score', 'gi_category', 'diabetes_friendly',
+    'recommendation_reason',
+)
+
+
+def response_profile(data=None):
+    """Profile requested by the current request, falling back to RESPONSE_PROFILE"""
+    profile = request.args.get('profile')
+    if profile is None and isinstance(data, dict):
+        profile = data.get('profile')
+    if profile in PROFILES:
+        return profile
+    if request.args.get('debug', '').lower() in ('1', 'true', 'yes'):
+        return 'debug'
+    if isinstance(data, dict) and data.get('debug') is True:
+        return 'debug'
+    return RESPONSE_PROFILE
+
+
+def lean_prediction(payload):
+    """/predict payload reduced to the rendered fields"""
+    return {key: payload[key] for key in LEAN_PREDICTION_FIELDS if key in payload}
+
+
+def lean_recommendation(payload):
+    """/recommend_food payload reduced to the rendered fields"""
+    lean = {key: payload[key] for key in LEAN_RECOMMENDATION_FIELDS if key in payload}
+    lean['recommendations'] = [
+        {key: food[key] for key in LEAN_FOOD_FIELDS if key in food}
+        for food in payload.get('recommendations', [])
+    ]
+    gi_range = payload.get('debug_info', {}).get('gi_range')
+    if gi_range is not None:
+        lean['debug_info'] = {'gi_range': gi_range}
+    return lean
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Serialize a payload to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=_json_default).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Flask response with the payload serialized by `dumps`"""
+    with timed('encode'):
+        body = dumps(payload)
+    return Response(body, status=status, mimetype='application/json')
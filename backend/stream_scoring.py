@@ -0,0 +1,130 @@
+"""Streaming parser for bulk scoring uploads
+
+Partner labs upload CSV exports or NDJSON files with tens of thousands of
+rows. The upload is read from the request stream in fixed-size blocks,
+split into lines and parsed into records, and the records are grouped
+into chunks. The endpoint scores each chunk with one vectorised model call
+and writes its results back before the next block is read. Only the
+current block and chunk are held in memory, however large the upload is.
+
+Formats:
+  csv     a header line naming age, bmi, glucose and insulin (any order or
+          case, other columns ignored), then one row per line
+  ndjson  one JSON object per line with the same fields as /predict
+
+Lines that cannot be parsed are passed on as per-row errors, so one bad
+row never aborts the upload.
+
+Configuration (environment variables):
+  STREAM_CHUNK_ROWS      rows scored per model call (default 1000)
+  STREAM_READ_BYTES      bytes read from the upload at a time (default 65536)
+  STREAM_MAX_LINE_BYTES  longer lines are reported as errors and skipped (default 65536)
+"""
+import csv
+import json
+import os
+
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 1000))
+STREAM_READ_BYTES = int(os.environ.get('STREAM_READ_BYTES', 65536))
+STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', 65536))
+
+FORMATS = ('csv', 'ndjson')
+CSV_FIELDS = ('age', 'bmi', 'glucose', 'insulin')
+
+
+class UploadFormatError(ValueError):
+    """The upload as a whole cannot be parsed, e.g. a CSV header without a required column"""
+
+
+def upload_format(requested, content_type):
+    """'csv' or 'ndjson' from ?format= or else the Content-Type, defaulting to ndjson"""
+    if requested:
+        fmt = requested.lower()
+        if fmt not in FORMATS:
+            raise UploadFormatError(f"Unsupported format '{requested}', expected one of {', '.join(FORMATS)}")
+        return fmt
+    return 'csv' if 'csv' in (content_type or '') else 'ndjson'
+
+
+def iter_lines(stream, read_bytes=STREAM_READ_BYTES, max_line_bytes=STREAM_MAX_LINE_BYTES):
+    """Yield (line_number, text) for each line of a byte stream, reading fixed-size blocks
+
+    `text` is None for a line longer than `max_line_bytes`; the line is
+    skipped without being buffered.
+    """
+    pending = b''
+    line_number = 0
+    skipping = False
+    while True:
+        block = stream.read(read_bytes)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            line_number += 1
+            if skipping or len(line) > max_line_bytes:
+                skipping = False
+                yield line_number, None
+            else:
+                yield line_number, _decode(line, line_number)
+        if len(pending) > max_line_bytes:
+            skipping = True
+            pending = b''
+
+    if skipping:
+        yield line_number + 1, None
+    elif pending:
+        yield line_number + 1, _decode(pending, line_number + 1)
+
+
+def _decode(line, line_number):
+    # Spreadsheet exports often start with a byte order mark and end lines with \r\n
+    return line.decode('utf-8-sig' if line_number == 1 else 'utf-8', errors='replace').rstrip('\r')
+
+
+def iter_records(lines, fmt, max_line_bytes=STREAM_MAX_LINE_BYTES):
+    """Yield (line_number, record, error) for each non-blank line of an upload
+
+    `record` is a dict of the row's fields for validate_batch_records, or
+    None when the line could not be parsed and `error` says why.
+    """
+    columns = None
+    for line_number, text in lines:
+        if text is None:
+            yield line_number, None, f'Line exceeds {max_line_bytes} bytes'
+            continue
+        if not text.strip():
+            continue
+
+        if fmt == 'ndjson':
+            try:
+                yield line_number, json.loads(text), None
+            except ValueError as e:
+                yield line_number, None, f'Invalid JSON: {e}'
+            continue
+
+        values = next(csv.reader([text]))
+        if columns is None:
+            header = [name.strip().lower() for name in values]
+            missing = [field for field in CSV_FIELDS if field not in header]
+            if missing:
+                raise UploadFormatError(f"CSV header is missing required column: {missing[0]}")
+            columns = {field: header.index(field) for field in CSV_FIELDS}
+            continue
+        # Empty cells count as missing fields rather than unparseable numbers
+        record = {field: values[position] for field, position in columns.items()
+                  if position < len(values) and values[position].strip()}
+        yield line_number, record, None
+
+
+def iter_chunks(items, chunk_rows=STREAM_CHUNK_ROWS):
+    """Group an iterable into lists of at most `chunk_rows` items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import joblib
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# The apps load model.pkl, scaler.pkl and food_data.csv relative to the working directory
+os.chdir(BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def model():
+    return joblib.load(os.path.join(BACKEND_DIR, 'model.pkl'))
+
+
+@pytest.fixture(scope='session')
+def scaler():
+    return joblib.load(os.path.join(BACKEND_DIR, 'scaler.pkl'))
+
+
+@pytest.fixture(scope='session')
+def feature_order(scaler):
+    return list(scaler.feature_names_in_)
+
+
+@pytest.fixture(scope='session')
+def sample(feature_order):
+    """A smaller fixed sample than the scripts use; the verifiers add every threshold edge on top"""
+    from forest_engine import sample_validated_inputs
+    return sample_validated_inputs(feature_order, n_random=2000, grid_points=6)
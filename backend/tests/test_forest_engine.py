@@ -0,0 +1,32 @@
+from compact_forest import CompactForest, verify_compact_parity
+from forest_engine import FlatForest, scaler_affine_params, verify_folded_parity, verify_parity
+
+
+def test_flat_forest_matches_sklearn(model, scaler, feature_order, sample):
+    result = verify_parity(model, scaler, feature_order, X_raw=sample)
+    assert result['prediction_mismatches'] == 0
+    assert result['probability_mismatches'] == 0
+
+
+def test_folded_forest_matches_scaler_and_sklearn(model, scaler, feature_order, sample):
+    result = verify_folded_parity(model, scaler, feature_order, X_raw=sample)
+    assert result['rows_checked'] > len(sample)
+    assert result['prediction_mismatches'] == 0
+    assert result['probability_mismatches'] == 0
+
+
+def test_compact_forest_matches_scaler_and_sklearn(model, scaler, feature_order, sample):
+    raw_engine = FlatForest.from_sklearn(model).fold_scaler(*scaler_affine_params(scaler))
+    compact = CompactForest.from_flat(raw_engine)
+    result = verify_compact_parity(model, scaler, feature_order, compact, X_raw=sample)
+    assert result['rows_near_threshold'] > 0
+    assert result['prediction_mismatches'] == 0
+    assert result['max_probability_error'] < 1e-12
+
+
+def test_compact_forest_single_rows_match_batches(model, scaler, sample):
+    compact = CompactForest.from_flat(FlatForest.from_sklearn(model).fold_scaler(*scaler_affine_params(scaler)))
+    rows = sample[::50]
+    single = [compact.predict([row])[0] for row in rows]
+    assert single == compact.predict(rows).tolist()
+    assert (compact.near_threshold(rows) == [bool(compact.near_threshold(row[None, :])[0]) for row in rows]).all()
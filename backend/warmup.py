@@ -0,0 +1,118 @@
+"""Startup warm-up and readiness for the backend workers
+
+A freshly started worker pays for lazy initialisation on its first
+requests: NumPy and sklearn code paths, the first JSON encode and the
+first Postgres connection. WarmUp runs a list of named steps once at
+startup and times each of them. Until every step has run, `ready` is
+False, so /ready answers 503 and the load balancer keeps live traffic
+away from the cold worker.
+
+A failed required step keeps the worker not ready. A failed optional step
+(the database) is only reported, because requests are still answered
+without it.
+
+Configuration (environment variables):
+  WARMUP_ON_START   'background' (default), 'sync' to finish before the
+                    app module is imported, or 'off' to be ready at once
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from log_config import fields, get_logger
+
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'background')
+
+logger = get_logger(__name__)
+
+
+class WarmUp:
+    """Named warm-up steps run once, with per-step timings"""
+
+    def __init__(self):
+        self._steps = []  # (name, function, required)
+        self._lock = threading.Lock()
+        self._state = 'pending'
+        self._results = []
+        self._started_at = None
+        self._finished_at = None
+
+    def step(self, name, required=True):
+        """Decorator registering a warm-up step; its return value is reported as detail"""
+        def register(function):
+            self._steps.append((name, function, required))
+            return function
+        return register
+
+    def record(self, name, seconds, ok=True, detail=None, required=True):
+        """Report work done before the warm-up ran, e.g. loading the model at import"""
+        with self._lock:
+            self._results.append(self._result(name, seconds, ok, detail, required, None))
+
+    @staticmethod
+    def _result(name, seconds, ok, detail, required, error):
+        result = {'name': name, 'ok': ok, 'required': required, 'duration_ms': round(seconds * 1000, 3)}
+        if detail is not None:
+            result['detail'] = detail
+        if error is not None:
+            result['error'] = error
+        return result
+
+    def run(self):
+        with self._lock:
+            self._state = 'running'
+            self._started_at = time.perf_counter()
+
+        for name, function, required in self._steps:
+            started = time.perf_counter()
+            try:
+                detail = function()
+                result = self._result(name, time.perf_counter() - started, True, detail, required, None)
+            except Exception as e:
+                result = self._result(name, time.perf_counter() - started, False, None, required, str(e))
+                log = logger.warning if not required else logger.error
+                log("Warm-up step failed", extra=fields(step=name, error=str(e)))
+            with self._lock:
+                self._results.append(result)
+
+        with self._lock:
+            self._finished_at = time.perf_counter()
+            self._state = 'done'
+        stats = self.stats()
+        logger.info("Warm-up finished", extra=fields(ready=stats['ready'], total_ms=stats['total_ms'],
+                                                     steps={r['name']: r['duration_ms'] for r in stats['steps']}))
+
+    def start(self, mode=WARMUP_ON_START):
+        """Run the steps in the background, synchronously, or not at all"""
+        if mode == 'off':
+            with self._lock:
+                self._state = 'skipped'
+        elif mode == 'sync':
+            self.run()
+        else:
+            threading.Thread(target=self.run, name='warm-up', daemon=True).start()
+        return self
+
+    @property
+    def ready(self):
+        with self._lock:
+            if self._state == 'skipped':
+                return True
+            return self._state == 'done' and all(r['ok'] for r in self._results if r['required'])
+
+    def stats(self):
+        ready = self.ready
+        with self._lock:
+            if self._started_at is None:
+                total_ms = 0.0
+            else:
+                end = self._finished_at if self._finished_at is not None else time.perf_counter()
+                total_ms = round((end - self._started_at) * 1000, 3)
+            return {
+                'state': self._state,
+                'ready': ready,
+                'total_ms': total_ms,
+                'steps': list(self._results),
+                'checked_at': datetime.now().isoformat(),
+            }
@@ -0,0 +1,174 @@
+"""Asynchronous write-behind queue for prediction rows
+
+In write-behind mode /predict does not wait for the INSERT to commit. The
+endpoint generates the prediction id itself (a UUID), hands the row to a
+bounded in-process queue and returns. A background thread drains the
+queue and writes rows in batches with COPY, flushing when a batch is full
+or when the oldest queued row has waited long enough.
+
+Configuration (environment variables):
+  PREDICTION_WRITE_MODE        'sync' (default) or 'write_behind'
+  WRITE_BEHIND_QUEUE_SIZE      queued rows before new rows are dropped (default 10000)
+  WRITE_BEHIND_BATCH_SIZE      rows per COPY (default 500)
+  WRITE_BEHIND_FLUSH_INTERVAL  max seconds a row waits before a flush (default 0.5)
+"""
+import atexit
+import io
+import os
+import queue
+import threading
+import time
+import uuid
+
+from log_config import get_logger
+
+logger = get_logger(__name__)
+
+PREDICTION_WRITE_MODE = os.environ.get('PREDICTION_WRITE_MODE', 'sync')
+WRITE_BEHIND_QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000))
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+
+PREDICTION_COLUMNS = ('client_id', 'age', 'bmi', 'glucose', 'insulin', 'prediction')
+
+_STOP = object()
+
+
+def new_prediction_id():
+    """Client-generated prediction id, known before the row reaches the database"""
+    return str(uuid.uuid4())
+
+
+def copy_predictions(conn, rows):
+    """Write (client_id, age, bmi, glucose, insulin, prediction) rows with COPY"""
+    buffer = io.StringIO()
+    for client_id, age, bmi, glucose, insulin, prediction in rows:
+        buffer.write(f"{client_id}\t{int(age)}\t{float(bmi)!r}\t{int(glucose)}\t{int(insulin)}\t{int(prediction)}\n")
+    buffer.seek(0)
+
+    cursor = conn.cursor()
+    cursor.copy_expert(
+        f"COPY predictions ({', '.join(PREDICTION_COLUMNS)}) FROM STDIN",
+        buffer
+    )
+    conn.commit()
+
+
+class WriteBehindQueue:
+    """Bounded queue drained by a background flusher thread"""
+
+    def __init__(self, get_connection, maxsize=WRITE_BEHIND_QUEUE_SIZE,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+                 writer=copy_predictions):
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.writer = writer
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+        self._last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='prediction-write-behind', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+        return self
+
+    def submit(self, row):
+        """Queue a row without blocking; returns False if it had to be dropped"""
+        # Checked and queued under the lock shutdown() closes with, so no row
+        # can land behind the stop sentinel and be silently lost
+        with self._lock:
+            if self._closed:
+                self._dropped += 1
+                return False
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self._dropped += 1
+                return False
+            self._enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+
+            self._flush(batch)
+            if stop:
+                return
+
+    def _flush(self, batch):
+        try:
+            with self.get_connection() as conn:
+                self.writer(conn, batch)
+            with self._lock:
+                self._written += len(batch)
+                self._batches += 1
+        except Exception as e:
+            logger.error(f"Write-behind flush of {len(batch)} predictions failed: {e}")
+            with self._lock:
+                self._failed += len(batch)
+                self._last_error = str(e)
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting rows and wait for everything queued to be written"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+
+        # Rows queued before the sentinel are flushed before the thread exits
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Write-behind queue not drained after {timeout}s, {self._queue.qsize()} rows left")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': 'write_behind',
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'dropped': self._dropped,
+                'failed': self._failed,
+                'batches': self._batches,
+                'last_error': self._last_error,
+            }